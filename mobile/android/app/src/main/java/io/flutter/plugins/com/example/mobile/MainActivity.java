@@ -9,6 +9,10 @@ import io.flutter.plugin.common.MethodChannel;
 import com.chaquo.python.Python;
 import com.chaquo.python.android.AndroidPlatform;
 import com.chaquo.python.PyObject;
+import com.chaquo.python.Kwarg;
+
+import java.util.List;
+import org.json.JSONArray;
 
 public class MainActivity extends FlutterActivity {
     private static final String CHANNEL = "chaquopy";
@@ -28,21 +32,88 @@ public class MainActivity extends FlutterActivity {
         if (!Python.isStarted()) {
             Python.start(new AndroidPlatform(this));
         }
-        // Pre-load your module
+        // Pre-load your module (cheap: heavy imports happen in warmup())
         PyObject module = Python.getInstance().getModule("bill_generator");
 
         new MethodChannel(flutterEngine.getDartExecutor().getBinaryMessenger(), CHANNEL)
           .setMethodCallHandler((call, result) -> {
-            if ("generateBill".equals(call.method)) {
+            if ("warmup".equals(call.method)) {
+                // Imports and first renders are slow; keep them off the UI thread
+                new Thread(() -> {
+                    try {
+                        PyObject timings = module.callAttr("warmup");
+                        runOnUiThread(() -> result.success(timings.toString()));
+                    } catch (Exception e) {
+                        runOnUiThread(() -> result.error("PY_ERROR", e.getMessage(), null));
+                    }
+                }).start();
+            } else if ("generateBills".equals(call.method)) {
+                List<String> paths = call.argument("paths");
+                String place       = call.argument("place");
+                String formats     = call.argument("formats");
+                Boolean strict     = call.argument("strict");
+                if (paths == null || paths.isEmpty() || place == null) {
+                    result.error("BAD_ARGS", "Both 'paths' and 'place' must be provided", null);
+                    return;
+                }
+                // A batch can take a while; run it off the UI thread
+                new Thread(() -> {
+                    try {
+                        PyObject manifest = module.callAttr("generate_bills",
+                            new JSONArray(paths).toString(), place,
+                            new Kwarg("formats", formats == null ? "xlsx,pdf" : formats),
+                            new Kwarg("strict", strict != null && strict));
+                        runOnUiThread(() -> result.success(manifest.toString()));
+                    } catch (Exception e) {
+                        runOnUiThread(() -> result.error("PY_ERROR", e.getMessage(), null));
+                    }
+                }).start();
+            } else if ("archiveBills".equals(call.method)) {
+                Number keepMonths = call.argument("keepMonths");
+                // Zipping a month of bills is disk-bound; run it off the UI thread
+                new Thread(() -> {
+                    try {
+                        PyObject summary = module.callAttr("archive_bills",
+                            keepMonths == null ? 3 : keepMonths.intValue());
+                        runOnUiThread(() -> result.success(summary.toString()));
+                    } catch (Exception e) {
+                        runOnUiThread(() -> result.error("PY_ERROR", e.getMessage(), null));
+                    }
+                }).start();
+            } else if ("exportBills".equals(call.method)) {
+                String start   = call.argument("start");
+                String end     = call.argument("end");
+                String outPath = call.argument("outPath");
+                List<String> places = call.argument("places");
+                if (start == null || end == null || outPath == null) {
+                    result.error("BAD_ARGS", "'start', 'end' and 'outPath' must be provided", null);
+                    return;
+                }
+                new Thread(() -> {
+                    try {
+                        PyObject export = module.callAttr("export_bills", start, end, outPath,
+                            places == null ? null : new JSONArray(places).toString());
+                        runOnUiThread(() -> result.success(export.toString()));
+                    } catch (Exception e) {
+                        runOnUiThread(() -> result.error("PY_ERROR", e.getMessage(), null));
+                    }
+                }).start();
+            } else if ("generateBill".equals(call.method)) {
                 String inputPath = call.argument("data");
                 String place     = call.argument("place");
+                String formats   = call.argument("formats");
+                Number budgetMb  = call.argument("memoryBudgetMb");
+                Boolean strict   = call.argument("strict");
                 if (inputPath == null || place == null) {
                     result.error("BAD_ARGS", "Both 'data' and 'place' must be provided", null);
                     return;
                 }
                 try {
                     // Call your Python function
-                    PyObject output = module.callAttr("generate_bill", inputPath, place);
+                    PyObject output = module.callAttr("generate_bill", inputPath, place,
+                        new Kwarg("formats", formats == null ? "xlsx,pdf" : formats),
+                        new Kwarg("memory_budget_mb", budgetMb == null ? null : budgetMb.doubleValue()),
+                        new Kwarg("strict", strict != null && strict));
                     result.success(output.toString());;
                 } catch (Exception e) {
                     result.error("PY_ERROR", e.getMessage(), null);
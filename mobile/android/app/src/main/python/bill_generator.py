@@ -1,27 +1,132 @@
+import importlib
+import io
 import json
+import time
+from functools import lru_cache
 from datetime import datetime
 from pathlib import Path
 
-import pandas as pd
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
-from pdf_generator import generate_pdf_bill
-from openpyxl.worksheet.page import PageMargins
+# pandas, openpyxl and reportlab are imported inside the functions that use them,
+# so loading this module is cheap and warmup() can pay for them off the UI thread.
 
 BASE_DIR      = Path(__file__).parent
 
-COUNTER_FILE  = Path("/sdcard/Documents/bills") / "invoice_counter.json"
+BILLS_DIR     = Path("/sdcard/Documents/bills")
+COUNTER_FILE  = BILLS_DIR / "invoice_counter.json"
+# per-PO validation reports and the recent rates per item code (see validation.py)
+REPORT_DIR    = BILLS_DIR / ".reports" / "validation"
+RATES_FILE    = BILLS_DIR / ".reports" / "rates.json"
 METADATA_FILE = BASE_DIR / "metadata.json"
 
-def _get_next_invoice_number() -> int:
+# (mtime, parsed metadata) of the last metadata.json read
+_metadata_cache = None
+
+# fonts used by pdf_generator
+PDF_FONTS = ("Helvetica", "Helvetica-Bold", "Helvetica-BoldOblique")
+
+# output format -> key in the JSON returned to the app ("excel" kept for older callers)
+OUTPUT_FORMATS = {"xlsx": "excel", "pdf": "pdf", "csv": "csv", "html": "html"}
+DEFAULT_FORMATS = "xlsx,pdf"
+
+
+def _load_metadata() -> dict:
+    global _metadata_cache
+    mtime = METADATA_FILE.stat().st_mtime
+    if _metadata_cache is None or _metadata_cache[0] != mtime:
+        _metadata_cache = (mtime, json.loads(METADATA_FILE.read_text()))
+    return _metadata_cache[1]
+
+
+def _sample_bill_data(meta: dict) -> dict:
+    place = next(k for k in meta if k not in ("GST", "vendor_code"))
+    pm = meta[place]
+    return {
+        "GST": meta["GST"],
+        "vendor_code": meta["vendor_code"],
+        "PO": "0",
+        "delivery_date": "01-01-2000",
+        "invoice_no": "0",
+        "bill_to": pm["bill_to"],
+        "place_of_supply": pm["place_of_supply"],
+        "site_code": pm["site_code"],
+        "items": [[1, 1, "warmup", "1 unit", 1, 100, 100, 0.0, 0, 0.0, 0, 100]],
+    }
+
+
+def warmup() -> str:
+    """
+    Entry point for Chaquopy, meant to be called once on a background thread at launch:
+    - Imports pandas, openpyxl and reportlab
+    - Reads and caches metadata.json
+    - Loads the PDF font metrics
+    - Renders a one-line bill in memory through both generators and reads the Excel back
+    Returns JSON with the time taken by each step in milliseconds.
+    """
+    timings = {}
+
+    def step(name, fn):
+        t0 = time.perf_counter()
+        result = fn()
+        timings[name] = round((time.perf_counter() - t0) * 1000, 1)
+        return result
+
+    def import_pandas():
+        import pandas
+        return pandas
+
+    def import_openpyxl():
+        for name in ("openpyxl.styles", "openpyxl.utils", "openpyxl.worksheet.page"):
+            importlib.import_module(name)
+
+    def import_reportlab():
+        importlib.import_module("pdf_generator")
+
+    def register_fonts():
+        from reportlab.pdfbase import pdfmetrics
+        for name in PDF_FONTS:
+            pdfmetrics.getFont(name)
+            pdfmetrics.stringWidth("0123456789", name, 8)
+
+    pd = step("import_pandas", import_pandas)
+    step("import_openpyxl", import_openpyxl)
+    step("import_reportlab", import_reportlab)
+    meta = step("metadata", _load_metadata)
+    step("fonts", register_fonts)
+
+    sample = _sample_bill_data(meta)
+    sample_df = pd.DataFrame([{
+        "Item Code": 1, "HSN Code": 1, "Product Description": "warmup", "Grammage": "1 unit",
+        "Quantity": 1, "Landing Rate": 1.0,
+    }] * 4)
+    step("transform", lambda: _transform_items(sample_df))
+    xlsx = step("excel_render", lambda: _render_bytes("xlsx", sample))
+    # pd.read_excel goes through openpyxl's reader, which the render above did not touch
+    step("excel_read", lambda: pd.read_excel(io.BytesIO(xlsx)))
+
+    def pdf_render():
+        _render_bytes("pdf", sample)
+
+    step("pdf_render", pdf_render)
+
+    timings["total"] = round(sum(timings.values()), 1)
+    return json.dumps(timings)
+
+def _reserve_invoice_numbers(count: int) -> list:
+    """
+    Allocate `count` consecutive invoice numbers with a single counter write.
+    """
     if not COUNTER_FILE.exists():
         COUNTER_FILE.write_text(json.dumps({"last_invoice": 1150}))
-    
+
     data = json.loads(COUNTER_FILE.read_text())
-    next_inv = data["last_invoice"] + 1
-    COUNTER_FILE.write_text(json.dumps({"last_invoice": next_inv}))
-    return next_inv
+    first = data["last_invoice"] + 1
+    if count > 0:
+        COUNTER_FILE.write_text(json.dumps({"last_invoice": first + count - 1}))
+    return list(range(first, first + count))
+
+
+def _get_next_invoice_number() -> int:
+    return _reserve_invoice_numbers(1)[0]
 
 
 def _extract_po_and_date(filename: str) :
@@ -39,75 +144,371 @@ def _extract_po_and_date(filename: str) :
     except:
         return po, raw or "N/A"
 
-def _transform_items(df: pd.DataFrame) -> list:
-    df = df.copy()
-    df["Quantity"] = pd.to_numeric(df["Quantity"], errors="coerce", downcast="integer").fillna(0).astype(int)
-    df["Landing Rate"] = pd.to_numeric(df["Landing Rate"], errors="coerce", downcast="float").fillna(0.0).astype(float)
-    df["Item Code"]    = pd.to_numeric(df["Item Code"],    errors="coerce", downcast="integer").fillna(0).astype(int)
-    df["HSN Code"]     = pd.to_numeric(df["HSN Code"],     errors="coerce", downcast="integer").fillna(0).astype(int)
-    df["Product Description"] = df["Product Description"].astype(str).fillna("")
-    df["Grammage"]              = df["Grammage"].astype(str).fillna("")
-    df = df.dropna(subset=["Quantity","Landing Rate","Item Code","HSN Code","Product Description","Grammage"])
-    
-    items = []
-    for _, row in df.iterrows():
-        qty, rate = row["Quantity"], row["Landing Rate"]
-        total = round(qty * rate, 2)
-        items.append([
-            row["Item Code"], row["HSN Code"],
-            row["Product Description"].strip(), row["Grammage"].strip(),
-            qty, rate, total,
-            0.00, 0.0, 0.00, 0.0, total
-        ])
-    return items[:-3] if len(items) >= 3 else items
-
-def generate_bill(input_path: str, place: str) -> str:
+def _transform_items(df):
     """
-    Entry point for Chaquopy:
-    - Reads metadata.json
-    - Processes input Excel at input_path
-    - Writes output to /sdcard/Documents/bills
-    - Returns output file path
+    PO frame -> LineItems, rows of 12 values held as typed columns (line_items.py).
+    Money columns are integer paise (see money.py).
     """
-    # Load metadata
-    meta = json.loads(METADATA_FILE.read_text())
+    import numpy as np
+    import pandas as pd
+    from line_items import LineItems
+    from money import PAISE_DTYPE, to_paise
+
+    df = df.iloc[:-3] if len(df) >= 3 else df
+    n = len(df)
+    # rate stays float64 until to_paise: a float32 downcast loses paise above ~1 lakh
+    qty  = pd.to_numeric(df["Quantity"], errors="coerce").fillna(0).astype(PAISE_DTYPE).to_numpy()
+    rate = to_paise(pd.to_numeric(df["Landing Rate"], errors="coerce").fillna(0.0))
+    code = pd.to_numeric(df["Item Code"], errors="coerce").fillna(0).astype("int64")
+    hsn  = pd.to_numeric(df["HSN Code"],  errors="coerce").fillna(0).astype("int64")
+    desc = df["Product Description"].astype(str).str.strip()
+    gram = df["Grammage"].astype(str).str.strip()
+
+    taxable = qty * rate
+    sgst = np.zeros(n, dtype=PAISE_DTYPE)
+    cgst = np.zeros(n, dtype=PAISE_DTYPE)
+    total = taxable + sgst + cgst
+    rates = np.zeros(n, dtype=np.float64)
+
+    return LineItems([
+        code.to_numpy(), hsn.to_numpy(), desc.tolist(), gram.tolist(),
+        qty, rate, taxable,
+        rates, sgst,
+        rates, cgst,
+        total,
+    ])
+
+def _parse_formats(formats) -> list:
+    if isinstance(formats, str):
+        formats = formats.split(",")
+    result = []
+    for fmt in formats:
+        fmt = fmt.strip().lower()
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{fmt}', expected one of {', '.join(OUTPUT_FORMATS)}")
+        if fmt not in result:
+            result.append(fmt)
+    if not result:
+        raise ValueError("No output formats requested")
+    return result
+
+
+def _render_bytes(fmt: str, data: dict, compact: bool = False) -> bytes:
+    # renderers are imported only when their format is asked for
+    if fmt == "xlsx":
+        buffer = io.BytesIO()
+        _create_excel(data, buffer)
+        return buffer.getvalue()
+    if fmt == "pdf":
+        from pdf_generator import render_pdf_bill
+        return render_pdf_bill(data, compact)
+    if fmt == "csv":
+        from text_generator import render_csv_bill
+        return render_csv_bill(data)
+    from text_generator import render_html_bill
+    return render_html_bill(data)
+
+
+def _render(fmt: str, data: dict, out_path: Path, compact: bool = False):
+    # /sdcard is slow external storage: render in memory, then one write to a
+    # temp file and a rename, so the app never opens a half-written document
+    from atomic_write import write_atomic
+    write_atomic(out_path, _render_bytes(fmt, data, compact))
+
+
+def _resolve_place(meta: dict, place: str) -> str:
     if place not in meta or place in ("GST", "vendor_code"):
         # Fallback to first real key
         place = next(k for k in meta if k not in ("GST", "vendor_code"))
+    return place
 
-    po, delivery_date = _extract_po_and_date(Path(input_path).name)
-    df    = pd.read_excel(input_path)
-    items = _transform_items(df)
 
-    invoice_no = str(_get_next_invoice_number())
-    pm = meta[place]
+def _read_items(input_path: str, place: str, budget, formats, rates=None, strict: bool = False) -> tuple:
+    """
+    Read, validate and transform one PO. Returns (po, delivery_date, items, report).
+    The report is saved under bills/.reports/validation/<place>/; with strict=True a
+    PO with errors raises ValidationError before anything is rendered.
+    """
+    import pandas as pd
+    from validation import ValidationError, save_report, validate_po
 
-    bill_data = {
+    po, delivery_date = _extract_po_and_date(Path(input_path).name)
+    with budget.stage("read"):
+        df = pd.read_excel(input_path)
+    with budget.stage("validate"):
+        report = validate_po(df, 3, rates, Path(input_path).name)
+    save_report(report, place, Path(input_path).stem, REPORT_DIR)
+    if strict and report["errors"]:
+        raise ValidationError(report)
+    with budget.stage("transform"):
+        items = _transform_items(df)
+    if budget.plan(len(items), formats):
+        del df
+        budget.release()
+    return po, delivery_date, items, report
+
+
+def _validation_summary(report: dict) -> dict:
+    return {"errors": report["errors"], "warnings": report["warnings"],
+            "checks": [check["check"] for check in report["checks"]]}
+
+
+def _bill_data(meta: dict, place: str, po: str, delivery_date: str, invoice_no, items: list) -> dict:
+    pm = meta[place]
+    return {
         "GST": meta["GST"],
         "vendor_code": meta["vendor_code"],
         "PO": po,
         "delivery_date": delivery_date,
-        "invoice_no": invoice_no,
+        "invoice_no": str(invoice_no),
         "bill_to": pm["bill_to"],
         "place_of_supply": pm["place_of_supply"],
         "site_code": pm["site_code"],
         "items": items,
     }
 
-    # Prepare output folder and filename
-    out_dir = Path("/sdcard/Documents/bills")
+
+def _write_outputs(bill_data: dict, place: str, formats, budget, compact: bool = False) -> dict:
+    from output_store import month_dir
+
+    # Prepare output folder (bills/<place>/<YYYY-MM>) and filename
+    date_part = datetime.strptime(bill_data["delivery_date"], "%d-%m-%Y").strftime("%Y-%m-%d")
+    out_dir = month_dir(BILLS_DIR / place, date_part)
     out_dir.mkdir(parents=True, exist_ok=True)
-    date_part = datetime.strptime(delivery_date, "%d-%m-%Y").strftime("%Y-%m-%d")
-    out_file = f"{place}_{date_part}_{po}.xlsx"
-    out_path = out_dir / out_file
+    out_stem = f"{place}_{date_part}_{bill_data['PO']}"
+
+    outputs = {}
+    for fmt in formats:
+        out_path = out_dir / f"{out_stem}.{fmt}"
+        with budget.stage(fmt):
+            _render(fmt, bill_data, out_path, compact)
+        budget.release()
+        outputs[OUTPUT_FORMATS[fmt]] = str(out_path)
+    return outputs
+
+
+def generate_bill(input_path: str, place: str, formats: str = DEFAULT_FORMATS, memory_budget_mb=None,
+                  compact: bool = False, strict: bool = False) -> str:
+    """
+    Entry point for Chaquopy:
+    - Reads metadata.json
+    - Processes input Excel at input_path
+    - Writes the requested formats ("xlsx,pdf,csv,html") to /sdcard/Documents/bills/<place>/<YYYY-MM>
+    - Returns JSON mapping each format to its output path
+    With memory_budget_mb set, memory is traced per stage and reported under "memory";
+    if the row count says the budget would be exceeded, the DataFrame is released
+    before rendering and garbage is collected between renderers.
+    compact=True compresses the PDF's streams, for bills that are shared over mobile
+    data; the other formats are written as usual.
+    The PO is validated first and the counts are returned under "validation"; with
+    strict=True a PO with errors raises ValidationError and no invoice number is used.
+    """
+    from memory_budget import MemoryBudget
+    from validation import RateHistory
 
-    # Build the Excel
-    _create_excel(bill_data, out_path)
-    pdf_path = str(out_path.with_suffix(".pdf"))
-    generate_pdf_bill(bill_data, pdf_path)
-    return json.dumps({"excel": str(out_path), "pdf": pdf_path})
+    formats = _parse_formats(formats)
+    meta = _load_metadata()
+    place = _resolve_place(meta, place)
+    rates = RateHistory(RATES_FILE)
+
+    with MemoryBudget(memory_budget_mb) as budget:
+        po, delivery_date, items, report = _read_items(input_path, place, budget, formats, rates, strict)
+        bill_data = _bill_data(meta, place, po, delivery_date, _get_next_invoice_number(), items)
+        outputs = _write_outputs(bill_data, place, formats, budget, compact)
+    rates.record(items.column(0), items.column(5))
+    rates.save()
+
+    outputs["validation"] = _validation_summary(report)
+    if budget.enabled:
+        outputs["memory"] = budget.report()
+    return json.dumps(outputs)
+
+
+def generate_bills(paths, place: str, formats: str = DEFAULT_FORMATS, compact: bool = False,
+                   strict: bool = False) -> str:
+    """
+    Batch entry point for Chaquopy: bill many PO files in one call.
+    - paths: a list of input paths (or a JSON array string)
+    - Reads metadata.json once and reuses the Excel style objects across bills
+    - Reads every file first, then allocates invoice numbers for the readable ones
+      in a single counter write, so a bad file does not burn a number
+    - Validates every file; with strict=True a file with errors is reported under
+      "errors" (stage "validate") and not billed
+    - Returns one JSON manifest: {"place", "bills": [...], "errors": [...]}
+    """
+    from memory_budget import MemoryBudget
+    from validation import RateHistory, ValidationError
+
+    if isinstance(paths, str):
+        paths = json.loads(paths)
+    paths = [str(p) for p in paths]
+    formats = _parse_formats(formats)
+    meta = _load_metadata()
+    place = _resolve_place(meta, place)
+    no_budget = MemoryBudget(None)
+    rates = RateHistory(RATES_FILE)
+
+    parsed, errors = [], []
+    for input_path in paths:
+        try:
+            parsed.append((input_path, *_read_items(input_path, place, no_budget, formats, rates, strict)))
+        except ValidationError as e:
+            errors.append({"input": input_path, "stage": "validate", "error": str(e),
+                           "validation": _validation_summary(e.report)})
+        except Exception as e:
+            errors.append({"input": input_path, "stage": "read", "error": str(e)})
+
+    bills = []
+    numbers = _reserve_invoice_numbers(len(parsed))
+    for invoice_no, (input_path, po, delivery_date, items, report) in zip(numbers, parsed):
+        bill_data = _bill_data(meta, place, po, delivery_date, invoice_no, items)
+        try:
+            outputs = _write_outputs(bill_data, place, formats, no_budget, compact)
+        except Exception as e:
+            errors.append({"input": input_path, "stage": "render", "invoice_no": str(invoice_no), "error": str(e)})
+            continue
+        bills.append({
+            "input": input_path,
+            "PO": po,
+            "delivery_date": delivery_date,
+            "invoice_no": str(invoice_no),
+            "items": len(items),
+            "outputs": outputs,
+            "validation": _validation_summary(report),
+        })
+        rates.record(items.column(0), items.column(5))
+    rates.save()
+
+    return json.dumps({"place": place, "bills": bills, "errors": errors})
+
+def _shard_root_bills():
+    """
+    Move bills written before the per-site folders, directly into BILLS_DIR as
+    <place>_<YYYY-MM-DD>_<PO>.<fmt>, into bills/<place>/<YYYY-MM>.
+    """
+    from output_store import month_dir
+
+    places = [key for key in _load_metadata() if key not in ("GST", "vendor_code")]
+    for path in BILLS_DIR.glob("*_*_*.*"):
+        place = next((p for p in places if path.name.startswith(f"{p}_")), None)
+        if place is None or not path.is_file():
+            continue
+        date_part = path.name[len(place) + 1:].split("_", 1)[0]
+        try:
+            datetime.strptime(date_part, "%Y-%m-%d")
+        except ValueError:
+            continue
+        target = month_dir(BILLS_DIR / place, date_part)
+        target.mkdir(parents=True, exist_ok=True)
+        path.replace(target / path.name)
+
+
+def archive_bills(keep_months: int = 3) -> str:
+    """
+    Entry point for Chaquopy: zip the bills of every month before the last
+    `keep_months` into bills/<place>/<YYYY-MM>.zip, one archive per site and month.
+    Returns JSON {"files": files archived, "months": ["<place>/<YYYY-MM>", ...]}.
+    """
+    from output_store import OutputStore
+
+    _shard_root_bills()
+    store = OutputStore(BILLS_DIR)
+    try:
+        return json.dumps(store.compact(int(keep_months)))
+    finally:
+        store.save()
+
+
+def export_bills(start: str, end: str, out_path: str, places=None) -> str:
+    """
+    Entry point for Chaquopy: one zip at out_path of the bills delivered from `start`
+    to `end` (YYYY-MM-DD, inclusive), streamed from the loose files and monthly archives.
+    places: optional list (or JSON array string) of sites. Returns JSON {"path", "files"}.
+    """
+    from output_store import OutputStore
+
+    if isinstance(places, str):
+        places = json.loads(places)
+    _shard_root_bills()
+    store = OutputStore(BILLS_DIR)
+    try:
+        count = store.export(out_path, start, end, places)
+    finally:
+        store.save()
+    return json.dumps({"path": str(out_path), "files": count})
+
+
+@lru_cache(maxsize=None)
+def _excel_styles() -> dict:
+    """
+    Style objects for the per-cell formatting, built once and shared by every bill.
+    """
+    from openpyxl.styles import Alignment, Border, PatternFill, Side
+
+    return {
+        "border": Border(*[Side("thin")]*4),
+        "wrap_top": Alignment(wrapText=True, vertical="top"),
+        "stripe": PatternFill("solid", fgColor="FFF2CC"),
+    }
+
+
+def _write_hsn_summary(ws, start_row: int, items: list) -> int:
+    """
+    HSN-wise tax summary table in columns A:G from `start_row`. Returns the next free row.
+    """
+    from openpyxl.styles import Alignment, Font, PatternFill
+    from indian_format import INR_NUMBER_FORMAT
+    from money import HSN_SUMMARY_HEADERS, hsn_summary, paise_to_rupees
+
+    border = _excel_styles()["border"]
+    rows, totals = hsn_summary(items)
+
+    ws.merge_cells(start_row=start_row, start_column=1, end_row=start_row, end_column=len(HSN_SUMMARY_HEADERS))
+    title = ws.cell(row=start_row, column=1, value="HSN SUMMARY")
+    title.font = Font(bold=True, italic=True)
+
+    header_row = start_row + 1
+    for col_idx, header in enumerate(HSN_SUMMARY_HEADERS, start=1):
+        cell = ws.cell(row=header_row, column=col_idx, value=header)
+        cell.font = Font(bold=True, italic=True)
+        cell.fill = PatternFill("solid", fgColor="FFC000")
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+        cell.border = border
+
+    # hsn, taxable, sgst rate, sgst, cgst rate, cgst, tax; the total row leaves the rates blank
+    total_row = ["Total", totals[0], None, totals[1], None, totals[2], totals[3]]
+    for row_offset, values in enumerate(rows + [total_row], start=1):
+        is_total = row_offset == len(rows) + 1
+        for col_idx, value in enumerate(values, start=1):
+            if col_idx in (2, 4, 6, 7) and value is not None:
+                value = paise_to_rupees(value)
+            cell = ws.cell(row=header_row + row_offset, column=col_idx, value=value)
+            cell.border = border
+            if col_idx == 1:
+                cell.number_format = '0'
+                cell.alignment = Alignment(horizontal="right" if is_total else "center")
+            elif col_idx in (3, 5):
+                cell.number_format = '0.00%'
+            else:
+                cell.number_format = INR_NUMBER_FORMAT
+            if is_total:
+                cell.font = Font(bold=True)
+    return header_row + len(rows) + 2
+
+
+def _create_excel(data: dict, target):
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.page import PageMargins
+    from indian_format import INR_NUMBER_FORMAT, amount_in_words
+    from line_items import LineItems
+    from money import column_total, paise_to_rupees, round_off
+
+    money_cols = (6, 7, 9, 11, 12)   # 1-based columns holding integer paise
+
+    styles = _excel_styles()
 
-def _create_excel(data: dict, out_path: Path):
     wb = Workbook()
     ws = wb.active
     ws.title = "Invoice"
@@ -185,51 +586,51 @@ def _create_excel(data: dict, out_path: Path):
         cell.fill      = PatternFill(start_color="FFC000", end_color="FFC000", fill_type="solid")
         cell.font      = Font(bold=True, italic=True)
         cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.border    = Border(*[Side("thin")]*4)
+        cell.border    = styles["border"]
     ws.row_dimensions[hr].height = 30
 
     # — DATA ROWS —
     start = hr + 1
-    for r, item in enumerate(data["items"]):
+    items = LineItems.from_rows(data["items"])
+    columns = items.columns(rupee_idx=[c - 1 for c in money_cols])
+    # quantities and amounts in lakhs and crores
+    number_formats = {1: '0', 2: '0', 5: INR_NUMBER_FORMAT, 6: INR_NUMBER_FORMAT, 7: INR_NUMBER_FORMAT,
+                      8: '0.00%', 9: INR_NUMBER_FORMAT, 10: '0.00%', 11: INR_NUMBER_FORMAT,
+                      12: INR_NUMBER_FORMAT}
+    for r, item in enumerate(zip(*columns)):
         for c, val in enumerate(item, start=1):
             cell = ws.cell(row=start + r, column=c, value=val)
-            cell.alignment = Alignment(wrapText=True, vertical="top")
-            if c in (1,2):
-                cell.number_format = '0'
-            elif c in (5,6,7,9,11,12):
-                cell.number_format = '#,##0.00'
-            elif c in (8,10):
-                cell.number_format = '0.00%'
-            cell.border = Border(*[Side("thin")]*4)
+            cell.alignment = styles["wrap_top"]
+            if c in number_formats:
+                cell.number_format = number_formats[c]
+            cell.border = styles["border"]
             if r%2==0:
-                cell.fill = PatternFill("solid", fgColor="FFF2CC")
+                cell.fill = styles["stripe"]
 
     # — FOOTER SUMS —
-    end = start + len(data["items"])
+    end = start + len(items)
     ws.cell(row=end, column=1, value="Sub Total").alignment = Alignment(horizontal="right", vertical="center")
+    # totals are summed exactly in paise rather than left to an Excel SUM over floats
     for col in (5,7,8,9,10,11,12):
-        letter = get_column_letter(col)
-        cell = ws.cell(
-            row=end,
-            column=col,
-            value=f"=SUM({letter}{start}:{letter}{end-1})"
-        )
-        cell.number_format = '#,##0.00' if col not in (8,10) else '0.00%'
+        if col in money_cols:
+            total = paise_to_rupees(column_total(items, col - 1))
+        else:
+            total = sum(columns[col - 1])
+        cell = ws.cell(row=end, column=col, value=total)
+        cell.number_format = INR_NUMBER_FORMAT if col not in (8,10) else '0.00%'
         cell.font = Font(bold=True)
         cell.alignment = Alignment(horizontal="center")
-        cell.border    = Border(*[Side("thin")]*4)
+        cell.border    = styles["border"]
 
     min_width = 10
     max_width = 40
-    max_row = end + 1
 
     for col in range(1, len(headers) + 1):
         column_letter = get_column_letter(col)
-        max_length = len(headers[col - 1])
-        for row in range(start, max_row):
-            value = ws.cell(row=row, column=col).value
-            if value:
-                max_length = max(max_length, len(str(value)))
+        # widest item or Sub Total value, measured from the columns rather than read back cell by cell
+        values = set(columns[col - 1])
+        values.add(ws.cell(row=end, column=col).value)
+        max_length = max([len(headers[col - 1])] + [len(str(value)) for value in values if value])
         adjusted_width = min(max(max_length, min_width), max_width)
         ws.column_dimensions[column_letter].width = adjusted_width
 
@@ -248,11 +649,25 @@ def _create_excel(data: dict, out_path: Path):
     grand_cell = ws.cell(row=current_row, column=1, value="Grand Total (Rounded Off)")
     grand_cell.font = Font(bold=True, size=9 ,italic=True)
     grand_cell.alignment = Alignment(horizontal="right", vertical="center")
+    grand_total = round_off(column_total(items, 11))
+    grand_value = ws.cell(row=current_row, column=12, value=paise_to_rupees(grand_total))
+    grand_value.number_format = INR_NUMBER_FORMAT
+    grand_value.font = Font(bold=True, size=9)
+    current_row += 1
+
+    # Row: Amount in words
+    ws.merge_cells(start_row=current_row, start_column=1, end_row=current_row, end_column=12)
+    words_cell = ws.cell(row=current_row, column=1, value=f"Amount in words: {amount_in_words(grand_total)}")
+    words_cell.font = Font(size=9, italic=True)
+    words_cell.alignment = Alignment(horizontal="right", vertical="center")
     current_row += 1
 
     # Blank Row
     current_row += 1
 
+    # === HSN SUMMARY ===
+    current_row = _write_hsn_summary(ws, current_row, items) + 1
+
     # Thank You Row (Center-aligned)
     ws.merge_cells(start_row=current_row, start_column=1, end_row=current_row, end_column=12)
     thank_you_cell = ws.cell(row=current_row, column=1, value="THANK YOU FOR YOUR BUSINESS")
@@ -292,4 +707,4 @@ def _create_excel(data: dict, out_path: Path):
     ws.print_area = f"A1:{get_column_letter(ws.max_column)}{ws.max_row}"
 
     # — SAVE —
-    wb.save(out_path)
+    wb.save(target)
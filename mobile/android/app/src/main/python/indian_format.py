@@ -0,0 +1,107 @@
+# Amounts as Indian invoices print them: digits grouped in lakhs and crores
+# (12,34,56,789.00) and the grand total in words ("Rupees Twelve Crore ... Only").
+# Amounts are integer paise, as everywhere else (utils/money.py). A column is
+# formatted in bulk: each distinct value once, then scattered back to its rows.
+# Standard library only, apart from numpy in the column formatter.
+from functools import lru_cache
+
+# Excel number format for the same grouping: cells stay numbers, shown in lakhs and
+# crores. The conditions only cover positive amounts; negative ones (a difference
+# bill's reductions) fall to the last section and are grouped in thousands. Excel
+# allows no more than two conditions, so there is no section for 100 crore and up:
+# those amounts keep their leading digits in one group (123,45,67,890.00); the PDF,
+# HTML and amount-in-words line still print them correctly.
+INR_NUMBER_FORMAT = r'[>=10000000]##\,##\,##\,##0.00;[>=100000]##\,##\,##0.00;##,##0.00'
+
+_ONES = (
+    "", "One", "Two", "Three", "Four", "Five", "Six", "Seven", "Eight", "Nine", "Ten",
+    "Eleven", "Twelve", "Thirteen", "Fourteen", "Fifteen", "Sixteen", "Seventeen", "Eighteen", "Nineteen",
+)
+_TENS = ("", "", "Twenty", "Thirty", "Forty", "Fifty", "Sixty", "Seventy", "Eighty", "Ninety")
+# (size, name), largest first
+_UNITS = ((10_000_000, "Crore"), (100_000, "Lakh"), (1_000, "Thousand"), (100, "Hundred"))
+
+
+def group_indian(number: int) -> str:
+    """
+    1234567 -> '12,34,567': the last three digits, then groups of two.
+    """
+    digits = str(abs(int(number)))
+    sign = "-" if number < 0 else ""
+    if len(digits) <= 3:
+        return sign + digits
+    head, tail = digits[:-3], digits[-3:]
+    pairs = []
+    while len(head) > 2:
+        pairs.append(head[-2:])
+        head = head[:-2]
+    pairs.append(head)
+    return sign + ",".join(reversed(pairs)) + "," + tail
+
+
+def format_inr(paise) -> str:
+    """
+    12345678 paise -> '1,23,456.78', using integer arithmetic only.
+    """
+    paise = int(paise)
+    rupees, cents = divmod(abs(paise), 100)
+    return f"{'-' if paise < 0 else ''}{group_indian(rupees)}.{cents:02d}"
+
+
+def format_indian(value) -> str:
+    """
+    A plain number (a quantity) with two decimals and Indian grouping.
+    """
+    scaled = round(float(value) * 100, 6)
+    return format_inr(int(scaled + 0.5) if scaled >= 0 else -int(-scaled + 0.5))
+
+
+def format_inr_column(values) -> list:
+    """
+    format_inr over a whole column of paise: each distinct value is formatted once.
+    """
+    import numpy as np
+
+    values = np.asarray(values, dtype=np.int64)
+    if not len(values):
+        return []
+    distinct, inverse = np.unique(values, return_inverse=True)
+    texts = np.array([format_inr(value) for value in distinct.tolist()], dtype=object)
+    return texts[inverse].tolist()
+
+
+@lru_cache(maxsize=4096)
+def number_in_words(number: int) -> str:
+    """
+    0 <= number, in words with the Indian units: 123456 -> 'One Lakh Twenty Three
+    Thousand Four Hundred Fifty Six'. Parts below a lakh repeat across amounts, so
+    they are memoized too.
+    """
+    if number == 0:
+        return "Zero"
+    if number < 20:
+        return _ONES[number]
+    if number < 100:
+        tens, ones = divmod(number, 10)
+        return _TENS[tens] + (f" {_ONES[ones]}" if ones else "")
+    for size, name in _UNITS:
+        if number >= size:
+            count, rest = divmod(number, size)
+            # crores are counted in words of their own: 150 crore is 'One Hundred Fifty Crore'
+            words = f"{number_in_words(count)} {name}"
+            return words + (f" {number_in_words(rest)}" if rest else "")
+
+
+@lru_cache(maxsize=4096)
+def amount_in_words(paise: int) -> str:
+    """
+    An amount in paise for the invoice's words line:
+    123456789 -> 'Rupees Twelve Lakh Thirty Four Thousand Five Hundred Sixty Seven and Eighty Nine Paise Only'.
+    """
+    paise = int(paise)
+    rupees, cents = divmod(abs(paise), 100)
+    parts = [f"Rupees {number_in_words(rupees)}"] if rupees or not cents else []
+    if cents:
+        parts.append(f"{number_in_words(cents)} Paise")
+    words = " and ".join(parts)
+    return ("Minus " if paise < 0 else "") + words + " Only"
@@ -0,0 +1,106 @@
+import gc
+import tracemalloc
+from contextlib import contextmanager
+
+MB = 1024 * 1024
+
+# Python-heap bytes per PO line at each stage's peak, measured with tracemalloc
+# on the buyer's 18-column export (scripts/benchmark.py data, rounded up)
+BYTES_PER_ROW = {
+    "read": 1500,
+    "items": 150,
+    "xlsx": 5500,
+    "pdf": 12000,
+    "csv": 200,
+    "html": 1100,
+}
+
+
+def estimate_peak_bytes(rows: int, formats, low_memory: bool = False) -> int:
+    """
+    Estimated peak for one bill. Normally the DataFrame, the items and every
+    renderer's leftovers (openpyxl and ReportLab objects sit in reference cycles
+    until the next GC) can all be alive together. In low-memory mode only the
+    items and the largest single renderer are.
+    """
+    items = rows * BYTES_PER_ROW["items"]
+    renders = [rows * BYTES_PER_ROW[fmt] for fmt in formats]
+    if low_memory:
+        return items + max(renders, default=0)
+    return rows * BYTES_PER_ROW["read"] + items + sum(renders)
+
+
+class MemoryBudget:
+    """
+    Per-bill memory accounting and strategy switch.
+
+    Stage peaks come from tracemalloc, so they cover Python-heap allocations
+    (numpy buffers included) rather than the whole process RSS.
+    With budget_mb=None nothing is traced and every method is a no-op.
+    """
+
+    def __init__(self, budget_mb=None):
+        self.budget_mb = budget_mb
+        self.enabled = budget_mb is not None
+        self.low_memory = False
+        self.estimate_mb = None
+        self.stages = {}
+        self._started = False
+
+    def __enter__(self):
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        return self
+
+    def __exit__(self, *exc):
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+        return False
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            self.stages[name] = round(tracemalloc.get_traced_memory()[1] / MB, 2)
+
+    def plan(self, rows: int, formats) -> bool:
+        """
+        Decide from the row count whether this bill needs the low-memory strategies.
+        """
+        if not self.enabled:
+            return False
+        estimate = estimate_peak_bytes(rows, formats)
+        self.estimate_mb = round(estimate / MB, 2)
+        self.low_memory = estimate > self.budget_mb * MB
+        return self.low_memory
+
+    def release(self):
+        # in low-memory mode free the previous stage's reference cycles before the next one starts
+        if self.low_memory:
+            gc.collect()
+
+    @property
+    def peak_mb(self) -> float:
+        return max(self.stages.values(), default=0.0)
+
+    def report(self) -> dict:
+        return {
+            "budget_mb": self.budget_mb,
+            "estimate_mb": self.estimate_mb,
+            "low_memory": self.low_memory,
+            "peak_mb": self.peak_mb,
+            "stages": dict(self.stages),
+        }
+
+    def summary(self) -> str:
+        stages = ", ".join(f"{name} {mb:.1f}" for name, mb in self.stages.items())
+        mode = "low-memory" if self.low_memory else "normal"
+        over = " OVER BUDGET" if self.peak_mb > self.budget_mb else ""
+        return f"Memory: peak {self.peak_mb:.1f} MB of {self.budget_mb} MB ({mode}){over} [{stages}]"
@@ -0,0 +1,91 @@
+# Money is carried as integer paise (int64 arrays, Python ints per cell) from the
+# transform to the renderers, so line totals, subtotals and the grand total are exact
+# and every output format agrees to the paisa. Rounding happens only in _half_up().
+import numpy as np
+
+PAISE_DTYPE = np.int64
+
+
+def _half_up(values, scale: int) -> np.ndarray:
+    """
+    The one rounding rule: `values * scale` rounded half away from zero.
+    The product is first rounded to 6 decimals so binary float noise
+    (1.005 is stored as 1.00499999...) cannot flip a half.
+    """
+    scaled = np.round(np.asarray(values, dtype=np.float64) * scale, 6)
+    return (np.sign(scaled) * np.floor(np.abs(scaled) + 0.5)).astype(PAISE_DTYPE)
+
+
+def to_paise(rupees) -> np.ndarray:
+    """
+    Rupee amounts (floats, strings already parsed) -> int64 paise.
+    """
+    return _half_up(rupees, 100)
+
+
+def round_off(paise) -> int:
+    """
+    Round a paise amount to whole rupees (the invoice's "Rounded Off" grand total), in paise.
+    """
+    return int(_half_up(int(paise) / 100, 1)) * 100
+
+
+def paise_to_rupees(paise) -> float:
+    """
+    Value to store in a numeric cell. Division by 100 is exact to the displayed 2 decimals.
+    """
+    return int(paise) / 100
+
+
+def item_column(items, idx: int, dtype=PAISE_DTYPE) -> np.ndarray:
+    """
+    Column `idx` of the item rows as an array. A typed container (utils/line_items.py)
+    hands over its stored column; plain rows are gathered in one pass.
+    """
+    if hasattr(items, "column"):
+        return np.asarray(items.column(idx), dtype=dtype)
+    return np.fromiter((item[idx] for item in items), dtype, len(items))
+
+
+def column_total(items, idx: int) -> int:
+    """
+    Exact sum of a paise column of the item rows.
+    """
+    return int(item_column(items, idx).sum())
+
+
+HSN_SUMMARY_HEADERS = [
+    "HSN CODE", "Taxable Value", "SGST Rate", "SGST Amount", "CGST Rate", "CGST Amount", "Total Tax",
+]
+
+
+def hsn_summary(items) -> tuple:
+    """
+    HSN-wise tax summary in one grouped pass: the items are grouped by
+    (HSN code, SGST rate, CGST rate) and their paise columns summed exactly.
+    Returns (rows, totals):
+      rows   [[hsn, taxable_p, sgst_rate, sgst_p, cgst_rate, cgst_p, tax_p], ...] in HSN order
+      totals [taxable_p, sgst_p, cgst_p, tax_p], equal to the item column totals
+    """
+    n = len(items)
+    if not n:
+        return [], [0, 0, 0, 0]
+
+    hsn = item_column(items, 1)
+    sgst_rate, cgst_rate = item_column(items, 7, np.float64), item_column(items, 9, np.float64)
+    amounts = np.column_stack([item_column(items, 6), item_column(items, 8), item_column(items, 10)])
+
+    # sort once by the group key, then sum each run of equal keys
+    order = np.lexsort((cgst_rate, sgst_rate, hsn))
+    hsn, sgst_rate, cgst_rate = hsn[order], sgst_rate[order], cgst_rate[order]
+    new_group = np.r_[True, (np.diff(hsn) != 0) | (np.diff(sgst_rate) != 0) | (np.diff(cgst_rate) != 0)]
+    starts = np.flatnonzero(new_group)
+    sums = np.add.reduceat(amounts[order], starts, axis=0)
+
+    rows = [
+        [hsn_code, taxable, s_rate, sgst, c_rate, cgst, sgst + cgst]
+        for hsn_code, s_rate, c_rate, (taxable, sgst, cgst) in zip(
+            hsn[starts].tolist(), sgst_rate[starts].tolist(), cgst_rate[starts].tolist(), sums.tolist())
+    ]
+    taxable, sgst, cgst = (int(total) for total in sums.sum(axis=0))
+    return rows, [taxable, sgst, cgst, sgst + cgst]
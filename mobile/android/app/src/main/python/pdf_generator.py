@@ -1,16 +1,86 @@
+from contextlib import contextmanager
+from io import BytesIO
+
+from reportlab import rl_config
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.lib import colors
 from reportlab.lib.styles import  ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle  
 from reportlab.lib.enums import TA_LEFT, TA_CENTER
 
-def generate_pdf_bill(data: dict, out_path: str) -> str:
+from atomic_write import write_atomic
+from line_items import LineItems
+from pdf_layout import fit_column_widths, wrap_long_cells
+from indian_format import amount_in_words, format_indian, format_inr, format_inr_column
+from money import HSN_SUMMARY_HEADERS, column_total, hsn_summary, round_off
+
+# 0-based item columns holding integer paise
+MONEY_IDX = (5, 6, 8, 10, 11)
+# text columns that may wrap: Article Description, Grammage
+WRAP_IDX = (2, 3)
+# cell text of each item column, matching the Excel number formats; the text columns pass through
+ITEM_FORMATTERS = {
+    0: str, 1: str,                                  # integer codes
+    4: format_indian,                                # quantity
+    7: lambda val: f"{val:.2%}", 9: lambda val: f"{val:.2%}",
+}
+# currency columns, integer paise in lakhs and crores, formatted a whole column at a time
+COLUMN_FORMATTERS = {idx: format_inr_column for idx in MONEY_IDX}
+
+def _hsn_summary_table(items) -> Table:
     """
-    Generates a PDF invoice at out_path, using the same layout as the Excel version.
-    Returns the PDF file path.
+    HSN-wise tax summary, styled like the item table and sized to its content.
+    """
+    rows, totals = hsn_summary(items)
+    table_data = [HSN_SUMMARY_HEADERS]
+    for hsn, taxable, sgst_rate, sgst, cgst_rate, cgst, tax in rows:
+        table_data.append([
+            str(hsn), format_inr(taxable), f"{sgst_rate:.2%}", format_inr(sgst),
+            f"{cgst_rate:.2%}", format_inr(cgst), format_inr(tax),
+        ])
+    table_data.append(["Total", format_inr(totals[0]), "", format_inr(totals[1]),
+                       "", format_inr(totals[2]), format_inr(totals[3])])
+
+    tbl = Table(table_data, repeatRows=1, hAlign="LEFT")
+    tbl.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#FFC000')),
+        ('FONTNAME',   (0,0), (-1,0), 'Helvetica-BoldOblique'),
+        ('FONTSIZE',   (0,0), (-1,-1), 8),
+        ('GRID',       (0,0), (-1,-1), 0.5, colors.black),
+        ('ALIGN',      (0,0), (-1,0), 'CENTER'),
+        ('ALIGN',      (0,1), (0,-2), 'CENTER'),
+        ('ALIGN',      (1,1), (-1,-1), 'RIGHT'),
+        ('ALIGN',      (0,-1), (0,-1), 'RIGHT'),
+        ('FONTNAME',   (0,-1), (-1,-1), 'Helvetica-Bold'),
+    ]))
+    return tbl
+
+
+@contextmanager
+def _binary_streams():
+    """
+    Write the compressed content streams as raw binary rather than ASCII85 text,
+    which is a quarter larger. ReportLab reads this from a global, so it is restored after.
+    """
+    saved = rl_config.useA85
+    rl_config.useA85 = 0
+    try:
+        yield
+    finally:
+        rl_config.useA85 = saved
+
+
+def render_pdf_bill(data: dict, compact: bool = False) -> bytes:
+    """
+    Renders the PDF invoice in memory, using the same layout as the Excel version.
+    With compact=True the item rows share column-wide style commands, the white
+    bands are not painted, and the content streams are compressed binary.
+    Returns the PDF bytes.
     """
     # Create PDF document in landscape A4
-    doc = SimpleDocTemplate(out_path, pagesize=landscape(A4), rightMargin=10, leftMargin=10, topMargin=10, bottomMargin=10)
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), rightMargin=10, leftMargin=10, topMargin=10, bottomMargin=10,
+                            pageCompression=1 if compact else None)
     story = []
 
     page_width = landscape(A4)[0] - 10 - 10
@@ -166,27 +236,43 @@ def generate_pdf_bill(data: dict, out_path: str) -> str:
         "ARTICLE CODE","HSN CODE","Article Description","Grammage","Quantity",
         "Rate","Taxable Value","SGST Rate","SGST Amount","CGST Rate","CGST Amount","Total Amount"
     ]
-    table_data = [headers]
-    for item in data["items"]:
-        # Format numbers as strings matching Excel formatting
-        row = []
-        for idx, val in enumerate(item):
-            if idx in (0,1):          # integer codes
-                row.append(f"{int(val)}")
-            elif idx in (4,5,6,8,10,11):  # currency columns
-                row.append(f"{val:,.2f}")
-            elif idx in (7,9):        # percentage columns
-                row.append(f"{val:.2%}")
+    # Format numbers as strings matching Excel formatting, one column at a time
+    items = LineItems.from_rows(data["items"])
+    body_rows = items.rows(ITEM_FORMATTERS, column_formatters=COLUMN_FORMATTERS)
+
+    sum_cols = [5, 7, 8, 9, 10, 11, 12]
+    subtotals = {}
+    for col in sum_cols:
+        # Python indexes from 0
+        idx = col - 1
+        if idx in MONEY_IDX:
+            subtotals[col] = column_total(items, idx)
+        else:
+            subtotals[col] = sum(items.column(idx).tolist())
+
+    # build the Sub Total row data (12 cells)
+    row_data = []
+    for col in range(1, 13):
+        if col == 1:
+            row_data.append("Sub Total")
+        elif col in sum_cols:
+            val = subtotals[col]
+            if col in (8, 10):
+                # SGST / CGST percent columns
+                row_data.append(f"{val:.2%}")
+            elif col - 1 in MONEY_IDX:
+                row_data.append(format_inr(val))
             else:
-                row.append(str(val))
-        table_data.append(row)
+                row_data.append(format_indian(val))
+        else:
+            row_data.append("")
 
-    # 2) Compute column widths (you can adjust these ratios)
-    #    Sum of ratios = 12 units
-    ratios = [1,1,3,1.8,0.8,0.8,1.2,1,1,1,1,1.2]
-    total_units = sum(ratios)
+    # 2) Compute column widths from the measured text: numbers on one line,
+    #    the remaining width to the text columns, which wrap only if they must
     page_width = landscape(A4)[0] - 20  # margins=10+10
-    col_widths = [page_width * r/total_units for r in ratios]
+    col_widths, headers = fit_column_widths(headers, body_rows, page_width, WRAP_IDX, extra_rows=[row_data])
+    wrap_style = ParagraphStyle("WrappedCell", fontName="Helvetica", fontSize=8, leading=9.6)
+    table_data = [headers] + wrap_long_cells(body_rows, col_widths, WRAP_IDX, wrap_style)
 
     # 3) Create the Table
     tbl = Table(table_data,
@@ -211,49 +297,34 @@ def generate_pdf_bill(data: dict, out_path: str) -> str:
     style.add('GRID',       (0,0), (-1,-1), 0.5, colors.black)
 
     # — Data rows styling: alternating fill + alignment + wrap —
-    for row_idx in range(1, len(table_data)):
-        fill_color = colors.HexColor('#FFF2CC') if (row_idx % 2)==1 else colors.white
-        style.add('BACKGROUND', (0,row_idx), (-1,row_idx), fill_color)
-        style.add('VALIGN',     (0,row_idx), (-1,row_idx), 'TOP')
-        style.add('WORDWRAP',   (0,row_idx), (-1,row_idx), True)
-        # Right-align numeric columns
-        for col_idx in (0,1):
-            style.add('ALIGN', (col_idx, row_idx), (col_idx, row_idx), 'CENTER')
-        for col_idx in (4,5,6,7,8,9,10,11):
-            style.add('ALIGN', (col_idx, row_idx), (col_idx, row_idx), 'RIGHT')
+    if compact:
+        # a handful of commands for the whole body; only the shaded bands are painted
+        style.add('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.HexColor('#FFF2CC'), None])
+        style.add('VALIGN',     (0,1), (-1,-1), 'TOP')
+        style.add('WORDWRAP',   (0,1), (-1,-1), True)
+        style.add('ALIGN',      (0,1), (1,-1),  'CENTER')
+        style.add('ALIGN',      (4,1), (-1,-1), 'RIGHT')
+    else:
+        for row_idx in range(1, len(table_data)):
+            fill_color = colors.HexColor('#FFF2CC') if (row_idx % 2)==1 else colors.white
+            style.add('BACKGROUND', (0,row_idx), (-1,row_idx), fill_color)
+            style.add('VALIGN',     (0,row_idx), (-1,row_idx), 'TOP')
+            style.add('WORDWRAP',   (0,row_idx), (-1,row_idx), True)
+            # Right-align numeric columns
+            for col_idx in (0,1):
+                style.add('ALIGN', (col_idx, row_idx), (col_idx, row_idx), 'CENTER')
+            for col_idx in (4,5,6,7,8,9,10,11):
+                style.add('ALIGN', (col_idx, row_idx), (col_idx, row_idx), 'RIGHT')
 
     tbl.setStyle(style)
 
     # 5) Add to your story
     story.append(tbl)
     
-    sum_cols = [5, 7, 8, 9, 10, 11, 12]
-    # data["items"] is a list of rows, each row being a list of 12 values
-    subtotals = {}
-    for col in sum_cols:
-        # Python indexes from 0
-        idx = col - 1
-        subtotals[col] = sum(row[idx] for row in data["items"])
-
-    # 2. build the PDF row data (12 cells)
-    row_data = []
-    for col in range(1, 13):
-        if col == 1:
-            row_data.append("Sub Total")
-        elif col in sum_cols:
-            val = subtotals[col]
-            if col in (8, 10):
-                # SGST / CGST percent columns
-                row_data.append(f"{val:.2%}")
-            else:
-                row_data.append(f"{val:,.2f}")
-        else:
-            row_data.append("")
-
-    # 3. create a one-row Table with the same column widths as your main table
+    # create a one-row Sub Total Table with the same column widths as your main table
     subtotal_table = Table([row_data], colWidths=col_widths)
 
-    # 4. style it to match Excel's footer
+    # style it to match Excel's footer
     subtotal_table.setStyle(TableStyle([
         # thin borders around every cell
         ('GRID',       (0,0), (-1,-1), 0.5, colors.black),
@@ -288,19 +359,41 @@ def generate_pdf_bill(data: dict, out_path: str) -> str:
         name="Grand",
         fontSize=9,
         leading=11,
-        spaceAfter=8,
+        spaceAfter=2,
         alignment=TA_CENTER,
         fontName="Helvetica-BoldOblique",
     )
+    words_style = ParagraphStyle(
+        name="Words",
+        fontSize=9,
+        leading=11,
+        spaceAfter=8,
+        alignment=TA_CENTER,
+        fontName="Helvetica-Oblique",
+    )
 
     story.append(Paragraph(
         "Misc. Charges (Including Freight, Octroi, Loading, Unloading, etc.)",
         misc_style,
     ))
+    grand_total = round_off(subtotals[12])
     story.append(Paragraph(
-        "Grand Total (Rounded Off)",
+        f"Grand Total (Rounded Off): {format_inr(grand_total)}",
         grand_style,
     ))
+    story.append(Paragraph(f"Amount in words: {amount_in_words(grand_total)}", words_style))
+
+    # === HSN SUMMARY ===
+    hsn_title = ParagraphStyle(
+        name="HsnTitle",
+        fontSize=9,
+        leading=11,
+        spaceAfter=2,
+        alignment=TA_LEFT,
+        fontName="Helvetica-BoldOblique",
+    )
+    story.append(Paragraph("HSN SUMMARY", hsn_title))
+    story.append(_hsn_summary_table(items))
 
     # === Blank Row ===
     story.append(Spacer(1, 12))
@@ -327,5 +420,19 @@ def generate_pdf_bill(data: dict, out_path: str) -> str:
     story.append(Paragraph("Signature", sig_style))
 
     # === Final PDF generation ===
-    doc.build(story)
+    if compact:
+        with _binary_streams():
+            doc.build(story)
+    else:
+        doc.build(story)
+    return buffer.getvalue()
+
+
+def generate_pdf_bill(data: dict, out_path: str, compact: bool = False) -> str:
+    """
+    Generates a PDF invoice at out_path: one bulk write to a temp file, then an atomic rename,
+    so a crash on slow external storage never leaves a half-written PDF behind.
+    Returns the PDF file path.
+    """
+    write_atomic(out_path, render_pdf_bill(data, compact))
     return out_path
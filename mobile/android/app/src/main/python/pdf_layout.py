@@ -0,0 +1,128 @@
+# Content-aware column widths for the PDF item table. Every numeric column gets
+# exactly the width of its widest value so numbers stay on one line, and whatever
+# is left goes to the text columns (Article Description, Grammage), split between
+# them so the fewest rows wrap, which keeps the page count down.
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+import numpy as np
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import Paragraph
+
+# Table's default LEFTPADDING + RIGHTPADDING, plus a point of slack for rounding
+CELL_PADDING = 6 + 6 + 1
+MIN_WRAP_WIDTH = 40
+SPLIT_STEPS = 32   # candidate splits of the text-column width tried per table
+
+
+@lru_cache(maxsize=1 << 16)
+def text_width(text: str, font: str, size: float) -> float:
+    """
+    Width of `text` in points. Cached: codes, rates, grammages and amounts repeat
+    across rows and bills, so most lookups never reach the font metrics.
+    """
+    return stringWidth(text, font, size)
+
+
+def _header_split(header: str, font: str, size: float):
+    """
+    The header on at most two lines with the narrowest widest line: (text, width).
+    """
+    best = (header, text_width(header, font, size))
+    words = header.split(" ")
+    for i in range(1, len(words)):
+        top, bottom = " ".join(words[:i]), " ".join(words[i:])
+        width = max(text_width(top, font, size), text_width(bottom, font, size))
+        if width < best[1]:
+            best = (f"{top}\n{bottom}", width)
+    return best
+
+
+def _estimated_lines(text_widths: np.ndarray, width: float) -> np.ndarray:
+    # characters are not split, so this slightly underestimates word wrapping
+    return np.maximum(np.ceil(text_widths / max(width - CELL_PADDING, 1.0)), 1.0)
+
+
+def _split_room(room: float, text_widths: list, floors: list) -> list:
+    """
+    Share `room` points between the text columns so the table has the fewest lines.
+    A row is as tall as its most-wrapped cell, so the cost is the sum of per-row maxima.
+    """
+    if len(text_widths) == 1:
+        return [room]
+    best, best_lines = None, None
+    first_floor, rest_floor = floors[0], sum(floors[1:])
+    for step in range(SPLIT_STEPS + 1):
+        first = first_floor + (room - first_floor - rest_floor) * step / SPLIT_STEPS
+        split = [first] + _split_room(room - first, text_widths[1:], floors[1:])
+        lines = np.max([_estimated_lines(w, c) for w, c in zip(text_widths, split)], axis=0).sum()
+        if best_lines is None or lines < best_lines:
+            best, best_lines = split, lines
+    return best
+
+
+def fit_column_widths(headers, rows, available: float, wrap_cols=(2,), body_font=("Helvetica", 8),
+                      header_font=("Helvetica-BoldOblique", 7), extra_rows=(), extra_font=("Helvetica-Bold", 9)):
+    """
+    Column widths for a table of string cells that fill exactly `available` points.
+
+    Every column not in `wrap_cols` is as wide as its widest cell (`rows` in `body_font`,
+    `extra_rows` such as a Sub Total line in `extra_font`) or its header broken onto
+    two lines, whichever is wider. The `wrap_cols` share the rest, split to minimise
+    the number of wrapped lines. If everything fits on one line the surplus is shared
+    out across all columns in proportion to width.
+    Returns (widths, headers) where long headers carry a line break.
+    """
+    ncols = len(headers)
+    natural = [0.0] * ncols
+    body_widths = {}
+    for col in range(ncols):
+        body_widths[col] = np.fromiter((text_width(row[col], *body_font) for row in rows), float, len(rows))
+        widest = body_widths[col].max(initial=0.0)
+        extra = max((text_width(row[col], *extra_font) for row in extra_rows), default=0.0)
+        natural[col] = max(widest, extra)
+
+    split_headers = []
+    floors = {}
+    for col, header in enumerate(headers):
+        full = text_width(header, *header_font)
+        if full > natural[col] or col in wrap_cols:
+            header, full = _header_split(header, *header_font)
+        split_headers.append(header)
+        if col in wrap_cols:
+            # a text column may wrap, but never narrower than its header or the extra rows
+            extra = max((text_width(row[col], *extra_font) for row in extra_rows), default=0.0)
+            floors[col] = max(full, extra, MIN_WRAP_WIDTH - CELL_PADDING) + CELL_PADDING
+        natural[col] = max(natural[col], full)
+
+    widths = [w + CELL_PADDING for w in natural]
+    fixed = sum(w for col, w in enumerate(widths) if col not in wrap_cols)
+    room = max(available - fixed, sum(floors.values()))
+    if room >= sum(widths[col] for col in wrap_cols):
+        surplus = available - sum(widths)
+        total = sum(widths)
+        return [w + surplus * w / total for w in widths], split_headers
+
+    split = _split_room(room, [body_widths[col] for col in wrap_cols], [floors[col] for col in wrap_cols])
+    # a column never needs more than its widest cell; hand any excess to the ones still wrapping
+    caps = [widths[col] for col in wrap_cols]
+    excess = sum(max(width - cap, 0.0) for width, cap in zip(split, caps))
+    for col, width, cap in zip(wrap_cols, split, caps):
+        width = min(width, cap)
+        grow = min(cap - width, excess)
+        widths[col], excess = width + grow, excess - grow
+    return widths, split_headers
+
+
+def wrap_long_cells(rows, widths, wrap_cols, style: ParagraphStyle):
+    """
+    Swap the cells of `wrap_cols` that would overflow their width for wrapping Paragraphs.
+    Cells that fit stay plain strings, which are much cheaper to lay out.
+    """
+    for col in wrap_cols:
+        limit = widths[col] - CELL_PADDING
+        for row in rows:
+            if text_width(row[col], style.fontName, style.fontSize) > limit:
+                row[col] = Paragraph(escape(row[col]), style)
+    return rows
@@ -0,0 +1,188 @@
+# Lightweight CSV and HTML renderers. They format the item rows directly and need
+# nothing beyond the standard library, so they are cheap to import and to run.
+import csv
+import io
+from html import escape
+
+from atomic_write import write_atomic
+from indian_format import amount_in_words, format_indian, format_inr
+
+HEADERS = [
+    "ARTICLE CODE", "HSN CODE", "Article Description", "Grammage", "Quantity",
+    "Rate", "Taxable Value", "SGST Rate", "SGST Amount",
+    "CGST Rate", "CGST Amount", "Total Amount"
+]
+SUM_COLS = (4, 6, 7, 8, 9, 10, 11)   # 0-based, same columns as the Excel/PDF Sub Total
+PERCENT_COLS = (7, 9)
+MONEY_COLS = (5, 6, 8, 10, 11)       # integer paise
+NUMERIC_COLS = (0, 1, 4, 5, 6, 7, 8, 9, 10, 11)
+
+
+def _format_row(item, fmt):
+    code, hsn, desc, gram, qty, rate, taxable, sgst_r, sgst, cgst_r, cgst, total = item
+    money = fmt.paise
+    return [
+        f"{int(code)}", f"{int(hsn)}", str(desc), str(gram),
+        fmt.number(qty), money(rate), money(taxable),
+        f"{sgst_r:.2%}", money(sgst), f"{cgst_r:.2%}", money(cgst), money(total),
+    ]
+
+
+def _subtotal_row(items, fmt):
+    row = ["Sub Total"] + [""] * 11
+    for idx in SUM_COLS:
+        val = sum(item[idx] for item in items)
+        if idx in PERCENT_COLS:
+            row[idx] = f"{val:.2%}"
+        elif idx in MONEY_COLS:
+            row[idx] = fmt.paise(val)
+        else:
+            row[idx] = fmt.number(val)
+    return row
+
+
+class _Plain:
+    @staticmethod
+    def number(val):
+        return f"{val:.2f}"
+
+    @staticmethod
+    def paise(val):
+        rupees, cents = divmod(abs(int(val)), 100)
+        return f"{'-' if val < 0 else ''}{rupees}.{cents:02d}"
+
+
+class _Grouped:
+    # lakhs and crores, as on the Excel and PDF invoices
+    number = staticmethod(format_indian)
+    paise = staticmethod(format_inr)
+
+
+def render_csv_bill(data: dict, deterministic: bool = False) -> bytes:
+    """
+    The item table and Sub Total row as CSV bytes. Output is always deterministic.
+    """
+    items = data["items"]
+    buffer = io.StringIO(newline="")
+    writer = csv.writer(buffer)
+    writer.writerow(HEADERS)
+    writer.writerows(_format_row(item, _Plain) for item in items)
+    writer.writerow(_subtotal_row(items, _Plain))
+    return buffer.getvalue().encode("utf-8")
+
+
+def generate_csv_bill(data: dict, filename, deterministic: bool = False):
+    write_atomic(filename, render_csv_bill(data, deterministic))
+    return filename
+
+
+_HTML_STYLE = """
+body{font-family:Helvetica,Arial,sans-serif;font-size:12px}
+table{border-collapse:collapse;width:100%}
+td,th{border:1px solid #000;padding:2px 4px;vertical-align:top}
+.hdr td{background:#92D050;text-align:center;font-weight:bold;font-style:italic;border:0}
+.sec th{background:#FFC000;text-align:left;font-style:italic}
+.blue td{background:#D9E1F2;font-weight:bold;font-style:italic;white-space:pre-line}
+.items th{background:#FFC000;font-style:italic}
+.items tr.alt td{background:#FFF2CC}
+.items td.n{text-align:right}
+.items tr.sub td{font-weight:bold}
+.hsn{width:auto}
+"""
+
+
+def _html_cells(row, tag="td"):
+    out = []
+    for idx, val in enumerate(row):
+        cls = ' class="n"' if idx in NUMERIC_COLS else ""
+        out.append(f"<{tag}{cls}>{escape(val)}</{tag}>")
+    return "".join(out)
+
+
+def _grand_total_html(items) -> str:
+    # numpy-backed, like the HSN summary below
+    from money import round_off
+
+    grand_total = round_off(sum(int(item[11]) for item in items))
+    return (
+        f"<p><b><i>Grand Total (Rounded Off): {escape(format_inr(grand_total))}</i></b></p>"
+        f"<p><i>Amount in words: {escape(amount_in_words(grand_total))}</i></p>"
+    )
+
+
+def _hsn_summary_html(items) -> str:
+    # numpy-backed; imported here so the CSV path stays standard-library only
+    from money import HSN_SUMMARY_HEADERS, hsn_summary
+
+    rows, (taxable, sgst, cgst, tax) = hsn_summary(items)
+    money = _Grouped.paise
+    cells = [
+        [str(hsn), money(tx), f"{s_rate:.2%}", money(s_amt), f"{c_rate:.2%}", money(c_amt), money(t)]
+        for hsn, tx, s_rate, s_amt, c_rate, c_amt, t in rows
+    ]
+    total = ["Total", money(taxable), "", money(sgst), "", money(cgst), money(tax)]
+
+    def tds(row):
+        return "".join('<td class="n">' + escape(v) + "</td>" for v in row)
+
+    return "".join([
+        "<p><b><i>HSN SUMMARY</i></b></p>",
+        '<table class="items hsn"><thead><tr>',
+        "".join(f"<th>{h}</th>" for h in HSN_SUMMARY_HEADERS),
+        "</tr></thead><tbody>",
+        "".join(f"<tr>{tds(row)}</tr>" for row in cells),
+        f'<tr class="sub">{tds(total)}</tr>',
+        "</tbody></table>",
+    ])
+
+
+def render_html_bill(data: dict, deterministic: bool = False) -> bytes:
+    """
+    A self-contained HTML invoice with the same sections as the Excel/PDF layout.
+    """
+    items = data["items"]
+    details = (
+        f"INVOICE NO: {data['invoice_no']}\n"
+        f"DELIVERY DATE: {data['delivery_date']}\n"
+        f"VENDOR CODE: {data['vendor_code']}\n"
+        f"SITE CODE: {data['site_code']}"
+        + (f"\n{data['reference']}" if data.get("reference") else "")
+    )
+    parts = [
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">",
+        f"<title>Invoice {escape(str(data['invoice_no']))}</title>",
+        f"<style>{_HTML_STYLE}</style></head><body>",
+        '<table class="hdr">',
+        f"<tr><td style=\"font-size:15px\">{escape(data.get('title', 'TAX INVOICE'))}</td></tr>",
+        "<tr><td>A.G AGRO</td></tr><tr><td>TEGHRA,BEGUSARAI-851133</td></tr><tr><td>10HVGPD2399M1ZC</td></tr>",
+        "</table>",
+        '<table class="sec"><tr><th>BILL TO</th><th>PLACE OF SUPPLY</th><th>BILL DETAILS:</th></tr></table>',
+        '<table class="blue"><tr>',
+        f"<td>{escape(data['bill_to'])}</td><td>{escape(data['place_of_supply'])}</td><td>{escape(details)}</td>",
+        "</tr><tr>",
+        f"<td style=\"text-align:center\">GST: {escape(str(data['GST']))}</td>",
+        f"<td style=\"text-align:center\" colspan=\"2\">PO-{escape(str(data['PO']))}</td>",
+        "</tr></table>",
+        '<table class="items"><thead><tr>',
+        "".join(f"<th>{h}</th>" for h in HEADERS),
+        "</tr></thead><tbody>",
+    ]
+    row_open = ('<tr class="alt">', "<tr>")
+    parts.extend(
+        f"{row_open[i % 2]}{_html_cells(_format_row(item, _Grouped))}</tr>"
+        for i, item in enumerate(items)
+    )
+    parts.append(f'<tr class="sub">{_html_cells(_subtotal_row(items, _Grouped))}</tr>')
+    parts.append("</tbody></table>")
+    parts.append("<p><b><i>Misc. Charges (Including Freight, Octroi, Loading, Unloading, etc.)</i></b></p>")
+    parts.append(_grand_total_html(items))
+    parts.append(_hsn_summary_html(items))
+    parts.append("<p style=\"text-align:center\"><b><i>THANK YOU FOR YOUR BUSINESS</i></b></p>")
+    parts.append("<p><b>Signature</b></p></body></html>")
+
+    return "".join(parts).encode("utf-8")
+
+
+def generate_html_bill(data: dict, filename, deterministic: bool = False):
+    write_atomic(filename, render_html_bill(data, deterministic))
+    return filename
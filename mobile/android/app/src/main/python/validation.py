@@ -0,0 +1,200 @@
+# Checks a PO frame before it is transformed into invoice items. The transform coerces
+# unparseable quantities and rates to 0 and drops the Excel footer rows, so problems
+# would otherwise reach the printed invoice unnoticed. Every check is one vectorized
+# pass over a column; per-row Python work happens only for the rows that are flagged.
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from atomic_write import write_atomic
+
+REPORT_DIR = Path("output") / ".reports" / "validation"
+RATE_HISTORY_FILE = Path("output") / ".reports" / "rates.json"
+RATE_HISTORY_VERSION = 1
+
+# rates kept per item code, and how many are needed before outliers are flagged
+RATE_WINDOW = 8
+MIN_RATE_HISTORY = 3
+# a rate this many times above (or below 1/x of) the item's recent median is an outlier
+OUTLIER_RATIO = 3.0
+# HSN codes as spreadsheets hold them: 4, 6 or 8 digits, with a leading zero dropped
+# (401 for 0401, 7091000 for 07091000)
+HSN_MIN, HSN_MAX = 100, 99_999_999
+# rows listed per check in a report; the count is always exact
+MAX_REPORTED_ROWS = 200
+
+ERROR, WARNING = "error", "warning"
+
+
+class ValidationError(ValueError):
+    """
+    Raised in strict mode when a PO has errors; `report` is the full validation report.
+    """
+
+    def __init__(self, report: dict):
+        super().__init__(f"{report['file']}: {report['errors']} validation errors")
+        self.report = report
+
+
+def _blank(raw: pd.Series) -> np.ndarray:
+    if pd.api.types.is_numeric_dtype(raw):
+        return raw.isna().to_numpy()
+    return (raw.isna() | (raw.astype(str).str.strip() == "")).to_numpy()
+
+
+def _numeric(raw: pd.Series) -> np.ndarray:
+    return pd.to_numeric(raw, errors="coerce").to_numpy(dtype=np.float64)
+
+
+class RateHistory:
+    """
+    The last RATE_WINDOW billed rates (integer paise) of every item code, used as
+    the reference for rate outliers. Updated from the items of each invoice generated.
+    """
+
+    def __init__(self, history_file: Path = RATE_HISTORY_FILE):
+        self.history_file = Path(history_file)
+        self._rates = {}
+        self._dirty = False
+        if self.history_file.exists():
+            stored = json.loads(self.history_file.read_text(encoding="utf-8"))
+            if stored.get("v") == RATE_HISTORY_VERSION:
+                self._rates = stored["rates"]
+        self._medians = None
+
+    def reference(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Median recent rate in rupees for each item code, NaN where the history is too short.
+        """
+        if self._medians is None:
+            self._medians = {
+                int(code): float(np.median(rates)) / 100
+                for code, rates in self._rates.items() if len(rates) >= MIN_RATE_HISTORY
+            }
+        if not self._medians:
+            return np.full(len(codes), np.nan)
+        return pd.Series(codes).map(self._medians).to_numpy(dtype=np.float64)
+
+    def record(self, codes, rates_paise):
+        """
+        Add one invoice's rates: item codes and integer paise rates, as arrays or lists.
+        """
+        for code, rate in zip(np.asarray(codes).tolist(), np.asarray(rates_paise).tolist()):
+            if code <= 0 or rate <= 0:
+                continue
+            window = self._rates.setdefault(str(int(code)), [])
+            window.append(int(rate))
+            del window[:-RATE_WINDOW]
+        self._medians = None
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        self.history_file.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"v": RATE_HISTORY_VERSION, "rates": self._rates}
+        write_atomic(self.history_file, json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        self._dirty = False
+
+
+def validate_po(df: pd.DataFrame, footer_rows: int = 0, history: RateHistory = None, name: str = "",
+                first_row: int = 2, keys=()) -> dict:
+    """
+    Check a PO frame as read, before transform_data_for_bill.
+    footer_rows: trailing rows the transform drops; they must not look like items.
+    history: recent rates per item code, for the outlier check (skipped if None).
+    first_row: sheet row of the first data row (2 below a header row), for the report.
+    keys: extra columns (a consolidated sheet's PO and site) that scope the duplicate check.
+    Returns {"file", "rows", "errors", "warnings", "checks": [...]}; each check lists
+    its severity, column, message, row count and the first MAX_REPORTED_ROWS rows and values.
+    """
+    n = len(df) - footer_rows if len(df) >= footer_rows else len(df)
+    items = df.iloc[:n]
+    checks = []
+
+    def flag(check, severity, column, message, mask, values=None):
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return
+        shown = rows[:MAX_REPORTED_ROWS]
+        source = items[column] if values is None else values
+        shown_values = pd.Series(np.asarray(source, dtype=object)[shown]).astype(str).tolist()
+        checks.append({
+            "check": check, "severity": severity, "column": column, "message": message, "count": int(len(rows)),
+            "rows": (shown + first_row).tolist(), "values": shown_values,
+        })
+
+    # quantities and rates: missing or text, zero, negative
+    parsed = {}
+    for column, label in (("Quantity", "quantity"), ("Landing Rate", "rate")):
+        # CSV and JSON readers already hold unparseable text as NaN, so empty and text are one check
+        value = parsed[column] = _numeric(items[column])
+        flag(f"{label}_missing", ERROR, column, f"{column} is empty or not a number, billed as 0", np.isnan(value))
+        flag(f"{label}_zero", ERROR, column, f"{column} is 0", value == 0)
+        flag(f"{label}_negative", ERROR, column, f"{column} is negative", value < 0)
+
+    # item codes: present, and listed once per PO
+    code = _numeric(items["Item Code"])
+    flag("item_code_missing", ERROR, "Item Code", "Item Code is empty or not a number", np.isnan(code))
+    scope = [items[key].astype(str).to_numpy() for key in keys]
+    duplicated = pd.DataFrame({**{f"k{i}": s for i, s in enumerate(scope)}, "code": code}).duplicated(keep=False)
+    flag("item_code_duplicate", WARNING, "Item Code", "Item Code appears on more than one row",
+         duplicated.to_numpy() & ~np.isnan(code))
+
+    # HSN codes: whole numbers of 4, 6 or 8 digits
+    hsn = _numeric(items["HSN Code"])
+    with np.errstate(invalid="ignore"):
+        bad_hsn = np.isnan(hsn) | (hsn != np.floor(hsn)) | (hsn < HSN_MIN) | (hsn > HSN_MAX)
+    flag("hsn_malformed", ERROR, "HSN Code", "HSN Code is not a 4, 6 or 8 digit number", bad_hsn)
+
+    # rates far from the item's recent median
+    if history is not None:
+        rate = parsed["Landing Rate"]
+        reference = history.reference(np.nan_to_num(code, nan=-1).astype(np.int64))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratio = rate / reference
+            outlier = (rate > 0) & ((ratio > OUTLIER_RATIO) | (ratio < 1 / OUTLIER_RATIO))
+        values = np.empty(n, dtype=object)
+        values[outlier] = [f"{r:g} (recent {m:g})" for r, m in zip(rate[outlier], reference[outlier])]
+        flag("rate_outlier", WARNING, "Landing Rate",
+             f"Landing Rate is more than {OUTLIER_RATIO:g}x off the item's recent median", outlier, values)
+
+    # the dropped footer rows must be summary rows, not items
+    if footer_rows and len(df) >= footer_rows:
+        footer = df.iloc[n:]
+        looks_like_item = ~np.isnan(_numeric(footer["Item Code"])) | ~_blank(footer["Product Description"])
+        if looks_like_item.any():
+            rows = np.flatnonzero(looks_like_item)
+            checks.append({
+                "check": "footer_has_item", "severity": ERROR, "column": "Item Code",
+                "message": f"one of the last {footer_rows} rows, dropped as the totals footer, holds an item",
+                "count": int(len(rows)), "rows": (rows + n + first_row).tolist(),
+                "values": footer["Item Code"].iloc[rows].astype(str).tolist(),
+            })
+
+    errors = sum(check["count"] for check in checks if check["severity"] == ERROR)
+    warnings = sum(check["count"] for check in checks if check["severity"] == WARNING)
+    return {"file": name, "rows": int(n), "errors": errors, "warnings": warnings, "checks": checks}
+
+
+def summarize(report: dict) -> str:
+    """
+    One line per report: its counts, then each check with its first rows.
+    """
+    parts = [f"{report['file']}: {report['errors']} errors, {report['warnings']} warnings"]
+    for check in report["checks"]:
+        rows = ", ".join(map(str, check["rows"][:5])) + (", ..." if check["count"] > 5 else "")
+        parts.append(f"  {check['severity']}: {check['message']} ({check['count']} rows: {rows})")
+    return "\n".join(parts)
+
+
+def save_report(report: dict, place: str, stem: str, report_dir: Path = REPORT_DIR) -> Path:
+    """
+    Write the report to <report_dir>/<place>/<stem>.json, replacing the one of an earlier run.
+    """
+    path = Path(report_dir) / place / f"{stem}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(path, json.dumps(report, indent=1).encode("utf-8"), fsync=False)
+    return path
@@ -54,32 +54,58 @@ class _BillHomePageState extends State<BillHomePage> {
 
   final List<String> _places = ['Bhagalpur', 'Begusarai'];
   String _selectedPlace = 'Bhagalpur';
-  String? _inputPath;
+  List<String> _inputPaths = [];
   String _status = "";
 
+  @override
+  void initState() {
+    super.initState();
+    _warmup();
+  }
+
+  // Preload pandas/openpyxl/reportlab so the first bill is as fast as the rest
+  Future<void> _warmup() async {
+    try {
+      final timings = await _channel.invokeMethod<String>('warmup');
+      debugPrint("Python warmup (ms): $timings");
+    } on PlatformException catch (e) {
+      debugPrint("Python warmup failed: ${e.message}");
+    }
+  }
+
   Future<void> _pickFile() async {
     final result = await FilePicker.platform.pickFiles(
       type: FileType.custom,
       allowedExtensions: ['xlsx'],
+      allowMultiple: true,
     );
-    if (result != null && result.files.single.path != null) {
+    final paths = result?.paths.whereType<String>().toList() ?? [];
+    if (paths.isNotEmpty) {
       setState(() {
-        _inputPath = result.files.single.path;
-        _status = "Ready to generate for “${_inputPath!.split('/').last}”";
+        _inputPaths = paths;
+        _status = paths.length == 1
+            ? "Ready to generate for “${paths.first.split('/').last}”"
+            : "Ready to generate ${paths.length} bills";
       });
     }
   }
 
   Future<void> _generateBill() async {
-    if (_inputPath == null) {
+    if (_inputPaths.isEmpty) {
       _showSnack("Please select an Excel file first");
       return;
     }
+    if (_inputPaths.length > 1) {
+      await _generateBills();
+      return;
+    }
     setState(() => _status = "Generating…");
     try {
       final jsonRaw = await _channel.invokeMethod<String>('generateBill', {
-        'data': _inputPath,
+        'data': _inputPaths.first,
         'place': _selectedPlace,
+        // only the PDF is opened; skip the Excel render
+        'formats': 'pdf',
       });
       final paths = jsonDecode(jsonRaw!);
       final pdfPath = paths['pdf'] as String;
@@ -90,6 +116,27 @@ class _BillHomePageState extends State<BillHomePage> {
     }
   }
 
+  // One bridge call for the whole selection: shared metadata, one counter write
+  Future<void> _generateBills() async {
+    setState(() => _status = "Generating ${_inputPaths.length} bills…");
+    try {
+      final jsonRaw = await _channel.invokeMethod<String>('generateBills', {
+        'paths': _inputPaths,
+        'place': _selectedPlace,
+        'formats': 'pdf',
+      });
+      final manifest = jsonDecode(jsonRaw!);
+      final bills = manifest['bills'] as List;
+      final errors = manifest['errors'] as List;
+      setState(() => _status = errors.isEmpty
+          ? "Generated ${bills.length} bills"
+          : "Generated ${bills.length} bills, ${errors.length} failed: "
+              "${errors.map((e) => (e['input'] as String).split('/').last).join(', ')}");
+    } on PlatformException catch (e) {
+      setState(() => _status = "Error: ${e.message}");
+    }
+  }
+
   void _showSnack(String message) {
     ScaffoldMessenger.of(context).showSnackBar(
       SnackBar(content: Text(message), behavior: SnackBarBehavior.floating),
@@ -131,13 +178,13 @@ class _BillHomePageState extends State<BillHomePage> {
                   // File picker & display
                   OutlinedButton.icon(
                     icon: const Icon(Icons.attach_file),
-                    label: const Text("Choose Excel File"),
+                    label: const Text("Choose Excel Files"),
                     onPressed: _pickFile,
                   ),
-                  if (_inputPath != null) ...[
+                  if (_inputPaths.isNotEmpty) ...[
                     const SizedBox(height: 8),
                     Text(
-                      _inputPath!.split('/').last,
+                      _inputPaths.map((p) => p.split('/').last).join('\n'),
                       style: const TextStyle(color: Colors.black87),
                       textAlign: TextAlign.center,
                     ),
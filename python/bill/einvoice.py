@@ -0,0 +1,233 @@
+# bill/einvoice.py
+# GST e-invoice (IRP schema 1.1) JSON built straight from the invoice dictionaries the
+# renderers take (run_meta / bill_data), including the stored invoice models, so the
+# upload file never requires re-keying from PDFs or re-reading the PO spreadsheets.
+# Validation is local: the schema's required fields, formats and value checks are
+# encoded below and no network access is needed.
+import json
+import re
+from datetime import datetime
+from pathlib import Path
+
+from utils.atomic_write import open_atomic
+from utils.money import paise_to_rupees, round_off
+
+SCHEMA_VERSION = "1.1"
+
+# the supplier block printed at the top of every invoice layout
+SELLER = {
+    "Gstin": "10HVGPD2399M1ZC",
+    "LglNm": "A.G AGRO",
+    "Addr1": "TEGHRA",
+    "Loc": "BEGUSARAI",
+    "Pin": 851133,
+    "Stcd": "10",
+}
+UNIT = "NOS"
+MAX_ITEMS = 1000   # the IRP rejects documents with more line items
+
+GSTIN_RE = re.compile(r"^[0-9]{2}[0-9A-Z]{13}$")
+DOC_NO_RE = re.compile(r"^[a-zA-Z1-9][a-zA-Z0-9/-]{0,15}$")
+DATE_RE = re.compile(r"^[0-3][0-9]/[0-1][0-9]/[0-9]{4}$")
+HSN_RE = re.compile(r"^([0-9]{4}|[0-9]{6}|[0-9]{8})$")
+PIN_RE = re.compile(r"\b([1-9][0-9]{5})\b")
+GST_RATES = {0, 0.1, 0.25, 1, 1.5, 3, 5, 6, 7.5, 12, 18, 28}
+
+
+def hsn_code(hsn) -> str:
+    """
+    HSN as the IRP expects it: 4, 6 or 8 digits. Spreadsheets drop the leading zero
+    of chapters 01-09 (6011000 for 06011000), so odd lengths are zero-padded back.
+    """
+    digits = str(int(hsn))
+    return digits.zfill(len(digits) + len(digits) % 2)
+
+
+def _rate_percent(sgst_rate: float, cgst_rate: float) -> float:
+    # item rows carry each half as a fraction (0.025); the schema wants the total in percent
+    return round((sgst_rate + cgst_rate) * 100, 3)
+
+
+def _buyer(data: dict, place: str) -> dict:
+    lines = [line.strip() for line in str(data["bill_to"]).splitlines() if line.strip()]
+    pins = PIN_RE.findall(data["bill_to"])
+    address = ", ".join(lines[1:]) or lines[0]
+    buyer = {
+        "Gstin": data["GST"],
+        "LglNm": lines[0][:100],
+        "Pos": data["GST"][:2],
+        "Addr1": address[:100],
+        "Loc": place[:50],
+        "Pin": int(pins[-1]) if pins else None,
+        "Stcd": data["GST"][:2],
+    }
+    if len(address) > 100:
+        buyer["Addr2"] = address[100:].strip(", ")[:100]
+    return buyer
+
+
+def build_einvoice(data: dict, place: str) -> dict:
+    """
+    One e-invoice document from a run_meta/bill_data dict. Amounts come from the
+    integer paise item columns, so the document totals match the printed invoice.
+    """
+    items = []
+    taxable = sgst_total = cgst_total = grand = 0
+    for sl_no, item in enumerate(data["items"], start=1):
+        code, hsn, desc, gram, qty, rate, tax_val, sgst_rate, sgst, cgst_rate, cgst, total = item
+        items.append({
+            "SlNo": str(sl_no),
+            "PrdDesc": f"{desc} {gram}".strip()[:300],
+            "IsServc": "N",
+            "HsnCd": hsn_code(hsn),
+            "Barcde": str(int(code)),
+            "Qty": qty,
+            "Unit": UNIT,
+            "UnitPrice": paise_to_rupees(rate),
+            "TotAmt": paise_to_rupees(tax_val),
+            "Discount": 0,
+            "AssAmt": paise_to_rupees(tax_val),
+            "GstRt": _rate_percent(sgst_rate, cgst_rate),
+            "IgstAmt": 0,
+            "CgstAmt": paise_to_rupees(cgst),
+            "SgstAmt": paise_to_rupees(sgst),
+            "TotItemVal": paise_to_rupees(total),
+        })
+        taxable += int(tax_val)
+        sgst_total += int(sgst)
+        cgst_total += int(cgst)
+        grand += int(total)
+
+    rounded = round_off(grand)
+    return {
+        "Version": SCHEMA_VERSION,
+        "TranDtls": {"TaxSch": "GST", "SupTyp": "B2B", "RegRev": "N"},
+        "DocDtls": {
+            "Typ": "INV",
+            "No": str(data["invoice_no"]),
+            "Dt": datetime.strptime(data["delivery_date"], "%d-%m-%Y").strftime("%d/%m/%Y"),
+        },
+        "SellerDtls": dict(SELLER),
+        "BuyerDtls": _buyer(data, place),
+        "ItemList": items,
+        "ValDtls": {
+            "AssVal": paise_to_rupees(taxable),
+            "CgstVal": paise_to_rupees(cgst_total),
+            "SgstVal": paise_to_rupees(sgst_total),
+            "IgstVal": 0,
+            "RndOffAmt": paise_to_rupees(rounded - grand),
+            "TotInvVal": paise_to_rupees(rounded),
+        },
+        "RefDtls": {"PrecDocDtls": [], "ContrDtls": [{"PORefr": str(data["PO"])[:50]}]},
+    }
+
+
+def _check_party(errors: list, prefix: str, party: dict, fields):
+    for field in fields:
+        if party.get(field) in (None, ""):
+            errors.append(f"{prefix}.{field} is required")
+    if party.get("Gstin") and not GSTIN_RE.match(party["Gstin"]):
+        errors.append(f"{prefix}.Gstin '{party['Gstin']}' is not a valid GSTIN")
+    if party.get("Pin") is not None and not (100000 <= party["Pin"] <= 999999):
+        errors.append(f"{prefix}.Pin must be a 6-digit number")
+    for field, low, high in (("LglNm", 3, 100), ("Addr1", 1, 100), ("Loc", 3, 50)):
+        value = party.get(field) or ""
+        if value and not (low <= len(value) <= high):
+            errors.append(f"{prefix}.{field} must be {low}-{high} characters")
+
+
+def validate_einvoice(doc: dict) -> list:
+    """
+    Check a document against the schema rules the IRP enforces. Returns a list of
+    error messages; an empty list means the document is valid.
+    """
+    errors = []
+    if doc.get("Version") != SCHEMA_VERSION:
+        errors.append(f"Version must be '{SCHEMA_VERSION}'")
+    tran = doc.get("TranDtls") or {}
+    if tran.get("TaxSch") != "GST":
+        errors.append("TranDtls.TaxSch must be 'GST'")
+    if tran.get("SupTyp") not in ("B2B", "SEZWP", "SEZWOP", "EXPWP", "EXPWOP", "DEXP"):
+        errors.append("TranDtls.SupTyp is not a valid supply type")
+
+    doc_dtls = doc.get("DocDtls") or {}
+    if doc_dtls.get("Typ") not in ("INV", "CRN", "DBN"):
+        errors.append("DocDtls.Typ must be INV, CRN or DBN")
+    if not DOC_NO_RE.match(str(doc_dtls.get("No", ""))):
+        errors.append(f"DocDtls.No '{doc_dtls.get('No')}' must be 1-16 characters of A-Z, 0-9, / or -")
+    if not DATE_RE.match(str(doc_dtls.get("Dt", ""))):
+        errors.append(f"DocDtls.Dt '{doc_dtls.get('Dt')}' must be DD/MM/YYYY")
+
+    _check_party(errors, "SellerDtls", doc.get("SellerDtls") or {}, ("Gstin", "LglNm", "Addr1", "Loc", "Pin", "Stcd"))
+    _check_party(errors, "BuyerDtls", doc.get("BuyerDtls") or {},
+                 ("Gstin", "LglNm", "Pos", "Addr1", "Loc", "Pin", "Stcd"))
+
+    items = doc.get("ItemList") or []
+    if not 1 <= len(items) <= MAX_ITEMS:
+        errors.append(f"ItemList must have 1-{MAX_ITEMS} items, has {len(items)}")
+    sums = {"AssVal": 0, "CgstVal": 0, "SgstVal": 0}
+    for item in items:
+        where = f"ItemList[{item.get('SlNo')}]"
+        if not HSN_RE.match(str(item.get("HsnCd", ""))):
+            errors.append(f"{where}.HsnCd '{item.get('HsnCd')}' must be 4, 6 or 8 digits")
+        if item.get("GstRt") not in GST_RATES:
+            errors.append(f"{where}.GstRt {item.get('GstRt')} is not a notified GST rate")
+        bad = [
+            field for field in ("Qty", "UnitPrice", "TotAmt", "AssAmt", "IgstAmt", "CgstAmt", "SgstAmt", "TotItemVal")
+            if not isinstance(item.get(field), (int, float)) or item[field] < 0
+        ]
+        errors.extend(f"{where}.{field} must be a non-negative number" for field in bad)
+        if bad:
+            continue
+        # compare in paise so float representation cannot cause a false mismatch
+        parts = round((item["AssAmt"] + item["CgstAmt"] + item["SgstAmt"] + item["IgstAmt"]) * 100)
+        if parts != round(item["TotItemVal"] * 100):
+            errors.append(f"{where}.TotItemVal does not equal AssAmt plus taxes")
+        sums["AssVal"] += round(item["AssAmt"] * 100)
+        sums["CgstVal"] += round(item["CgstAmt"] * 100)
+        sums["SgstVal"] += round(item["SgstAmt"] * 100)
+
+    val = doc.get("ValDtls") or {}
+    for field, total in sums.items():
+        if round(val.get(field, -1) * 100) != total:
+            errors.append(f"ValDtls.{field} does not equal the sum over ItemList")
+    expected = sums["AssVal"] + sums["CgstVal"] + sums["SgstVal"] + round(val.get("RndOffAmt", 0) * 100)
+    if round(val.get("TotInvVal", -1) * 100) != expected:
+        errors.append("ValDtls.TotInvVal does not equal the assessable value plus taxes and round-off")
+    return errors
+
+
+def export_einvoices(invoices, out, per_invoice: bool = False) -> dict:
+    """
+    Stream (data, place) pairs to e-invoice JSON: one array file at `out`, or with
+    per_invoice=True one <invoice_no>.json per invoice in the folder `out`.
+    Invalid documents are skipped and reported. Returns {"written": [...], "errors": {no: [...]}}.
+    """
+    out = Path(out)
+    written, failed = [], {}
+
+    def documents():
+        for data, place in invoices:
+            doc = build_einvoice(data, place)
+            problems = validate_einvoice(doc)
+            if problems:
+                failed[doc["DocDtls"]["No"]] = problems
+                continue
+            written.append(doc["DocDtls"]["No"])
+            yield doc
+
+    if per_invoice:
+        out.mkdir(parents=True, exist_ok=True)
+        for doc in documents():
+            with open_atomic(out / f"{doc['DocDtls']['No']}.json") as f:
+                json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
+    else:
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with open_atomic(out) as f:
+            f.write("[")
+            for i, doc in enumerate(documents()):
+                if i:
+                    f.write(",\n")
+                json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
+            f.write("]\n")
+    return {"written": written, "errors": failed}
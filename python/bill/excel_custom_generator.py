@@ -1,17 +1,113 @@
+from io import BytesIO
+from zipfile import ZipFile, ZIP_DEFLATED
+
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.styles import Font, Alignment, NamedStyle, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
-from utils.invoice_tracker import get_next_invoice_number
-
-invoice_number = get_next_invoice_number()
-
-def generate_excel_bill(data, filename):
+from openpyxl.writer.excel import ExcelWriter
+
+from utils.atomic_write import write_atomic
+from utils.indian_format import INR_NUMBER_FORMAT, amount_in_words
+from utils.line_items import LineItems
+from utils.money import HSN_SUMMARY_HEADERS, column_total, hsn_summary, paise_to_rupees, round_off
+from utils.reproducible import PinnedZipFile, invoice_datetime
+
+# 1-based columns holding integer paise in the item rows
+MONEY_COLS = (6, 7, 9, 11, 12)
+# number format of each item column; the rest are quantities and amounts, in lakhs and crores
+ITEM_FORMATS = {1: '0', 2: '0', 3: '@', 4: '@', 8: '0.00%', 10: '0.00%'}
+# zip level of the compact profile (zipfile's default is 6)
+COMPACT_ZIP_LEVEL = 9
+
+
+def _save_deterministic(wb, target, data, compresslevel=None):
+    """
+    Save without wall-clock timestamps: document properties and zip members
+    are all stamped with the invoice's delivery date.
+    """
+    stamp = invoice_datetime(data)
+    wb.properties.created = stamp
+    wb.properties.modified = stamp
+    archive = PinnedZipFile(target, stamp.timetuple(), compresslevel=compresslevel)
+    ExcelWriter(wb, archive).save()
+
+
+def _item_styles(wb) -> dict:
+    """
+    Named styles for the item rows of the compact profile: one per number format,
+    plain and banded. Returns {(column, banded): style name}.
+    """
+    thin = Side(style='thin')
+    border = Border(top=thin, bottom=thin, left=thin, right=thin)
+    alignment = Alignment(wrap_text=True, vertical="top")
+    band = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
+    names = {}
+    for col in range(1, 13):
+        number_format = ITEM_FORMATS.get(col, INR_NUMBER_FORMAT)
+        for banded in (False, True):
+            name = f"Item {number_format}" + (" banded" if banded else "")
+            if name not in wb.style_names:
+                # unbanded rows carry no fill at all: white on white only costs bytes
+                wb.add_named_style(NamedStyle(name, number_format=number_format, border=border,
+                                              alignment=alignment, fill=band if banded else PatternFill()))
+            names[col, banded] = name
+    return names
+
+
+def _write_hsn_summary(ws, start_row, items):
+    """
+    HSN-wise tax summary table in columns A:G from `start_row`. Returns the next free row.
+    """
+    thin = Side(style='thin')
+    border = Border(top=thin, bottom=thin, left=thin, right=thin)
+    rows, totals = hsn_summary(items)
+
+    ws.merge_cells(start_row=start_row, start_column=1, end_row=start_row, end_column=len(HSN_SUMMARY_HEADERS))
+    title = ws.cell(row=start_row, column=1, value="HSN SUMMARY")
+    title.font = Font(bold=True, italic=True)
+    title.alignment = Alignment(horizontal="left", vertical="center")
+
+    header_row = start_row + 1
+    for col_idx, header in enumerate(HSN_SUMMARY_HEADERS, start=1):
+        cell = ws.cell(row=header_row, column=col_idx, value=header)
+        cell.font = Font(bold=True, italic=True)
+        cell.fill = PatternFill(start_color="FFC000", end_color="FFC000", fill_type="solid")
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+        cell.border = border
+
+    # hsn, taxable, sgst rate, sgst, cgst rate, cgst, tax; the total row leaves the rates blank
+    total_row = ["Total", totals[0], None, totals[1], None, totals[2], totals[3]]
+    for row_offset, values in enumerate(rows + [total_row], start=1):
+        is_total = row_offset == len(rows) + 1
+        for col_idx, value in enumerate(values, start=1):
+            if col_idx in (2, 4, 6, 7) and value is not None:
+                value = paise_to_rupees(value)
+            cell = ws.cell(row=header_row + row_offset, column=col_idx, value=value)
+            cell.border = border
+            if col_idx == 1:
+                cell.number_format = '0'
+                cell.alignment = Alignment(horizontal="right" if is_total else "center")
+            elif col_idx in (3, 5):
+                cell.number_format = '0.00%'
+            else:
+                cell.number_format = INR_NUMBER_FORMAT
+            if is_total:
+                cell.font = Font(bold=True)
+    return header_row + len(rows) + 2
+
+
+def render_excel_bill(data, deterministic=False, compact=False) -> bytes:
+    """
+    Build the invoice workbook in memory and return the .xlsx bytes.
+    With compact=True the item rows reference a few named styles instead of each
+    cell carrying its own, and the package is deflated at a higher level.
+    """
     wb = Workbook()
     ws = wb.active
     ws.title = "Invoice"
 
     # === HEADER (Green section) ===
-    for row_num, value in enumerate(["TAX INVOICE", "A.G AGRO", "TEGHRA,BEGUSARAI-851133", "10HVGPD2399M1ZC"], start=1):
+    for row_num, value in enumerate([data.get("title", "TAX INVOICE"), "A.G AGRO", "TEGHRA,BEGUSARAI-851133", "10HVGPD2399M1ZC"], start=1):
         ws.merge_cells(start_row=row_num, start_column=1, end_row=row_num, end_column=12)
         cell = ws.cell(row=row_num, column=1, value=value)
         cell.alignment = Alignment(horizontal="center", vertical="center")
@@ -46,10 +142,11 @@ def generate_excel_bill(data, filename):
     ws["A6"] = data["bill_to"]
     ws["E6"] = data["place_of_supply"]
     ws["I6"] = (
-        f"INVOICE NO: {invoice_number}\n"
+        f"INVOICE NO: {data['invoice_no']}\n"
         f"DELIVERY DATE: {data['delivery_date']}\n"
         f"VENDOR CODE: {data['vendor_code']}\n"
         f"SITE CODE: {data['site_code']}"
+        + (f"\n{data['reference']}" if data.get("reference") else "")
     )
 
     for col in range(1, 13):
@@ -100,34 +197,31 @@ def generate_excel_bill(data, filename):
 
     # === DATA ROWS ===
     data_start_row = header_row + 1
-    for row_offset, item in enumerate(data["items"]):
+    items = LineItems.from_rows(data["items"])
+    columns = items.columns(rupee_idx=[col - 1 for col in MONEY_COLS])
+    names = _item_styles(wb) if compact else None
+    # style objects shared by every cell instead of built per cell; openpyxl stores each distinct style once
+    thin = Side(style='thin')
+    cell_border = Border(top=thin, bottom=thin, left=thin, right=thin)
+    cell_alignment = Alignment(wrap_text=True, vertical="top")
+    band_fills = (
+        PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid"),
+        PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid"),
+    )
+    number_formats = [ITEM_FORMATS.get(col, INR_NUMBER_FORMAT) for col in range(1, len(headers) + 1)]
+    for row, item in enumerate(zip(*columns), start=data_start_row):
         for col_idx, value in enumerate(item, start=1):
-            cell = ws.cell(row=data_start_row + row_offset, column=col_idx, value=value)
-            cell.alignment = Alignment(wrap_text=True, vertical="top")
-
-            if col_idx in (1, 2):
-                cell.number_format = '0'
-            elif col_idx in (5, 6, 7, 9, 11, 12):
-                cell.number_format = '#,##0.00'
-            elif col_idx in (8, 10):
-                cell.number_format = '0.00%'
-            else:
-                cell.number_format = '@'
-
-            if (data_start_row + row_offset) % 2 == 0:
-                cell.fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
-            else:
-                cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-
-            cell.border = Border(
-                top=Side(style='thin'),
-                bottom=Side(style='thin'),
-                left=Side(style='thin'),
-                right=Side(style='thin')
-            )
+            cell = ws.cell(row=row, column=col_idx, value=value)
+            if compact:
+                cell.style = names[col_idx, row % 2 == 0]
+                continue
+            cell.alignment = cell_alignment
+            cell.number_format = number_formats[col_idx - 1]
+            cell.fill = band_fills[row % 2]
+            cell.border = cell_border
 
     # === FOOTER (Sub Total) ===
-    footer_row = data_start_row + len(data["items"])
+    footer_row = data_start_row + len(items)
     label_cell = ws.cell(row=footer_row, column=1, value="Sub Total")
     label_cell.font = Font(bold=True)
     label_cell.alignment = Alignment(horizontal="right", vertical="center")
@@ -138,18 +232,18 @@ def generate_excel_bill(data, filename):
         right=Side(style='thin')
     )
 
+    # totals are summed exactly in paise rather than left to an Excel SUM over floats
     sum_cols = [5, 7, 8, 9, 10, 11, 12]
     for col_idx in sum_cols:
-        col_letter = get_column_letter(col_idx)
-        sum_cell = ws.cell(
-            row=footer_row,
-            column=col_idx,
-            value=f"=SUM({col_letter}{data_start_row}:{col_letter}{footer_row-1})"
-        )
+        if col_idx in MONEY_COLS:
+            total = paise_to_rupees(column_total(items, col_idx - 1))
+        else:
+            total = sum(columns[col_idx - 1])
+        sum_cell = ws.cell(row=footer_row, column=col_idx, value=total)
         if col_idx in (8, 10):
             sum_cell.number_format = '0.00%'
         else:
-            sum_cell.number_format = '#,##0.00'
+            sum_cell.number_format = INR_NUMBER_FORMAT
         sum_cell.font = Font(bold=True)
         sum_cell.alignment = Alignment(horizontal="center", vertical="center")
         sum_cell.border = Border(
@@ -162,15 +256,13 @@ def generate_excel_bill(data, filename):
     # === COLUMN WIDTHS ===
     min_width = 10
     max_width = 40
-    max_row = footer_row + 1
 
     for col in range(1, len(headers) + 1):
         column_letter = get_column_letter(col)
-        max_length = len(headers[col - 1])
-        for row in range(data_start_row, max_row):
-            value = ws.cell(row=row, column=col).value
-            if value:
-                max_length = max(max_length, len(str(value)))
+        # widest item or Sub Total value, measured from the columns rather than read back cell by cell
+        values = set(columns[col - 1])
+        values.add(ws.cell(row=footer_row, column=col).value)
+        max_length = max([len(headers[col - 1])] + [len(str(value)) for value in values if value])
         adjusted_width = min(max(max_length, min_width), max_width)
         ws.column_dimensions[column_letter].width = adjusted_width
 
@@ -189,11 +281,25 @@ def generate_excel_bill(data, filename):
     grand_cell = ws.cell(row=current_row, column=1, value="Grand Total (Rounded Off)")
     grand_cell.font = Font(bold=True, size=9 ,italic=True)
     grand_cell.alignment = Alignment(horizontal="right", vertical="center")
+    grand_total = round_off(column_total(items, 11))
+    grand_value = ws.cell(row=current_row, column=12, value=paise_to_rupees(grand_total))
+    grand_value.number_format = INR_NUMBER_FORMAT
+    grand_value.font = Font(bold=True, size=9)
+    current_row += 1
+
+    # Row: Amount in words
+    ws.merge_cells(start_row=current_row, start_column=1, end_row=current_row, end_column=12)
+    words_cell = ws.cell(row=current_row, column=1, value=f"Amount in words: {amount_in_words(grand_total)}")
+    words_cell.font = Font(size=9, italic=True)
+    words_cell.alignment = Alignment(horizontal="right", vertical="center")
     current_row += 1
 
     # Blank Row
     current_row += 1
 
+    # === HSN SUMMARY ===
+    current_row = _write_hsn_summary(ws, current_row, items) + 1
+
     # Thank You Row (Center-aligned)
     ws.merge_cells(start_row=current_row, start_column=1, end_row=current_row, end_column=12)
     thank_you_cell = ws.cell(row=current_row, column=1, value="THANK YOU FOR YOUR BUSINESS")
@@ -224,6 +330,19 @@ def generate_excel_bill(data, filename):
     signature_cell.font = Font(bold=True, size=8)
     signature_cell.alignment = Alignment(horizontal="left", vertical="center")
 
-    # === SAVE FILE ===
-    wb.save(filename)
+    # === SAVE ===
+    buffer = BytesIO()
+    compresslevel = COMPACT_ZIP_LEVEL if compact else None
+    if deterministic:
+        _save_deterministic(wb, buffer, data, compresslevel)
+    elif compact:
+        ExcelWriter(wb, ZipFile(buffer, "w", ZIP_DEFLATED, allowZip64=True, compresslevel=compresslevel)).save()
+    else:
+        wb.save(buffer)
+    return buffer.getvalue()
+
+
+def generate_excel_bill(data, filename, deterministic=False, compact=False):
+    # one bulk write to a temp file and a rename, so a crash never leaves a half-written .xlsx
+    write_atomic(filename, render_excel_bill(data, deterministic, compact))
     print(f"✅ Bill saved to {filename}")
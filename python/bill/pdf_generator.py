@@ -1,13 +1,180 @@
 # bill/pdf_generator.py
+import time
+from contextlib import contextmanager
+from io import BytesIO
+
+from reportlab import rl_config
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.lib import colors
 from reportlab.lib.styles import  ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle  
 from reportlab.lib.enums import TA_LEFT, TA_CENTER
-
-
-def generate_pdf_bill(data: dict, filename: str):
-    doc = SimpleDocTemplate(filename, pagesize=landscape(A4), rightMargin=10, leftMargin=10, topMargin=10, bottomMargin=10)
+from reportlab.lib.utils import TimeStamp
+from reportlab.pdfbase import pdfdoc
+from reportlab.pdfgen.canvas import Canvas
+
+from bill.pdf_layout import fit_column_widths, wrap_long_cells
+from utils.atomic_write import write_atomic
+from utils.indian_format import amount_in_words, format_indian, format_inr, format_inr_column
+from utils.line_items import LineItems
+from utils.money import HSN_SUMMARY_HEADERS, column_total, hsn_summary, round_off
+from utils.reproducible import invoice_epoch
+
+# 0-based item columns holding integer paise
+MONEY_IDX = (5, 6, 8, 10, 11)
+# text columns that may wrap: Article Description, Grammage
+WRAP_IDX = (2, 3)
+# cell text of each item column, matching the Excel number formats; the text columns pass through
+ITEM_FORMATTERS = {
+    0: str, 1: str,                                  # integer codes
+    4: format_indian,                                # quantity
+    7: lambda val: f"{val:.2%}", 9: lambda val: f"{val:.2%}",
+}
+# currency columns, integer paise in lakhs and crores, formatted a whole column at a time
+COLUMN_FORMATTERS = {idx: format_inr_column for idx in MONEY_IDX}
+# copy labels under GST invoice rules, in print order; copies beyond these are numbered
+COPY_LABELS = ("ORIGINAL FOR RECIPIENT", "DUPLICATE FOR TRANSPORTER", "TRIPLICATE FOR SUPPLIER")
+
+
+def copy_labels(copies: int) -> list:
+    if copies < 1:
+        raise ValueError(f"copies must be at least 1, got {copies}")
+    return [COPY_LABELS[i] if i < len(COPY_LABELS) else f"COPY {i + 1}" for i in range(copies)]
+
+
+class _CopiesCanvas(Canvas):
+    """
+    Canvas that prints the laid-out pages once per copy label. Each page the document
+    template finishes is kept as a form XObject rather than emitted; on save the
+    page sequence is emitted once per copy, each page a reference to its form plus
+    the copy label, so the layout runs once and the page content is stored once.
+    """
+
+    def __init__(self, *args, labels=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self._labels = labels
+        self._page_forms = []
+
+    def showPage(self):
+        # the form equivalent of Canvas.showPage: the page's stream and resources become an XObject
+        name = f"InvoicePage{len(self._page_forms) + 1}"
+        width, height = self._pagesize
+        form = pdfdoc.PDFFormXObject(lowerx=0, lowery=0, upperx=width, uppery=height)
+        form.compression = self._pageCompression
+        form.setStreamList([self._preamble] + self._code)
+        self._setColorSpace(form)
+        self._setExtGState(form)
+        self._setXObjects(form)
+        self._setAnnotations(form)
+        self._doc.addForm(name, form)
+        self._page_forms.append(name)
+        self._startPage()
+
+    def save(self):
+        if len(self._code):
+            self.showPage()
+        width, height = self._pagesize
+        for label in self._labels:
+            for name in self._page_forms:
+                self.doForm(name)
+                # in the top margin, right-aligned above the header band
+                self.setFont("Helvetica-BoldOblique", 7)
+                self.drawRightString(width - 10, height - 8, label)
+                Canvas.showPage(self)
+        self._doc.SaveToFile(self._filename, self)
+
+
+def _canvasmaker(epoch: int = None, labels=None):
+    """
+    Canvas factory for doc.build: timestamps pinned to `epoch` when it is set (see
+    _pin_timestamp), every page repeated per copy label when `labels` is set.
+    """
+    def make(*args, **kwargs):
+        if labels:
+            canv = _CopiesCanvas(*args, labels=labels, **kwargs)
+        else:
+            canv = Canvas(*args, **kwargs)
+        if epoch is not None:
+            _pin_timestamp(canv, epoch)
+        return canv
+    return make
+
+
+def _pin_timestamp(canv: Canvas, epoch: int):
+    """
+    Fix the canvas's CreationDate/ModDate to `epoch` and derive its
+    document ID from the invoice rather than the clock.
+    """
+    ts = TimeStamp(invariant=True)
+    ts.t = epoch
+    ts.lt = time.gmtime(epoch)
+    ts.YMDhms = tuple(ts.lt)[:6]
+    canv._doc._timeStamp = ts
+    canv._doc.updateSignature(str(epoch))
+
+
+@contextmanager
+def _binary_streams():
+    """
+    Write the compressed content streams as raw binary rather than ASCII85 text,
+    which is a quarter larger. ReportLab reads this from a global, so it is restored after.
+    """
+    saved = rl_config.useA85
+    rl_config.useA85 = 0
+    try:
+        yield
+    finally:
+        rl_config.useA85 = saved
+
+
+def _hsn_summary_table(items) -> Table:
+    """
+    HSN-wise tax summary, styled like the item table and sized to its content.
+    """
+    rows, totals = hsn_summary(items)
+    table_data = [HSN_SUMMARY_HEADERS]
+    for hsn, taxable, sgst_rate, sgst, cgst_rate, cgst, tax in rows:
+        table_data.append([
+            str(hsn), format_inr(taxable), f"{sgst_rate:.2%}", format_inr(sgst),
+            f"{cgst_rate:.2%}", format_inr(cgst), format_inr(tax),
+        ])
+    table_data.append(["Total", format_inr(totals[0]), "", format_inr(totals[1]),
+                       "", format_inr(totals[2]), format_inr(totals[3])])
+
+    tbl = Table(table_data, repeatRows=1, hAlign="LEFT")
+    tbl.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#FFC000')),
+        ('FONTNAME',   (0,0), (-1,0), 'Helvetica-BoldOblique'),
+        ('FONTSIZE',   (0,0), (-1,-1), 8),
+        ('GRID',       (0,0), (-1,-1), 0.5, colors.black),
+        ('ALIGN',      (0,0), (-1,0), 'CENTER'),
+        ('ALIGN',      (0,1), (0,-2), 'CENTER'),
+        ('ALIGN',      (1,1), (-1,-1), 'RIGHT'),
+        ('ALIGN',      (0,-1), (0,-1), 'RIGHT'),
+        ('FONTNAME',   (0,-1), (-1,-1), 'Helvetica-Bold'),
+    ]))
+    return tbl
+
+
+def render_pdf_bill(data: dict, deterministic: bool = False, compact: bool = False, copies: int = 1) -> bytes:
+    """
+    Render the invoice PDF in memory and return its bytes.
+    With deterministic=True the same data always produces the same bytes:
+    timestamps are pinned to the delivery date and the document ID to the invoice.
+    With compact=True the item rows share column-wide style commands, the white
+    bands are not painted, and the content streams are compressed binary.
+    With copies > 1 the invoice is laid out once and its pages are printed once per
+    copy (original, duplicate, triplicate), each page labelled with its copy.
+    """
+    labels = copy_labels(copies) if copies > 1 else None
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=landscape(A4), rightMargin=10, leftMargin=10, topMargin=10, bottomMargin=10,
+        invariant=1 if deterministic else None,
+        pageCompression=1 if compact else None,
+        title=f"Invoice {data['invoice_no']}",
+        subject=f"PO-{data['PO']}",
+    )
     story = []
 
     page_width = landscape(A4)[0] - 10 - 10
@@ -23,7 +190,7 @@ def generate_pdf_bill(data: dict, filename: str):
     )
     
     header_data = [
-        [Paragraph("TAX INVOICE",                 header1)],
+        [Paragraph(data.get("title", "TAX INVOICE"), header1)],
         [Paragraph("A.G AGRO",                    headerN)],
         [Paragraph("TEGHRA,BEGUSARAI-851133",      headerN)],
         [Paragraph("10HVGPD2399M1ZC",             headerN)],
@@ -98,7 +265,8 @@ def generate_pdf_bill(data: dict, filename: str):
         f"<b><i>INVOICE NO:</i></b> {data['invoice_no']}<br/>"
         f"<b><i>DELIVERY DATE:</i></b> {data['delivery_date']}<br/>"
         f"<b><i>VENDOR CODE:</i></b> {data['vendor_code']}<br/>"
-        f"<b><i>SITE CODE:</i></b> {data['site_code']}",
+        f"<b><i>SITE CODE:</i></b> {data['site_code']}"
+        + (f"<br/><b><i>{data['reference']}</i></b>" if data.get("reference") else ""),
         content_style
     )
 
@@ -163,27 +331,43 @@ def generate_pdf_bill(data: dict, filename: str):
         "ARTICLE CODE","HSN CODE","Article Description","Grammage","Quantity",
         "Rate","Taxable Value","SGST Rate","SGST Amount","CGST Rate","CGST Amount","Total Amount"
     ]
-    table_data = [headers]
-    for item in data["items"]:
-        # Format numbers as strings matching Excel formatting
-        row = []
-        for idx, val in enumerate(item):
-            if idx in (0,1):          # integer codes
-                row.append(f"{int(val)}")
-            elif idx in (4,5,6,8,10,11):  # currency columns
-                row.append(f"{val:,.2f}")
-            elif idx in (7,9):        # percentage columns
-                row.append(f"{val:.2%}")
+    # Format numbers as strings matching Excel formatting, one column at a time
+    items = LineItems.from_rows(data["items"])
+    body_rows = items.rows(ITEM_FORMATTERS, column_formatters=COLUMN_FORMATTERS)
+
+    sum_cols = [5, 7, 8, 9, 10, 11, 12]
+    subtotals = {}
+    for col in sum_cols:
+        # Python indexes from 0
+        idx = col - 1
+        if idx in MONEY_IDX:
+            subtotals[col] = column_total(items, idx)
+        else:
+            subtotals[col] = sum(items.column(idx).tolist())
+
+    # build the Sub Total row data (12 cells)
+    row_data = []
+    for col in range(1, 13):
+        if col == 1:
+            row_data.append("Sub Total")
+        elif col in sum_cols:
+            val = subtotals[col]
+            if col in (8, 10):
+                # SGST / CGST percent columns
+                row_data.append(f"{val:.2%}")
+            elif col - 1 in MONEY_IDX:
+                row_data.append(format_inr(val))
             else:
-                row.append(str(val))
-        table_data.append(row)
+                row_data.append(format_indian(val))
+        else:
+            row_data.append("")
 
-    # 2) Compute column widths (you can adjust these ratios)
-    #    Sum of ratios = 12 units
-    ratios = [1,1,3,1.8,0.8,0.8,1.2,1,1,1,1,1.2]
-    total_units = sum(ratios)
+    # 2) Compute column widths from the measured text: numbers on one line,
+    #    the remaining width to the text columns, which wrap only if they must
     page_width = landscape(A4)[0] - 20  # margins=10+10
-    col_widths = [page_width * r/total_units for r in ratios]
+    col_widths, headers = fit_column_widths(headers, body_rows, page_width, WRAP_IDX, extra_rows=[row_data])
+    wrap_style = ParagraphStyle("WrappedCell", fontName="Helvetica", fontSize=8, leading=9.6)
+    table_data = [headers] + wrap_long_cells(body_rows, col_widths, WRAP_IDX, wrap_style)
 
     # 3) Create the Table
     tbl = Table(table_data,
@@ -208,49 +392,34 @@ def generate_pdf_bill(data: dict, filename: str):
     style.add('GRID',       (0,0), (-1,-1), 0.5, colors.black)
 
     # — Data rows styling: alternating fill + alignment + wrap —
-    for row_idx in range(1, len(table_data)):
-        fill_color = colors.HexColor('#FFF2CC') if (row_idx % 2)==1 else colors.white
-        style.add('BACKGROUND', (0,row_idx), (-1,row_idx), fill_color)
-        style.add('VALIGN',     (0,row_idx), (-1,row_idx), 'TOP')
-        style.add('WORDWRAP',   (0,row_idx), (-1,row_idx), True)
-        # Right-align numeric columns
-        for col_idx in (0,1):
-            style.add('ALIGN', (col_idx, row_idx), (col_idx, row_idx), 'CENTER')
-        for col_idx in (4,5,6,7,8,9,10,11):
-            style.add('ALIGN', (col_idx, row_idx), (col_idx, row_idx), 'RIGHT')
+    if compact:
+        # a handful of commands for the whole body; only the shaded bands are painted
+        style.add('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.HexColor('#FFF2CC'), None])
+        style.add('VALIGN',     (0,1), (-1,-1), 'TOP')
+        style.add('WORDWRAP',   (0,1), (-1,-1), True)
+        style.add('ALIGN',      (0,1), (1,-1),  'CENTER')
+        style.add('ALIGN',      (4,1), (-1,-1), 'RIGHT')
+    else:
+        for row_idx in range(1, len(table_data)):
+            fill_color = colors.HexColor('#FFF2CC') if (row_idx % 2)==1 else colors.white
+            style.add('BACKGROUND', (0,row_idx), (-1,row_idx), fill_color)
+            style.add('VALIGN',     (0,row_idx), (-1,row_idx), 'TOP')
+            style.add('WORDWRAP',   (0,row_idx), (-1,row_idx), True)
+            # Right-align numeric columns
+            for col_idx in (0,1):
+                style.add('ALIGN', (col_idx, row_idx), (col_idx, row_idx), 'CENTER')
+            for col_idx in (4,5,6,7,8,9,10,11):
+                style.add('ALIGN', (col_idx, row_idx), (col_idx, row_idx), 'RIGHT')
 
     tbl.setStyle(style)
 
     # 5) Add to your story
     story.append(tbl)
     
-    sum_cols = [5, 7, 8, 9, 10, 11, 12]
-    # data["items"] is a list of rows, each row being a list of 12 values
-    subtotals = {}
-    for col in sum_cols:
-        # Python indexes from 0
-        idx = col - 1
-        subtotals[col] = sum(row[idx] for row in data["items"])
-
-    # 2. build the PDF row data (12 cells)
-    row_data = []
-    for col in range(1, 13):
-        if col == 1:
-            row_data.append("Sub Total")
-        elif col in sum_cols:
-            val = subtotals[col]
-            if col in (8, 10):
-                # SGST / CGST percent columns
-                row_data.append(f"{val:.2%}")
-            else:
-                row_data.append(f"{val:,.2f}")
-        else:
-            row_data.append("")
-
-    # 3. create a one-row Table with the same column widths as your main table
+    # create a one-row Sub Total Table with the same column widths as your main table
     subtotal_table = Table([row_data], colWidths=col_widths)
 
-    # 4. style it to match Excel's footer
+    # style it to match Excel's footer
     subtotal_table.setStyle(TableStyle([
         # thin borders around every cell
         ('GRID',       (0,0), (-1,-1), 0.5, colors.black),
@@ -285,19 +454,41 @@ def generate_pdf_bill(data: dict, filename: str):
         name="Grand",
         fontSize=9,
         leading=11,
-        spaceAfter=8,
+        spaceAfter=2,
         alignment=TA_CENTER,
         fontName="Helvetica-BoldOblique",
     )
+    words_style = ParagraphStyle(
+        name="Words",
+        fontSize=9,
+        leading=11,
+        spaceAfter=8,
+        alignment=TA_CENTER,
+        fontName="Helvetica-Oblique",
+    )
 
     story.append(Paragraph(
         "Misc. Charges (Including Freight, Octroi, Loading, Unloading, etc.)",
         misc_style,
     ))
+    grand_total = round_off(subtotals[12])
     story.append(Paragraph(
-        "Grand Total (Rounded Off)",
+        f"Grand Total (Rounded Off): {format_inr(grand_total)}",
         grand_style,
     ))
+    story.append(Paragraph(f"Amount in words: {amount_in_words(grand_total)}", words_style))
+
+    # === HSN SUMMARY ===
+    hsn_title = ParagraphStyle(
+        name="HsnTitle",
+        fontSize=9,
+        leading=11,
+        spaceAfter=2,
+        alignment=TA_LEFT,
+        fontName="Helvetica-BoldOblique",
+    )
+    story.append(Paragraph("HSN SUMMARY", hsn_title))
+    story.append(_hsn_summary_table(items))
 
     # === Blank Row ===
     story.append(Spacer(1, 12))
@@ -324,4 +515,21 @@ def generate_pdf_bill(data: dict, filename: str):
     story.append(Paragraph("Signature", sig_style))
 
     # === Final PDF generation ===
-    doc.build(story)
+    build_args = {}
+    if deterministic or labels:
+        build_args["canvasmaker"] = _canvasmaker(invoice_epoch(data) if deterministic else None, labels)
+    if compact:
+        with _binary_streams():
+            doc.build(story, **build_args)
+    else:
+        doc.build(story, **build_args)
+    return buffer.getvalue()
+
+
+def generate_pdf_bill(data: dict, filename: str, deterministic: bool = False, compact: bool = False,
+                      copies: int = 1):
+    """
+    Render the invoice PDF to `filename` with one write to a temp file and an atomic rename.
+    """
+    write_atomic(filename, render_pdf_bill(data, deterministic, compact, copies))
+    return filename
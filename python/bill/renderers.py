@@ -0,0 +1,59 @@
+# bill/renderers.py
+import importlib
+
+# format -> (module, function). Modules are imported on first use, so a run that
+# asks only for csv never loads openpyxl or reportlab.
+RENDERERS = {
+    "xlsx": ("bill.excel_custom_generator", "generate_excel_bill"),
+    "pdf": ("bill.pdf_generator", "generate_pdf_bill"),
+    "csv": ("bill.text_generator", "generate_csv_bill"),
+    "html": ("bill.text_generator", "generate_html_bill"),
+}
+# format -> in-memory variant returning the document bytes, for callers that
+# never want a file on disk (a service response, a zip archive)
+BYTES_RENDERERS = {
+    "xlsx": ("bill.excel_custom_generator", "render_excel_bill"),
+    "pdf": ("bill.pdf_generator", "render_pdf_bill"),
+    "csv": ("bill.text_generator", "render_csv_bill"),
+    "html": ("bill.text_generator", "render_html_bill"),
+}
+DEFAULT_FORMATS = ("xlsx", "pdf")
+
+
+def parse_formats(formats=None) -> tuple:
+    """
+    Normalise a formats option: None, "xlsx,pdf" or ["pdf", "csv"] -> ("pdf", "csv").
+    """
+    if formats is None:
+        return DEFAULT_FORMATS
+    if isinstance(formats, str):
+        formats = formats.split(",")
+    result = []
+    for fmt in formats:
+        fmt = fmt.strip().lower().lstrip(".")
+        if not fmt:
+            continue
+        if fmt not in RENDERERS:
+            raise ValueError(f"Unknown output format '{fmt}', expected one of {', '.join(RENDERERS)}")
+        if fmt not in result:
+            result.append(fmt)
+    if not result:
+        raise ValueError("No output formats requested")
+    return tuple(result)
+
+
+def get_renderer(fmt: str):
+    module_name, func_name = RENDERERS[fmt]
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def get_bytes_renderer(fmt: str):
+    module_name, func_name = BYTES_RENDERERS[fmt]
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def render_bytes(fmt: str, data: dict, deterministic: bool = False, compact: bool = False) -> bytes:
+    """
+    Render `data` as `fmt` without touching the disk.
+    """
+    return get_bytes_renderer(fmt)(data, deterministic=deterministic, compact=compact)
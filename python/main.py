@@ -1,95 +1,651 @@
 # main.py
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 import json
+import os
+import time
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from bill.pdf_generator import generate_pdf_bill
-
-from bill.excel_custom_generator import generate_excel_bill
-from utils.invoice_tracker import get_next_invoice_number
-from scripts.load_product_data import extract_po_and_date_from_filename  
-
-def transform_data_for_bill(df):
-    # … your existing transform_data_for_bill unchanged …
-    df["Quantity"] = pd.to_numeric(df["Quantity"], errors="coerce", downcast="integer").fillna(0).astype(int)
-    df["Landing Rate"] = pd.to_numeric(df["Landing Rate"], errors="coerce", downcast="float").fillna(0.0).astype(float)
-    df["Item Code"]    = pd.to_numeric(df["Item Code"],    errors="coerce", downcast="integer").fillna(0).astype(int)
-    df["HSN Code"]     = pd.to_numeric(df["HSN Code"],     errors="coerce", downcast="integer").fillna(0).astype(int)
-    df["Product Description"] = df["Product Description"].astype(str).fillna("")
-    df["Grammage"]              = df["Grammage"].astype(str).fillna("")
-    df = df.dropna(subset=["Quantity","Landing Rate","Item Code","HSN Code","Product Description","Grammage"])
-    items = []
-    for _, row in df.iterrows():
-        qty, rate = row["Quantity"], row["Landing Rate"]
-        total = round(qty * rate, 2)
-        items.append([
-            row["Item Code"], row["HSN Code"],
-            row["Product Description"].strip(), row["Grammage"].strip(),
-            qty, rate, total,
-            0.00, 0.0,
-            0.00, 0.0,
-            total
-        ])
-    return items[:-3] if len(items) >= 3 else items
+from bill.renderers import get_renderer, parse_formats
+from utils.invoice_tracker import get_next_invoice_number, reserve_invoice_numbers
+from utils.job_queue import QUARANTINED, RETRY, JobQueue, describe_run
+from utils import aggregates, invoice_store, metadata_deps, po_diff, render_cache
+from utils.line_items import LineItems
+from utils.memory_budget import MemoryBudget
+from utils.money import PAISE_DTYPE, to_paise
+from utils.output_store import month_dir
+from utils.validation import RateHistory, ValidationError, save_report, summarize, validate_po
+from scripts.load_product_data import (
+    JSON_SUFFIXES, extract_po_and_date_from_filename, po_footer_rows, read_po_file, split_consolidated_po,
+)
+from scripts.po_catalog import POCatalog
+
+# metadata keys that are not places
+COMMON_KEYS = ["invoice_no", "GST", "PO", "delivery_date", "vendor_code"]
+
+def transform_data_for_bill(df, footer_rows=3):
+    """
+    PO frame -> LineItems, rows of 12 values held as typed columns (utils/line_items.py).
+    Money columns (rate, taxable value, tax amounts, total) are integer paise; see utils/money.py.
+    """
+    if footer_rows:
+        df = df.iloc[:-footer_rows] if len(df) >= footer_rows else df
+    n = len(df)
+    # rate stays float64 until to_paise: a float32 downcast loses paise above ~1 lakh
+    qty  = pd.to_numeric(df["Quantity"], errors="coerce").fillna(0).astype(PAISE_DTYPE).to_numpy()
+    rate = to_paise(pd.to_numeric(df["Landing Rate"], errors="coerce").fillna(0.0))
+    code = pd.to_numeric(df["Item Code"], errors="coerce").fillna(0).astype("int64")
+    hsn  = pd.to_numeric(df["HSN Code"],  errors="coerce").fillna(0).astype("int64")
+    desc = df["Product Description"].astype(str).str.strip()
+    gram = df["Grammage"].astype(str).str.strip()
+
+    taxable = qty * rate
+    sgst = np.zeros(n, dtype=PAISE_DTYPE)
+    cgst = np.zeros(n, dtype=PAISE_DTYPE)
+    total = taxable + sgst + cgst
+    rates = np.zeros(n, dtype=np.float64)
+
+    return LineItems([
+        code.to_numpy(), hsn.to_numpy(), desc.tolist(), gram.tolist(),
+        qty, rate, taxable,
+        rates, sgst,
+        rates, cgst,
+        total,
+    ])
 
 def load_metadata(metadata_file="metadata.json"):
     return json.loads(Path(metadata_file).read_text())
 
-def main():
+def render_output(fmt, run_meta, out_path, deterministic=False, compact=False, copies=1):
+    """
+    Render one output file in format `fmt`.
+    In deterministic mode renders are content-addressed: identical invoice data is
+    served from the render cache instead of being rendered again.
+    compact=True selects the size-minimised profile (shared styles, compressed streams).
+    copies > 1 prints a PDF's pages once per copy (original, duplicate, ...); other formats ignore it.
+    Returns True on a cache hit.
+    """
+    generate = get_renderer(fmt)
+    options = {"copies": copies} if fmt == "pdf" and copies > 1 else {}
+    if not deterministic:
+        generate(run_meta, filename=str(out_path), compact=compact, **options)
+        return False
+
+    key = render_cache.invoice_key(run_meta, fmt, compact, options.get("copies", 1))
+    if render_cache.fetch(key, out_path):
+        return True
+    generate(run_meta, filename=str(out_path), deterministic=True, compact=compact, **options)
+    render_cache.store(key, out_path)
+    return False
+
+def render_options(fmt, deterministic=False, compact=False, copies=1):
+    """
+    The options that change what a rendered file contains, as recorded next to the
+    invoice model (invoice_store.record_renders) and compared by ensure_output.
+    Only a PDF prints copies.
+    """
+    return {"deterministic": deterministic, "compact": compact, "copies": copies if fmt == "pdf" else 1}
+
+def parse_delivery_date(raw_date):
+    """
+    Normalise a delivery date to (DD-MM-YYYY for the invoice, YYYY-MM-DD for filenames).
+    Accepts DD-MM-YYYY or YYYY-MM-DD text or a date/Timestamp cell; anything else is passed through.
+    """
+    if hasattr(raw_date, "strftime"):
+        return raw_date.strftime("%d-%m-%Y"), raw_date.strftime("%Y-%m-%d")
+    for fmt in ("%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            dt = datetime.strptime(str(raw_date).strip(), fmt)
+            return dt.strftime("%d-%m-%Y"), dt.strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    return raw_date, raw_date
+
+def build_run_meta(metadata, place, po, delivery_date, invoice_no, items):
+    return {
+        **metadata,  # common fields: vendor_code, GST, etc.
+        "PO": po,
+        "delivery_date": delivery_date,
+        "invoice_no": str(invoice_no),
+        "bill_to": metadata[place]["bill_to"],
+        "place_of_supply": metadata[place]["place_of_supply"],
+        "site_code": metadata[place]["site_code"],
+        "items": items
+    }
+
+def render_invoice(run_meta, tgt_dir, out_stem, formats, deterministic=False, budget=None, compact=False, copies=1):
+    """
+    Generate each requested format for one assembled invoice, one after another.
+    Returns {format: output path}.
+    """
+    budget = budget or MemoryBudget()
+    outputs = {}
+    for fmt in formats:
+        out_path = tgt_dir / f"{out_stem}.{fmt}"
+        with budget.stage(fmt):
+            cached = render_output(fmt, run_meta, out_path, deterministic, compact, copies)
+        budget.release()
+        outputs[fmt] = out_path
+        print(f"{'Cached' if cached else 'Generated'} {fmt.upper()}: {out_path}")
+    return outputs
+
+def output_path(model, fmt, base_target=Path("output")):
+    """
+    Where format `fmt` of a stored invoice model is rendered: output/<place>/<YYYY-MM>/<out_stem>.<fmt>.
+    """
+    _, file_date_part = parse_delivery_date(model["data"]["delivery_date"])
+    return month_dir(Path(base_target) / model["place"], file_date_part) / f"{model['out_stem']}.{fmt}"
+
+def ensure_output(model, fmt, base_target=Path("output"), deterministic=False, force=False, compact=False,
+                  copies=1):
+    """
+    Path of format `fmt` for a stored invoice model, rendering it only if it has not
+    been rendered since the model was saved, or was rendered with other options
+    (see render_options), or if force=True, for a reprint.
+    Returns (path, rendered).
+    """
+    out_path = output_path(model, fmt, base_target)
+    options = render_options(fmt, deterministic, compact, copies)
+    if not force and _is_fresh(model, fmt, out_path, options):
+        return out_path, False
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    render_output(fmt, model["data"], out_path, deterministic, compact, copies)
+    invoice_store.record_renders(model["place"], model["out_stem"], {fmt: (out_path, options)})
+    return out_path, True
+
+def _is_fresh(model, fmt, out_path, options):
+    if not out_path.exists():
+        return False
+    stat = out_path.stat()
+    if stat.st_mtime < invoice_store.model_path(model["place"], model["out_stem"]).stat().st_mtime:
+        return False
+    recorded = invoice_store.load_renders(model["place"], model["out_stem"]).get(fmt)
+    return (recorded is not None and recorded["mtime_ns"] == stat.st_mtime_ns
+            and recorded["options"] == options)
+
+def render_stored(place, out_stem, formats, deterministic=False, compact=False, copies=1, memory_budget_mb=None):
+    """
+    Render the formats of a stored invoice that are missing or older than its model;
+    the render step of a queued job, run in a worker process. Returns ({format: output path},
+    the memory budget's report or None), the report for the parent to print with the billing stages.
+    """
+    model = invoice_store.load_model(invoice_store.model_path(place, out_stem))
+    outputs = {}
+    with MemoryBudget(memory_budget_mb) as budget:
+        budget.plan(len(model["data"]["items"]), formats)
+        for fmt in formats:
+            with budget.stage(fmt):
+                out_path, rendered = ensure_output(model, fmt, deterministic=deterministic, compact=compact,
+                                                   copies=copies)
+            budget.release()
+            outputs[fmt] = out_path
+            print(f"{'Generated' if rendered else 'Ready'} {fmt.upper()}: {out_path}")
+    return outputs, budget.report() if budget.enabled else None
+
+def check_po(df, file_path, place, footer_rows, rates=None, strict=False, keys=()):
+    """
+    Validate a PO frame as read (utils/validation.py), save its report under
+    output/.reports/validation/<place>/ and print a summary when anything is flagged.
+    In strict mode a PO with errors raises ValidationError, before an invoice number is used.
+    """
+    file_path = Path(file_path)
+    first_row = 1 if file_path.suffix.lower() in JSON_SUFFIXES else 2
+    report = validate_po(df, footer_rows, rates, file_path.name, first_row, keys)
+    save_report(report, place, file_path.stem)
+    if report["checks"]:
+        print(summarize(report))
+    if strict and report["errors"]:
+        raise ValidationError(report)
+    return report
+
+def plan_revision(items, file_path, place, po, mode="replace"):
+    """
+    How to bill a PO whose number has been billed before at this place (utils/po_diff.py).
+    Returns None to bill it as a new invoice (a first version, or mode "rebill"), else
+    {"action": "reuse", "model"} when the items match the latest invoice of the PO,
+    {"action": "superseded", "model"} when this file was billed and a later version followed,
+    {"action": "revise", "previous", "n", "diff"} for a changed version: its revision
+    number and its keyed diff against the PO as last billed.
+    """
+    if mode == "rebill":
+        return None
+    models = invoice_store.po_models(place, po)
+    if not models:
+        return None
+    latest = models[-1]
+    own = [model for model in models if model.get("source") == Path(file_path).name]
+    if own and own[-1] is not latest:
+        return {"action": "superseded", "model": latest}
+    diff = po_diff.diff_items(invoice_store.po_items(latest), items)
+    if po_diff.changed(diff).empty:
+        return {"action": "reuse", "model": latest}
+    return {"action": "revise", "previous": latest, "n": len(models) + 1, "diff": diff}
+
+def bill_revision(run_meta, items, revision, mode):
+    """
+    Turn a new version's run_meta into its revision bill: a replacement invoice of
+    all its items, or a difference bill of the changed lines. Both carry a title and
+    a line referencing the invoice they revise. Returns (run_meta, stem suffix, model extra).
+    """
+    previous = revision["previous"]["data"]["invoice_no"]
+    run_meta["title"] = po_diff.TITLES[mode]
+    run_meta["reference"] = f"{po_diff.REFERENCES[mode]}: {previous}"
+    record = {"n": revision["n"], "mode": mode, "of": previous, **po_diff.summary(revision["diff"])}
+    extra = {"revision": record}
+    if mode == "difference":
+        run_meta["items"] = po_diff.difference_items(revision["diff"])
+        # the next version is diffed against the PO as a whole, not against this bill
+        extra["po_items"] = items
+    return run_meta, f"_{'R' if mode == 'replace' else 'D'}{revision['n']}", extra
+
+def revise(run_meta, items, revision, mode, file_path, place, out_stem):
+    """
+    bill_revision for a PO file (or a sheet's group), with its revision report saved
+    under output/.reports/revisions/ and a summary printed. Returns (run_meta, out_stem, model extra).
+    """
+    po = run_meta["PO"]
+    run_meta, suffix, extra = bill_revision(run_meta, items, revision, mode)
+    out_stem += suffix
+    report = {"file": Path(file_path).name, "PO": str(po), "invoice_no": run_meta["invoice_no"],
+              **extra["revision"], "lines": po_diff.changed(revision["diff"]).to_dict("records")}
+    save_report(report, place, out_stem, po_diff.REPORT_DIR)
+    print(f"Revision {revision['n']} of PO {po} ({mode}, against invoice "
+          f"{revision['previous']['data']['invoice_no']}): {po_diff.describe(extra['revision'])}")
+    return run_meta, out_stem, extra
+
+def process_po_file(file_path, place, metadata, tgt_dir, formats, deterministic=False, memory_budget_mb=None,
+                    lazy=False, compact=False, strict=False, rates=None, revisions="replace", copies=1,
+                    budget=None):
+    """
+    Generate every requested format for one PO file. Returns (out_stem, {format: output path}):
+    the stored invoice the file was billed as, or served from if it was billed before,
+    and None for a file superseded by a later revision of its PO.
+    With memory_budget_mb set, memory is traced per stage, and when the row count
+    says the budget would be exceeded the DataFrame is released before rendering
+    and each renderer's garbage is collected before the next one runs.
+    The invoice model is always stored; with lazy=True nothing is rendered and the
+    formats are produced on first request (scripts/invoices.py).
+    The sheet is validated first; with strict=True a PO with errors raises ValidationError.
+    `rates` is the RateHistory for the outlier check, loaded and saved here if not given.
+    `budget` is the MemoryBudget to trace into; one is made (and its summary printed) if not given.
+    A PO number already billed at this place is a revision (see plan_revision):
+    revisions="replace" bills it as a replacement invoice, "difference" bills only the
+    changed lines, "rebill" bills it again as a new invoice. An unchanged resend is not
+    billed again; the outputs of its invoice are returned instead.
+    copies > 1 prints that many labelled copies in the PDF.
+    """
+    own_rates = rates is None
+    rates = RateHistory() if own_rates else rates
+    own_budget = budget is None
+    with (MemoryBudget(memory_budget_mb) if own_budget else budget) as budget:
+        # 1) extract PO & date
+        po, raw_date = extract_po_and_date_from_filename(file_path.name)
+        # parse to datetime so formatting consistent
+        delivery_date, file_date_part = parse_delivery_date(raw_date)
+
+        # 2) read df and transform
+        with budget.stage("read"):
+            df = read_po_file(file_path)
+        footer_rows = po_footer_rows(file_path)
+        with budget.stage("validate"):
+            check_po(df, file_path, place, footer_rows, rates, strict)
+        with budget.stage("transform"):
+            items = transform_data_for_bill(df, footer_rows=footer_rows)
+        if budget.plan(len(items), formats):
+            del df
+            budget.release()
+
+        # 3) a PO number billed before: compare with the version billed last
+        revision = plan_revision(items, file_path, place, po, revisions)
+        if revision and revision["action"] != "revise":
+            model = revision["model"]
+            invoice_no = model["data"]["invoice_no"]
+            if revision["action"] == "superseded":
+                print(f"Superseded: {file_path.name} was revised by invoice {invoice_no}, not billed again")
+                return None, {}
+            print(f"Unchanged: {file_path.name} is billed as invoice {invoice_no}")
+            return model["out_stem"], {} if lazy else {
+                fmt: ensure_output(model, fmt, tgt_dir.parent, deterministic, compact=compact, copies=copies)[0]
+                for fmt in formats
+            }
+
+        # 4) assemble metadata for this run
+        run_meta = build_run_meta(metadata, place, po, delivery_date, get_next_invoice_number(), items)
+        out_stem = f"{place}_{file_date_part}_{po}"
+        extra = {"source": file_path.name}
+        if revision:
+            run_meta, out_stem, revision_extra = revise(run_meta, items, revision, revisions, file_path, place,
+                                                         out_stem)
+            extra.update(revision_extra)
+
+        # 5) store the model that every format renders from
+        model_file = invoice_store.save_model(run_meta, place, out_stem, extra=extra)
+        metadata_deps.record([(place, out_stem, run_meta)])
+        rates.record(items.column(0), items.column(5))
+
+        # 6) generate each requested format, one after another
+        if lazy:
+            outputs = {}
+            print(f"Stored invoice {run_meta['invoice_no']}: {model_file}")
+        else:
+            out_dir = month_dir(tgt_dir, file_date_part)
+            out_dir.mkdir(parents=True, exist_ok=True)
+            outputs = render_invoice(run_meta, out_dir, out_stem, formats, deterministic, budget, compact, copies)
+            invoice_store.record_renders(place, out_stem, {
+                fmt: (path, render_options(fmt, deterministic, compact, copies)) for fmt, path in outputs.items()
+            })
+
+        # 7) fold this invoice's per-HSN totals into the reporting ledger (scripts/report.py).
+        # The ledger keeps the latest invoice of a PO, so a difference bill is entered
+        # with the PO's full items: the totals stay those of the PO as now billed.
+        aggregates.record_invoice({**run_meta, "items": items}, place, file_date_part)
+
+        if budget.enabled and own_budget:
+            print(budget.summary())
+    if own_rates:
+        rates.save()
+    return out_stem, outputs
+
+def resolve_place(metadata, site):
+    """
+    Map a site cell to a metadata place: the place name (any case) or its site_code.
+    """
+    wanted = str(site).strip().lower()
+    for place, info in metadata.items():
+        if place in COMMON_KEYS or not isinstance(info, dict):
+            continue
+        if wanted in (place.lower(), str(info.get("site_code", "")).lower()):
+            return place
+    raise ValueError(f"Unknown site '{site}': not a place or site_code in metadata.json")
+
+def process_consolidated_file(file_path, metadata, base_target, formats, po_column, site_column,
+                              date_column=None, deterministic=False, workers=None, lazy=False, compact=False,
+                              strict=False, copies=1, revisions="replace"):
+    """
+    One sheet covering many POs and sites -> one invoice per (PO, site).
+    The sheet is read once and split in one groupby; invoice numbers are reserved
+    up front in sheet order, and the invoices are rendered in parallel worker processes.
+    The whole sheet is validated in one pass first, duplicates counted per PO and site;
+    with strict=True any error stops the sheet before invoice numbers are reserved.
+    A (PO, site) billed before is handled as a single PO file is (see plan_revision):
+    unchanged it is served from its invoice, a changed one is billed as set by
+    `revisions`, and a sheet superseded by a later version of the PO skips it, so
+    running the same sheet again bills nothing new.
+    Returns [(run_meta, {format: output path})] of the invoices billed or served.
+    """
+    file_path = Path(file_path)
+    extra = [col for col in (po_column, site_column, date_column) if col]
+    df = read_po_file(file_path, extra_columns=extra)
+    rates = RateHistory()
+    check_po(df, file_path, "consolidated", 0, rates, strict, keys=(po_column, site_column))
+    groups = split_consolidated_po(df, po_column, site_column, date_column)
+    del df
+
+    # the sheet's filename date covers groups without a date cell
+    _, file_date = extract_po_and_date_from_filename(file_path.name)
+    to_bill, served = [], []
+    for po, site, raw_date, frame in groups:
+        place = resolve_place(metadata, site)
+        delivery_date, file_date_part = parse_delivery_date(
+            file_date if raw_date is None or pd.isna(raw_date) else raw_date)
+        items = transform_data_for_bill(frame, footer_rows=0)
+        revision = plan_revision(items, file_path, place, po, revisions)
+        if revision and revision["action"] != "revise":
+            model = revision["model"]
+            invoice_no = model["data"]["invoice_no"]
+            if revision["action"] == "superseded":
+                print(f"Superseded: PO {po} at {place} was revised by invoice {invoice_no}, not billed again")
+                continue
+            print(f"Unchanged: PO {po} at {place} is billed as invoice {invoice_no}")
+            served.append((model["data"], {} if lazy else {
+                fmt: ensure_output(model, fmt, base_target, deterministic, compact=compact, copies=copies)[0]
+                for fmt in formats
+            }))
+            continue
+        to_bill.append((po, place, delivery_date, file_date_part, items, revision))
+
+    # one counter write for the whole sheet, numbered in sheet order
+    invoice_numbers = reserve_invoice_numbers(len(to_bill))
+    run_metas, places, date_parts, ledger_items, render_args = [], [], [], [], []
+    for (po, place, delivery_date, file_date_part, items, revision), invoice_no in zip(to_bill, invoice_numbers):
+        run_meta = build_run_meta(metadata, place, po, delivery_date, invoice_no, items)
+        tgt_dir = month_dir(base_target / place, file_date_part)
+        tgt_dir.mkdir(parents=True, exist_ok=True)
+        out_stem = f"{place}_{file_date_part}_{po}"
+        model_extra = {"source": file_path.name}
+        if revision:
+            run_meta, out_stem, revision_extra = revise(run_meta, items, revision, revisions, file_path, place,
+                                                        out_stem)
+            model_extra.update(revision_extra)
+        invoice_store.save_model(run_meta, place, out_stem, extra=model_extra)
+        rates.record(items.column(0), items.column(5))
+        run_metas.append(run_meta)
+        places.append(place)
+        date_parts.append(file_date_part)
+        ledger_items.append(items)
+        render_args.append((run_meta, tgt_dir, out_stem, formats, deterministic, None, compact, copies))
+    # one index write for the whole sheet
+    metadata_deps.record((place, args[2], run_meta) for place, run_meta, args in zip(places, run_metas, render_args))
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(render_args)))
+    if lazy:
+        results = [{} for _ in render_args]
+    elif workers == 1:
+        results = [render_invoice(*args) for args in render_args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(render_invoice, *zip(*render_args)))
+
+    # render options and the ledger are recorded from this process only, in sheet order;
+    # a difference bill is entered with the PO's full items (see process_po_file)
+    for place, args, outputs in zip(places, render_args, results):
+        invoice_store.record_renders(place, args[2], {
+            fmt: (path, render_options(fmt, deterministic, compact, copies)) for fmt, path in outputs.items()
+        })
+    for run_meta, place, file_date_part, items in zip(run_metas, places, date_parts, ledger_items):
+        aggregates.record_invoice({**run_meta, "items": items}, place, file_date_part)
+    rates.save()
+    print(f"Split {file_path.name} into {len(run_metas)} new invoices"
+          f"{f', {len(served)} already billed' if served else ''}")
+    return list(zip(run_metas, results)) + served
+
+def run_queue(queue, catalog, metadata, formats, workers=1, deterministic=False, memory_budget_mb=None,
+              lazy=False, compact=False, strict=False, revisions="replace", copies=1):
+    """
+    Run the due jobs of the queue (utils/job_queue.py) until none is left to run now
+    or after a retry's backoff. Billing (invoice numbers, the ledger, rate history)
+    happens in this process, one job after another; rendering runs in `workers`
+    processes while the next jobs are billed. A job that fails is retried or
+    quarantined by the queue; the others carry on. Returns the run's statistics.
+    """
+    base_target = Path("output")
+    rates = RateHistory()
+    queue.begin_run(workers)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and not lazy else None
+    running = {}   # future -> (input path, billing seconds, render start, pool, memory budget)
+
+    def failed(path, error):
+        state = queue.fail(path, error)
+        job = queue.job(path)
+        if state == RETRY:
+            print(f"Retrying {path} in {job['next_at'] - time.time():.1f}s: {job['error']}")
+        else:
+            print(f"Quarantined {path}: {job['error']}")
+
+    def succeeded(path, bill_s, render_s, budget, render_report=None):
+        # one summary per job: the billing stages traced here and the render stages of its worker
+        budget.merge(render_report)
+        if budget.enabled:
+            print(budget.summary())
+        queue.succeed(path, bill_s, render_s)
+        catalog.mark_processed(path)
+
+    try:
+        while True:
+            path = queue.next_due() if len(running) < workers else None
+            if path is not None:
+                job = queue.job(path)
+                place = job["place"]
+                queue.start(path)
+                budget = MemoryBudget(memory_budget_mb)
+                start = time.perf_counter()
+                try:
+                    # a job billed in an earlier attempt only renders
+                    if job["model"] is None:
+                        out_stem, _ = process_po_file(path, place, metadata, base_target / place, formats,
+                                                      deterministic, memory_budget_mb, True, compact, strict,
+                                                      rates, revisions, copies, budget)
+                        # the invoice just billed, or the one an unchanged resend is served from;
+                        # None for an older version of a revised PO, which has nothing to render
+                        if out_stem is not None:
+                            queue.billed(path, out_stem)
+                except Exception as e:
+                    failed(path, e)
+                    continue
+                bill_s = time.perf_counter() - start
+                if job["model"] is None:
+                    succeeded(path, bill_s, 0.0, budget)
+                    continue
+                render_args = (place, job["model"], formats, deterministic, compact, copies, memory_budget_mb)
+                if lazy:
+                    succeeded(path, bill_s, 0.0, budget)
+                elif pool is None:
+                    start = time.perf_counter()
+                    try:
+                        _, render_report = render_stored(*render_args)
+                    except Exception as e:
+                        failed(path, e)
+                        continue
+                    succeeded(path, bill_s, time.perf_counter() - start, budget, render_report)
+                else:
+                    running[pool.submit(render_stored, *render_args)] = (
+                        path, bill_s, time.perf_counter(), pool, budget,
+                    )
+                continue
+
+            if running:
+                retry_at = queue.next_retry_at()
+                timeout = None if retry_at is None else max(0.0, retry_at - time.time())
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, bill_s, start, job_pool, budget = running.pop(future)
+                    try:
+                        _, render_report = future.result()
+                    except Exception as e:
+                        # a worker that died takes its pool down: start a new one for the retries
+                        if isinstance(e, BrokenProcessPool) and job_pool is pool:
+                            pool.shutdown(wait=False)
+                            pool = ProcessPoolExecutor(max_workers=workers)
+                        failed(path, e)
+                    else:
+                        succeeded(path, bill_s, time.perf_counter() - start, budget, render_report)
+                continue
+
+            retry_at = queue.next_retry_at()
+            if retry_at is None:
+                break
+            time.sleep(max(0.0, retry_at - time.time()))
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        rates.save()
+        stats = queue.end_run()
+    print(f"Queue: {describe_run(stats)}")
+    return stats
+
+def main(deterministic=False, formats=None, memory_budget_mb=None, lazy=False, compact=False, pending=False,
+         strict=False, revisions="replace", copies=1, workers=None):
+    """
+    Invoice the PO files of every place. The folders are read through the inbound-file
+    catalog; with pending=True only files without an invoice (or changed since) are billed.
+    Every file is a job in the persistent queue (utils/job_queue.py), run with
+    `workers` render processes (default: CPU count): a failing file is retried or
+    quarantined without stopping the batch, and an interrupted run resumes.
+    With strict=True a PO that fails validation is quarantined and stays pending.
+    A resent PO number is billed as set by `revisions` (see process_po_file).
+    """
+    formats = parse_formats(formats)
     metadata = load_metadata("metadata.json")
     base_source = Path("data")
     base_target = Path("output")
     base_target.mkdir(parents=True, exist_ok=True)
     
-    places = [key for key in metadata.keys() if key not in ["invoice_no", "GST", "PO", "delivery_date", "vendor_code"]]
+    places = [key for key in metadata.keys() if key not in COMMON_KEYS]
 
+    # one refresh lists only the site folders that changed since the last run
+    catalog = POCatalog()
+    catalog.refresh(base_source / place for place in places)
 
-    # iterate places defined in metadata
+    # one job per PO (Excel, CSV or JSON) in each place's source folder
+    queue = JobQueue()
+    inputs = []
     for place in places:
         src_dir = base_source / place
-        tgt_dir = base_target / place
-        tgt_dir.mkdir(parents=True, exist_ok=True)
+        (base_target / place).mkdir(parents=True, exist_ok=True)
+        inputs.extend(catalog.files(src_dir))
+        for file_path in catalog.unprocessed(src_dir) if pending else catalog.files(src_dir):
+            entry = catalog.entry(file_path)
+            queue.enqueue(file_path, place, entry["size"], entry["mtime_ns"])
+    queue.drop(inputs)
+    queue.save()
 
-        # process each excel in the place’s source folder
-        for file_path in sorted(src_dir.glob("*.xls*")):
-            # 1) extract PO & date
-            po, raw_date = extract_po_and_date_from_filename(file_path.name)
-            # parse to datetime so formatting consistent
-            try:
-                dt = datetime.strptime(raw_date, "%d-%m-%Y")
-                delivery_date = dt.strftime("%d-%m-%Y")
-                file_date_part = dt.strftime("%Y-%m-%d")
-            except:
-                delivery_date, file_date_part = raw_date, raw_date
-
-            # 2) read df and transform
-            df = pd.read_excel(file_path)
-            items = transform_data_for_bill(df)
-
-            # 3) assemble metadata for this run
-            run_meta = {
-                **metadata,  # common fields: vendor_code, GST, etc.
-                "PO": po,
-                "delivery_date": delivery_date,
-                "invoice_no": str(get_next_invoice_number()),
-                "bill_to": metadata[place]["bill_to"],
-                "place_of_supply": metadata[place]["place_of_supply"],
-                "site_code": metadata[place]["site_code"],
-                "items": items
-            }
-
-            # 4) build output filename
-            out_fname = f"{place}_{file_date_part}_{po}.xlsx"
-            out_path = tgt_dir / out_fname
-
-            # 5) generate
-            generate_excel_bill(run_meta, filename=str(out_path))
-            print(f"Generated: {out_path}")
-            
-            # 6) generate PDF
-            pdf_out_path = out_path.with_suffix(".pdf")
-            generate_pdf_bill(run_meta, filename=str(pdf_out_path))
-            print(f"Generated PDF: {pdf_out_path}")
+    workers = max(1, min(workers or os.cpu_count() or 1, queue.depth()))
+    try:
+        run_queue(queue, catalog, metadata, formats, workers, deterministic, memory_budget_mb, lazy, compact,
+                  strict, revisions, copies)
+    finally:
+        catalog.save()
+    quarantined = queue.jobs(QUARANTINED)
+    if quarantined:
+        print(f"{len(quarantined)} inputs quarantined until they change: python -m scripts.jobs list")
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate invoices for every PO under data/<place>/")
+    parser.add_argument("--deterministic", action="store_true",
+                        help="byte-reproducible outputs, served from the content-addressed render cache")
+    parser.add_argument("--formats", default="xlsx,pdf",
+                        help="comma-separated output formats: xlsx, pdf, csv, html (default: xlsx,pdf)")
+    parser.add_argument("--memory-budget", type=float, metavar="MB",
+                        help="trace memory per stage and switch to low-memory rendering above this budget")
+    parser.add_argument("--lazy", action="store_true",
+                        help="only store the invoice models; render formats on first request (python -m scripts.invoices)")
+    parser.add_argument("--consolidated", metavar="FILE", action="append",
+                        help="a sheet covering many POs and sites: one invoice per PO and site (repeatable)")
+    parser.add_argument("--po-column", default="PO Number", help="PO column of a consolidated sheet")
+    parser.add_argument("--site-column", default="Site",
+                        help="site column of a consolidated sheet: place name or site_code")
+    parser.add_argument("--date-column",
+                        help="delivery date column of a consolidated sheet (default: the date in its filename)")
+    parser.add_argument("--workers", type=int, help="render processes (default: CPU count)")
+    parser.add_argument("--pending", action="store_true",
+                        help="only PO files without an invoice yet, or changed since theirs was generated")
+    parser.add_argument("--compact", action="store_true",
+                        help="smallest files: shared XLSX styles, compressed binary PDF streams")
+    parser.add_argument("--strict", action="store_true",
+                        help="do not bill a PO that fails validation (report: output/.reports/validation/)")
+    parser.add_argument("--revisions", choices=po_diff.REVISION_MODES, default="replace",
+                        help="a PO number billed before: a replacement invoice (default), a difference bill "
+                             "of the changed lines, or a new invoice as before (rebill)")
+    parser.add_argument("--copies", type=int, default=1,
+                        help="PDF copies in one file, laid out once: 3 prints original, duplicate and triplicate")
+    args = parser.parse_args()
+    if args.copies < 1:
+        parser.error("--copies must be at least 1")
+    if args.consolidated:
+        formats = parse_formats(args.formats)
+        metadata = load_metadata("metadata.json")
+        for sheet in args.consolidated:
+            try:
+                process_consolidated_file(sheet, metadata, Path("output"), formats, args.po_column, args.site_column,
+                                          args.date_column, args.deterministic, args.workers, args.lazy,
+                                          args.compact, args.strict, args.copies, args.revisions)
+            except ValidationError as e:
+                print(f"Skipped {sheet}: {e.report['errors']} validation errors")
+    else:
+        main(deterministic=args.deterministic, formats=args.formats, memory_budget_mb=args.memory_budget,
+             lazy=args.lazy, compact=args.compact, pending=args.pending, strict=args.strict,
+             revisions=args.revisions, copies=args.copies, workers=args.workers)
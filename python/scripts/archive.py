@@ -0,0 +1,71 @@
+"""
+Rendered outputs by site and month (utils/output_store.py): list them, compact older
+months into one zip per site and month, prune past the retention period, and export
+any date range as a single zip.
+
+Run from the python/ folder:
+    python -m scripts.archive list [--site Begusarai]
+    python -m scripts.archive compact --keep-months 3
+    python -m scripts.archive prune --retain-months 72
+    python -m scripts.archive export 2025-04-01 2025-06-30 --out output/q1.zip
+    python -m scripts.archive export 2025-05-01 2025-05-31 --out - > may.zip
+Invoice models under output/.invoices are never archived or pruned, so any invoice
+can be rendered again with python -m scripts.invoices get <ref> --reprint.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from utils.output_store import OutputStore
+
+
+def _iso(value: str) -> str:
+    return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive and export the rendered outputs under output/")
+    sub = parser.add_subparsers(dest="command", required=True)
+    listing = sub.add_parser("list", help="files and bytes per site and month")
+    listing.add_argument("--site", action="append", help="only these sites (repeatable)")
+    compact = sub.add_parser("compact", help="zip every month older than the kept ones")
+    compact.add_argument("--keep-months", type=int, default=3,
+                         help="recent months left as loose files, the current one included (default: 3)")
+    prune = sub.add_parser("prune", help="delete the outputs of months older than the retention period")
+    prune.add_argument("--retain-months", type=int, required=True,
+                       help="months kept, the current one included")
+    export = sub.add_parser("export", help="one zip of the outputs delivered in a date range")
+    export.add_argument("start", type=_iso, metavar="YYYY-MM-DD")
+    export.add_argument("end", type=_iso, metavar="YYYY-MM-DD")
+    export.add_argument("--out", required=True, help="zip file to write, or - for stdout")
+    export.add_argument("--site", action="append", help="only these sites (repeatable)")
+    args = parser.parse_args()
+
+    store = OutputStore()
+    start = time.perf_counter()
+    # progress goes to stderr so `export --out -` can be piped
+    log = sys.stderr if args.command == "export" and args.out == "-" else sys.stdout
+    try:
+        if args.command == "list":
+            store.refresh()
+            for place, month, loose, archived, size in store.months(args.site):
+                print(f"{place:<16} {month}  {loose:>6} loose  {archived:>6} archived  {size / 1024:>10.1f} KB")
+        elif args.command == "compact":
+            result = store.compact(args.keep_months)
+            for month in result["months"]:
+                print(f"Archived {month}")
+            print(f"Compacted {result['files']} files in {time.perf_counter() - start:.2f}s", file=log)
+        elif args.command == "prune":
+            removed = store.prune(args.retain_months)
+            print(f"Pruned {removed} files in {time.perf_counter() - start:.2f}s", file=log)
+        else:
+            out = sys.stdout.buffer if args.out == "-" else args.out
+            count = store.export(out, args.start, args.end, args.site)
+            print(f"Exported {count} files to {args.out} in {time.perf_counter() - start:.2f}s", file=log)
+    finally:
+        store.save()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Benchmarks for the bill pipeline on synthetic POs.
+
+Run from the python/ folder:
+    python -m scripts.benchmark --rows 5000
+    python -m scripts.benchmark --only inputs
+    python -m scripts.benchmark --only memory
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bill.renderers import RENDERERS, get_renderer, render_bytes
+from scripts.load_product_data import read_po_file
+
+HSN_CODES = [7019000, 7031000, 7051900, 7091000, 8039010, 8061000]
+
+
+def make_po_frame(rows: int) -> pd.DataFrame:
+    """
+    A synthetic PO with the same columns as the buyer's export.
+    """
+    idx = np.arange(rows)
+    return pd.DataFrame({
+        "#": idx + 1,
+        "Item Code": 10000000 + idx,
+        "HSN Code": np.array(HSN_CODES)[idx % len(HSN_CODES)],
+        "Product Description": [f"Fresh Produce Item {i} (Pack)" for i in idx],
+        "Grammage": np.where(idx % 2 == 0, "500 g", "1 unit (200-250 gm)"),
+        "Quantity": (idx % 7 + 1).astype(float),
+        "Landing Rate": np.round(10 + (idx * 37 % 900) / 10, 2),
+    })
+
+
+def make_bill_data(rows: int) -> dict:
+    """
+    run_meta for a synthetic PO, as main() would assemble it.
+    """
+    from main import transform_data_for_bill
+
+    return {
+        "GST": "10AACFY8913A1ZN",
+        "vendor_code": "198049",
+        "PO": "10000000000001",
+        "delivery_date": "09-05-2025",
+        "invoice_no": "1001",
+        "bill_to": "BENCHMARK BUYER\nLINE 2\nLINE 3",
+        "place_of_supply": "BENCHMARK SITE\nLINE 2\nLINE 3",
+        "site_code": "ES0",
+        "items": transform_data_for_bill(make_po_frame(rows), footer_rows=0),
+    }
+
+
+def write_po_files(df: pd.DataFrame, folder: Path, stem: str = "10000000000001_20250509_000000") -> dict:
+    """
+    Write the same PO as xlsx, csv, json and jsonl. Returns {format: path}.
+    """
+    paths = {fmt: folder / f"{stem}.{fmt}" for fmt in ("xlsx", "csv", "json", "jsonl")}
+    df.to_excel(paths["xlsx"], index=False)
+    df.to_csv(paths["csv"], index=False)
+    df.to_json(paths["json"], orient="records")
+    df.to_json(paths["jsonl"], orient="records", lines=True)
+    return paths
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_inputs(rows: int, repeat: int):
+    """
+    PO parsing: the same data read from each supported input format.
+    """
+    df = make_po_frame(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_po_files(df, Path(tmp))
+        timings = {fmt: best_of(lambda p=path: read_po_file(p), repeat) for fmt, path in paths.items()}
+
+    base = timings["xlsx"]
+    print(f"{'format':<8}{'seconds':>10}{'rows/s':>12}{'vs xlsx':>10}")
+    for fmt, secs in timings.items():
+        print(f"{fmt:<8}{secs:>10.4f}{rows / secs:>12,.0f}{base / secs:>9.1f}x")
+
+
+def bench_outputs(rows: int, repeat: int):
+    """
+    Rendering: time per invoice and per line item for every output format.
+    """
+    data = make_bill_data(rows)
+    print(f"{'format':<8}{'seconds':>10}{'us/row':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in RENDERERS:
+            generate = get_renderer(fmt)
+            out_path = str(Path(tmp) / f"bench.{fmt}")
+            secs = best_of(lambda: generate(data, filename=out_path), repeat)
+            print(f"{fmt:<8}{secs:>10.4f}{secs / rows * 1e6:>10.1f}")
+
+
+def bench_sizes(rows: int, repeat: int):
+    """
+    Output size per 1,000 line items, standard against the compact profile.
+    """
+    data = make_bill_data(rows)
+    print(f"{'format':<8}{'profile':<10}{'bytes':>10}{'KB/1k rows':>12}{'seconds':>10}{'saved':>8}")
+    for fmt in ("xlsx", "pdf"):
+        standard = None
+        for profile, compact in (("standard", False), ("compact", True)):
+            size = len(render_bytes(fmt, data, compact=compact))
+            secs = best_of(lambda: render_bytes(fmt, data, compact=compact), repeat)
+            standard = standard or size
+            print(f"{fmt:<8}{profile:<10}{size:>10,}{size / rows * 1000 / 1024:>12.1f}{secs:>10.4f}"
+                  f"{1 - size / standard:>8.0%}")
+
+
+def _float_transform(df: pd.DataFrame) -> list:
+    # the float/iterrows transform that integer paise replaced, kept as the baseline
+    items = []
+    for _, row in df.iterrows():
+        qty, rate = int(row["Quantity"]), float(row["Landing Rate"])
+        total = round(qty * rate, 2)
+        items.append([int(row["Item Code"]), int(row["HSN Code"]),
+                      str(row["Product Description"]).strip(), str(row["Grammage"]).strip(),
+                      qty, rate, total, 0.0, 0.0, 0.0, 0.0, total])
+    return items
+
+
+def bench_transform(rows: int, repeat: int):
+    """
+    Transform + totals: integer paise (vectorized) against the old float path.
+    """
+    from main import transform_data_for_bill
+    from utils.money import column_total
+
+    df = make_po_frame(rows)
+    paise = best_of(lambda: column_total(transform_data_for_bill(df, footer_rows=0), 11), repeat)
+    floats = best_of(lambda: sum(item[11] for item in _float_transform(df)), repeat)
+    print(f"{'path':<8}{'seconds':>10}{'us/row':>10}")
+    print(f"{'float':<8}{floats:>10.4f}{floats / rows * 1e6:>10.2f}")
+    print(f"{'paise':<8}{paise:>10.4f}{paise / rows * 1e6:>10.2f}   ({floats / paise:.1f}x)")
+
+
+def _rows_nbytes(rows: list) -> int:
+    # the list of 12 boxed values per row that LineItems replaced; text cells are
+    # counted as references, as in LineItems.nbytes
+    return sys.getsizeof(rows) + sum(
+        sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row if not isinstance(v, str)) for row in rows
+    )
+
+
+def bench_memory(rows: int, repeat: int):
+    """
+    Memory held by one invoice's line items: typed columns against a list of rows
+    and an item DataFrame (object columns counted as references throughout).
+    """
+    from main import transform_data_for_bill
+    from utils.line_items import FIELDS
+
+    items = transform_data_for_bill(make_po_frame(rows), footer_rows=0)
+    plain = items.to_rows()
+    sizes = {
+        "rows": _rows_nbytes(plain),
+        "frame": int(pd.DataFrame(plain, columns=FIELDS).memory_usage(index=False).sum()),
+        "typed": items.nbytes,
+    }
+    base = sizes["rows"]
+    print(f"{'layout':<8}{'bytes':>12}{'B/row':>8}{'vs rows':>10}")
+    for layout, size in sizes.items():
+        print(f"{layout:<8}{size:>12,}{size / rows:>8.0f}{base / size:>9.1f}x")
+
+
+SECTIONS = {
+    "inputs": bench_inputs,
+    "transform": bench_transform,
+    "memory": bench_memory,
+    "outputs": bench_outputs,
+    "sizes": bench_sizes,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bill pipeline on synthetic POs")
+    parser.add_argument("--rows", type=int, default=2000, help="line items per synthetic PO")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, best is reported")
+    parser.add_argument("--only", choices=sorted(SECTIONS), action="append", help="run only these sections")
+    args = parser.parse_args()
+
+    for name in args.only or SECTIONS:
+        print(f"\n== {name} ({args.rows} rows) ==")
+        SECTIONS[name](args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
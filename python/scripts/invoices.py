@@ -0,0 +1,160 @@
+"""
+Stored invoice models (utils/invoice_store.py): list them and render formats on demand.
+
+Run from the python/ folder:
+    python -m scripts.invoices list
+    python -m scripts.invoices get 21081110000053 --formats pdf
+    python -m scripts.invoices get 1164 --formats xlsx,pdf --reprint
+    python -m scripts.invoices get 1164 --copies 3
+    python -m scripts.invoices einvoice --month 2025-05 --out output/einvoice_2025-05.json
+    python -m scripts.invoices refresh [--dry-run]
+A format is rendered the first time it is asked for and served from disk afterwards;
+--reprint rebuilds it from the stored model. The PO spreadsheet is never re-read.
+A format rendered with other options (--copies, --compact, --deterministic) is rendered again.
+refresh applies a corrected metadata.json (an address, the GSTIN) to the invoices
+that printed the changed fields only (utils/metadata_deps.py): their stored models
+are updated, keeping their invoice numbers, and the formats already rendered are
+rendered again with the options they were rendered with (--copies, --compact,
+--deterministic); refresh's own --compact/--deterministic only apply to formats
+with no recorded render.
+"""
+import argparse
+import time
+from datetime import datetime
+
+from bill.einvoice import export_einvoices
+from bill.renderers import RENDERERS, parse_formats
+from main import ensure_output, load_metadata, output_path, parse_delivery_date, render_options
+from utils import aggregates, metadata_deps
+from utils.invoice_store import (
+    MODEL_SUFFIX, find_model, list_models, load_model, load_renders, model_path, po_items, save_model,
+)
+
+
+def list_invoices():
+    for path in list_models():
+        data = load_model(path)["data"]
+        print(f"{data['invoice_no']:>8}  {data['delivery_date']:>10}  PO-{data['PO']:<16}  "
+              f"{len(data['items']):>5} items  {path.name[: -len(MODEL_SUFFIX)]}")
+
+
+def get_invoice(ref, formats, reprint=False, deterministic=False, compact=False, copies=1) -> dict:
+    model = load_model(find_model(ref))
+    outputs = {}
+    for fmt in parse_formats(formats):
+        path, rendered = ensure_output(model, fmt, deterministic=deterministic, force=reprint, compact=compact,
+                                       copies=copies)
+        print(f"{'Rendered' if rendered else 'Ready'} {fmt.upper()}: {path}")
+        outputs[fmt] = path
+    return outputs
+
+
+def stored_invoices(month=None):
+    """
+    (data, place) for every stored model, optionally only those delivered in `month` (YYYY-MM).
+    """
+    for path in list_models():
+        model = load_model(path)
+        data = model["data"]
+        if month and datetime.strptime(data["delivery_date"], "%d-%m-%Y").strftime("%Y-%m") != month:
+            continue
+        yield data, model["place"]
+
+
+def export_einvoice(out, month=None, per_invoice=False) -> dict:
+    start = time.perf_counter()
+    result = export_einvoices(stored_invoices(month), out, per_invoice)
+    elapsed = time.perf_counter() - start
+    print(f"E-invoice JSON: {len(result['written'])} invoices to {out} in {elapsed:.2f}s")
+    for invoice_no, problems in result["errors"].items():
+        print(f"  invoice {invoice_no} skipped:")
+        for problem in problems:
+            print(f"    - {problem}")
+    return result
+
+
+def refresh_invoices(metadata_file="metadata.json", formats=None, dry_run=False, deterministic=False,
+                     compact=False) -> list:
+    """
+    Update the stored invoices whose metadata fields changed in metadata.json and
+    render again the formats they have on disk (or `formats`), each with the options
+    it was last rendered with; `deterministic` and `compact` are used for formats
+    with no recorded render. Models saved before the dependency index are entered
+    from their data first.
+    Returns [(place, out_stem, changed fields)].
+    """
+    metadata = load_metadata(metadata_file)
+    stale = metadata_deps.affected(metadata_deps.sync(), metadata)
+    if not stale:
+        print("No stored invoice uses a changed metadata field")
+        return []
+
+    refreshed, updated = [], []
+    for (place, out_stem), fields in sorted(stale.items()):
+        model = load_model(model_path(place, out_stem))
+        # formats not rendered yet are rendered from the updated model on first request
+        wanted = parse_formats(formats) if formats else [
+            fmt for fmt in RENDERERS if output_path(model, fmt).exists()
+        ]
+        print(f"Invoice {model['data']['invoice_no']} ({out_stem}): {', '.join(fields)}"
+              f"{' -> ' + ','.join(wanted) if wanted else ''}")
+        refreshed.append((place, out_stem, fields))
+        if dry_run:
+            continue
+
+        recorded = load_renders(place, out_stem)
+        model["data"] = metadata_deps.apply(model["data"], metadata, place)
+        extra = {key: value for key, value in model.items() if key not in ("v", "place", "out_stem", "data")}
+        save_model(model["data"], place, out_stem, extra=extra)
+        updated.append((place, out_stem, model["data"]))
+        for fmt in wanted:
+            options = recorded[fmt]["options"] if fmt in recorded else render_options(fmt, deterministic, compact)
+            ensure_output(model, fmt, force=True, **options)
+        if f"{place}.site_code" in fields:
+            # the ledger keeps the last entry of a PO, so the new site code supersedes the old
+            _, file_date_part = parse_delivery_date(model["data"]["delivery_date"])
+            aggregates.record_invoice({**model["data"], "items": po_items(model)}, place, file_date_part)
+
+    metadata_deps.record(updated)
+    print(f"{'Would refresh' if dry_run else 'Refreshed'} {len(refreshed)} invoices")
+    return refreshed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render stored invoices on demand")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="list stored invoices")
+    get = sub.add_parser("get", help="render (if needed) and print the paths of an invoice's outputs")
+    get.add_argument("ref", help="output stem, PO number or invoice number")
+    get.add_argument("--formats", default="pdf", help="comma-separated formats (default: pdf)")
+    get.add_argument("--reprint", action="store_true", help="render again from the stored model")
+    get.add_argument("--deterministic", action="store_true", help="byte-reproducible output via the render cache")
+    get.add_argument("--compact", action="store_true", help="smallest files: shared styles, compressed streams")
+    get.add_argument("--copies", type=int, default=1,
+                     help="PDF copies in one file: 3 prints original, duplicate and triplicate")
+    einv = sub.add_parser("einvoice", help="export stored invoices as GST e-invoice JSON (schema 1.1)")
+    einv.add_argument("--month", metavar="YYYY-MM", help="only invoices delivered in this month")
+    einv.add_argument("--out", required=True, help="JSON array file, or a folder with --split")
+    einv.add_argument("--split", action="store_true", help="one <invoice_no>.json per invoice")
+    refresh = sub.add_parser("refresh", help="re-render the invoices affected by a metadata.json change")
+    refresh.add_argument("--metadata", default="metadata.json", help="metadata file (default: metadata.json)")
+    refresh.add_argument("--formats", help="formats to render (default: those already on disk)")
+    refresh.add_argument("--dry-run", action="store_true", help="list the affected invoices only")
+    refresh.add_argument("--deterministic", action="store_true", help="byte-reproducible output via the render cache")
+    refresh.add_argument("--compact", action="store_true", help="smallest files: shared styles, compressed streams")
+    args = parser.parse_args()
+    if getattr(args, "copies", 1) < 1:
+        parser.error("--copies must be at least 1")
+
+    if args.command == "list":
+        list_invoices()
+    elif args.command == "einvoice":
+        export_einvoice(args.out, args.month, args.split)
+    elif args.command == "refresh":
+        refresh_invoices(args.metadata, args.formats, args.dry_run, args.deterministic, args.compact)
+    else:
+        get_invoice(args.ref, args.formats, args.reprint, args.deterministic, args.compact, args.copies)
+
+
+if __name__ == "__main__":
+    main()
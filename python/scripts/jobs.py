@@ -0,0 +1,60 @@
+"""
+The invoice generation queue (utils/job_queue.py) that main.py runs every PO file
+through: jobs waiting or quarantined, statistics of the last runs, and releasing
+quarantined inputs once they have been looked at.
+
+Run from the python/ folder:
+    python -m scripts.jobs status
+    python -m scripts.jobs list [--state quarantined]
+    python -m scripts.jobs runs [--last 5]
+    python -m scripts.jobs release data/Begusarai/21081110000053_20250509_074350.xlsx
+    python -m scripts.jobs release --all
+A quarantined input is also released on its own when the file changes.
+Released jobs run on the next python main.py.
+"""
+import argparse
+from datetime import datetime
+
+from utils.job_queue import STATES, JobQueue, describe_run
+
+
+def _when(timestamp) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S") if timestamp else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the invoice generation queue")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="jobs per state and the last run")
+    listing = sub.add_parser("list", help="jobs with their attempts and last error")
+    listing.add_argument("--state", choices=STATES, help="only jobs in this state")
+    runs = sub.add_parser("runs", help="throughput and queue depth of recent runs")
+    runs.add_argument("--last", type=int, default=5, help="how many runs (default: 5)")
+    release = sub.add_parser("release", help="queue quarantined inputs again")
+    release.add_argument("paths", nargs="*", help="input files, as listed")
+    release.add_argument("--all", action="store_true", help="every quarantined input")
+    args = parser.parse_args()
+
+    queue = JobQueue()
+    if args.command == "status":
+        counts = {state: len(queue.jobs(state)) for state in STATES}
+        print("  ".join(f"{state}: {count}" for state, count in counts.items()))
+        if queue.runs():
+            print(f"Last run {_when(queue.runs()[-1]['started'])}: {describe_run(queue.runs()[-1])}")
+    elif args.command == "list":
+        for path, job in queue.jobs(args.state):
+            print(f"{job['state']:<12} {job['attempts']} attempts  {path}")
+            if job["error"]:
+                print(f"{'':<12} {job['error']}")
+    elif args.command == "runs":
+        for stats in queue.runs()[-args.last:]:
+            print(f"{_when(stats['started'])}  {describe_run(stats)}")
+    else:
+        if not args.paths and not args.all:
+            parser.error("release needs input paths or --all")
+        released = queue.release(None if args.all else args.paths)
+        print(f"Released {released} jobs")
+
+
+if __name__ == "__main__":
+    main()
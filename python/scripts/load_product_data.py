@@ -1,7 +1,23 @@
+import csv
+import json
 from datetime import datetime
 from pathlib import Path
 import pandas as pd
 
+# Columns transform_data_for_bill reads from a PO, with the dtype each is parsed as
+PO_COLUMNS = {
+    "Item Code": "float64",
+    "HSN Code": "float64",
+    "Product Description": "object",
+    "Grammage": "object",
+    "Quantity": "float64",
+    "Landing Rate": "float64",
+}
+EXCEL_SUFFIXES = (".xlsx", ".xls", ".xlsm")
+CSV_SUFFIXES = (".csv",)
+JSON_SUFFIXES = (".json", ".jsonl", ".ndjson")
+PO_SUFFIXES = EXCEL_SUFFIXES + CSV_SUFFIXES + JSON_SUFFIXES
+
 def extract_po_and_date_from_filename(filename: str):
     """
     Extract PO number and delivery date from a structured filename.
@@ -23,17 +39,147 @@ def extract_po_and_date_from_filename(filename: str):
     return po_number, delivery_date
 
 
+def po_footer_rows(path) -> int:
+    """
+    Number of trailing summary rows to drop from a PO.
+    Excel exports end with 'Total Quantity', 'Total Items' and 'Net amount' rows;
+    CSV and JSON exports carry item rows only.
+    """
+    return 3 if Path(path).suffix.lower() in EXCEL_SUFFIXES else 0
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _typed_frame(columns: dict) -> pd.DataFrame:
+    return pd.DataFrame({name: pd.Series(values, dtype=PO_COLUMNS.get(name, "object")) for name, values in columns.items()})
+
+
+def _collect_records(records, extra_columns=()) -> pd.DataFrame:
+    """
+    Stream dict records into typed PO columns, keeping only the columns the bill needs
+    plus any `extra_columns`, which are kept as text.
+    """
+    columns = {name: [] for name in (*PO_COLUMNS, *extra_columns)}
+    numeric = [name for name, dtype in PO_COLUMNS.items() if dtype == "float64"]
+    text = [name for name, dtype in PO_COLUMNS.items() if dtype == "object"] + list(extra_columns)
+    for record in records:
+        for name in numeric:
+            columns[name].append(_to_float(record.get(name)))
+        for name in text:
+            value = record.get(name)
+            columns[name].append("" if value is None else str(value))
+    return _typed_frame(columns)
+
+
+def read_po_csv(path, extra_columns=()) -> pd.DataFrame:
+    """
+    Read a CSV PO with the C parser, materialising only the six bill columns
+    (and `extra_columns`, as text).
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), [])
+    missing = [name for name in (*PO_COLUMNS, *extra_columns) if name not in header]
+    if missing:
+        raise ValueError(f"{Path(path).name}: missing columns {missing}")
+    dtypes = {**PO_COLUMNS, **{name: "object" for name in extra_columns}}
+    try:
+        return pd.read_csv(path, usecols=list(dtypes), dtype=dtypes, encoding="utf-8-sig")
+    except ValueError:
+        # a non-numeric value in a numeric column: fall back to a per-value parse
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            return _collect_records(csv.DictReader(f), extra_columns)
+
+
+def _iter_json_records(path):
+    path = Path(path)
+    with open(path, encoding="utf-8") as f:
+        if path.suffix.lower() in (".jsonl", ".ndjson"):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+            return
+        payload = json.load(f)
+    if isinstance(payload, dict):
+        payload = payload.get("items", [])
+    yield from payload
+
+
+def read_po_json(path, extra_columns=()) -> pd.DataFrame:
+    """
+    Read a JSON PO: an array of item objects, {"items": [...]}, or JSON Lines (.jsonl/.ndjson).
+    """
+    return _collect_records(_iter_json_records(path), extra_columns)
+
+
+def read_po_file(path, extra_columns=()) -> pd.DataFrame:
+    """
+    Read a PO in any supported format into a frame with the bill columns.
+    `extra_columns` (e.g. the PO and site columns of a consolidated sheet) are kept too.
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix in CSV_SUFFIXES:
+        return read_po_csv(path, extra_columns)
+    if suffix in JSON_SUFFIXES:
+        return read_po_json(path, extra_columns)
+    df = pd.read_excel(path)
+    missing = [name for name in extra_columns if name not in df.columns]
+    if missing:
+        raise ValueError(f"{Path(path).name}: missing columns {missing}")
+    return df
+
+
+def _key_text(column: pd.Series) -> pd.Series:
+    """
+    Group-key column as clean text. Excel hands back long PO numbers as floats
+    (2.108111e13), which are turned back into their digits.
+    """
+    if pd.api.types.is_float_dtype(column):
+        return column.astype("Int64").astype("string")
+    # text columns keep their digits as read; a float cell in a mixed column prints as "123.0"
+    return column.astype("string").str.strip().str.replace(r"\.0$", "", regex=True)
+
+
+def split_consolidated_po(df: pd.DataFrame, po_column: str, site_column: str, date_column: str = None) -> list:
+    """
+    Split a sheet covering many POs and sites into one frame per (PO, site), in order
+    of first appearance. Rows without a PO (totals, blank lines) are dropped.
+    Returns [(po, site, raw_date, frame)], raw_date being the group's first date cell or None.
+    """
+    po = _key_text(df[po_column])
+    keep = (po.notna() & (po != "")).to_numpy(dtype=bool)
+    df = df[keep].reset_index(drop=True)
+    keys = pd.DataFrame({"po": po[keep].to_numpy(), "site": _key_text(df[site_column]).fillna("").to_numpy()})
+
+    groups = []
+    # one groupby over the whole sheet gives every group's row positions at once
+    for (po_number, site), positions in keys.groupby(["po", "site"], sort=False).indices.items():
+        frame = df.take(positions)
+        raw_date = frame[date_column].iloc[0] if date_column and date_column in frame.columns else None
+        groups.append((po_number, site, raw_date, frame))
+    return groups
+
+
 def get_latest_excel_file(folder_path: str = "data/") -> Path:
     """
     Return the Path of the latest Excel file in the specified folder.
+    Answered from the inbound-file catalog, which re-lists the folder only if it changed.
     """
-    folder = Path(folder_path)
-    excel_files = list(folder.glob("*.xlsx")) + list(folder.glob("*.xls"))
+    # imported here: po_catalog itself imports this module
+    from scripts.po_catalog import POCatalog
 
-    if not excel_files:
-        raise FileNotFoundError(f"No Excel files found in {folder_path}")
+    catalog = POCatalog()
+    catalog.refresh([folder_path])
+    catalog.save()
+    latest_file = catalog.latest(folder_path, (".xlsx", ".xls"))
 
-    latest_file = max(excel_files, key=lambda f: f.stat().st_mtime)
+    if latest_file is None:
+        raise FileNotFoundError(f"No Excel files found in {folder_path}")
     return latest_file
 
 
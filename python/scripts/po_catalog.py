@@ -0,0 +1,288 @@
+"""
+Persistent catalog of the inbound PO files under data/<site>/: PO number, delivery
+date, inode, size and mtime per file, and whether an invoice has been generated
+from it. A folder is listed again only when its own mtime changes; its catalogued
+files are re-stat'ed on every refresh, so a file saved over in place is seen too.
+With a year of POs on disk "latest file", "files for date D" and "unprocessed
+files" are answered from in-memory indices.
+
+Run from the python/ folder:
+    python -m scripts.po_catalog latest [--site Begusarai]
+    python -m scripts.po_catalog date 2025-05-09
+    python -m scripts.po_catalog pending
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+from scripts.load_product_data import PO_SUFFIXES, extract_po_and_date_from_filename
+from utils.atomic_write import write_atomic
+
+CATALOG_VERSION = 1
+CATALOG_FILE = Path("output") / ".catalog" / "po_files.json"
+# a folder modified this recently may still gain files within the same mtime tick,
+# so its listing is not trusted and it is listed again on the next refresh
+RACY_NS = 2_000_000_000
+
+# fields of a file entry, stored as a list to keep the catalog small
+PO, DATE, INODE, SIZE, MTIME, PROCESSED = range(6)
+
+
+def _folder_key(folder) -> str:
+    # "data/Begusarai", "data/Begusarai/" and Path("data") / "Begusarai" are one folder
+    return os.path.normpath(str(folder))
+
+
+def _iso_date(delivery_date: str):
+    try:
+        return datetime.strptime(delivery_date, "%d-%m-%Y").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+class POCatalog:
+    """
+    Inbound PO files keyed by folder and file name. Folders are the site folders
+    (data/<site>) or any other folder the callers pass in.
+    """
+
+    def __init__(self, catalog_file: Path = CATALOG_FILE):
+        self.catalog_file = Path(catalog_file)
+        self._dirs = {}      # folder -> its mtime_ns at the last listing (None: list again)
+        self._files = {}     # folder -> {name: entry}
+        self._dirty = False
+        if self.catalog_file.exists():
+            stored = json.loads(self.catalog_file.read_text(encoding="utf-8"))
+            # an older layout is simply rebuilt from the folders
+            if stored.get("v") == CATALOG_VERSION:
+                self._dirs = stored["dirs"]
+                self._files = stored["files"]
+        self._reindex()
+
+    # === INDICES ===
+    def _reindex(self):
+        self._latest = {}    # folder -> {suffix: name of its newest file}
+        self._by_date = {}   # ISO date -> {(folder, name)}
+        self._pending = {}   # folder -> {names without an invoice for their current mtime}
+        for folder, entries in self._files.items():
+            for name, entry in entries.items():
+                self._index(folder, name, entry)
+
+    def _index(self, folder: str, name: str, entry: list):
+        suffix = Path(name).suffix.lower()
+        latest = self._latest.setdefault(folder, {})
+        newest = latest.get(suffix)
+        if newest is None or entry[MTIME] > self._files[folder][newest][MTIME]:
+            latest[suffix] = name
+        if entry[DATE]:
+            self._by_date.setdefault(entry[DATE], set()).add((folder, name))
+        if entry[PROCESSED] != entry[MTIME]:
+            self._pending.setdefault(folder, set()).add(name)
+
+    def _unindex(self, folder: str, name: str, entry: list):
+        if entry[DATE]:
+            self._by_date.get(entry[DATE], set()).discard((folder, name))
+        self._pending.get(folder, set()).discard(name)
+        suffix = Path(name).suffix.lower()
+        latest = self._latest.get(folder, {})
+        if latest.get(suffix) == name:
+            # only a removed newest file costs a pass over its folder
+            del latest[suffix]
+            same = [(e[MTIME], n) for n, e in self._files[folder].items()
+                    if n != name and Path(n).suffix.lower() == suffix]
+            if same:
+                latest[suffix] = max(same)[1]
+
+    # === REFRESH ===
+    def refresh(self, folders, full: bool = False) -> int:
+        """
+        Bring the catalog up to date with `folders`. A folder whose mtime changed is
+        listed again; in one whose mtime is unchanged only the catalogued files are
+        stat'ed, which catches a file overwritten in place (same inode, same folder
+        mtime). full=True lists every folder. Returns the number of files added,
+        changed or removed.
+        """
+        changed = 0
+        now = time.time_ns()
+        for folder in folders:
+            folder = _folder_key(folder)
+            try:
+                dir_mtime = os.stat(folder).st_mtime_ns
+            except FileNotFoundError:
+                if folder in self._files:
+                    changed += self._drop(folder)
+                    self._dirty = True
+                continue
+            if not full and self._dirs.get(folder) == dir_mtime:
+                restated = self._restat(folder)
+                if restated:
+                    self._dirty = True
+                changed += restated
+                continue
+            listed = self._list(folder)
+            trusted = dir_mtime if now - dir_mtime > RACY_NS else None
+            if listed or self._dirs.get(folder) != trusted:
+                self._dirty = True
+            self._dirs[folder] = trusted
+            changed += listed
+        return changed
+
+    def _list(self, folder: str) -> int:
+        entries = self._files.setdefault(folder, {})
+        seen, changed = set(), 0
+        with os.scandir(folder) as listing:
+            for item in listing:
+                if Path(item.name).suffix.lower() not in PO_SUFFIXES or not item.is_file():
+                    continue
+                seen.add(item.name)
+                changed += self._update(folder, item.name, item.stat())
+        for name in [name for name in entries if name not in seen]:
+            self._unindex(folder, name, entries.pop(name))
+            changed += 1
+        return changed
+
+    def _restat(self, folder: str) -> int:
+        entries = self._files.get(folder, {})
+        changed = 0
+        for name in list(entries):
+            try:
+                st = os.stat(os.path.join(folder, name))
+            except FileNotFoundError:
+                self._unindex(folder, name, entries.pop(name))
+                changed += 1
+                continue
+            changed += self._update(folder, name, st)
+        return changed
+
+    def _update(self, folder: str, name: str, st) -> int:
+        """
+        Enter a file from its stat result unless its entry already matches. Returns 1 if entered.
+        """
+        entries = self._files[folder]
+        old = entries.get(name)
+        if old is not None and (old[INODE], old[SIZE], old[MTIME]) == (st.st_ino, st.st_size, st.st_mtime_ns):
+            return 0
+        po, delivery_date = extract_po_and_date_from_filename(name)
+        entry = [po, _iso_date(delivery_date), st.st_ino, st.st_size, st.st_mtime_ns, None]
+        if old is not None:
+            self._unindex(folder, name, old)
+        entries[name] = entry
+        self._index(folder, name, entry)
+        return 1
+
+    def _drop(self, folder: str) -> int:
+        entries = self._files.pop(folder, {})
+        self._dirs.pop(folder, None)
+        self._latest.pop(folder, None)
+        self._pending.pop(folder, None)
+        for name, entry in entries.items():
+            if entry[DATE]:
+                self._by_date.get(entry[DATE], set()).discard((folder, name))
+        return len(entries)
+
+    # === QUERIES ===
+    def files(self, folder) -> list:
+        """
+        Every PO file of `folder`, sorted by name.
+        """
+        folder = _folder_key(folder)
+        return [Path(folder) / name for name in sorted(self._files.get(folder, {}))]
+
+    def latest(self, folder, suffixes=PO_SUFFIXES):
+        """
+        The most recently modified file of `folder` with one of `suffixes`, or None.
+        """
+        folder = _folder_key(folder)
+        candidates = [name for suffix, name in self._latest.get(folder, {}).items() if suffix in suffixes]
+        if not candidates:
+            return None
+        entries = self._files[folder]
+        return Path(folder) / max(candidates, key=lambda name: entries[name][MTIME])
+
+    def for_date(self, iso_date: str, folders=None) -> list:
+        """
+        Files whose name carries delivery date `iso_date` (YYYY-MM-DD), optionally only in `folders`.
+        """
+        wanted = None if folders is None else {_folder_key(folder) for folder in folders}
+        return sorted(Path(folder) / name for folder, name in self._by_date.get(iso_date, ())
+                      if wanted is None or folder in wanted)
+
+    def unprocessed(self, folder) -> list:
+        """
+        Files of `folder` with no invoice yet, or changed since their invoice was generated.
+        """
+        folder = _folder_key(folder)
+        return [Path(folder) / name for name in sorted(self._pending.get(folder, ()))]
+
+    def entry(self, path) -> dict:
+        path = Path(path)
+        entry = self._files[_folder_key(path.parent)][path.name]
+        return {"po": entry[PO], "date": entry[DATE], "size": entry[SIZE], "mtime_ns": entry[MTIME],
+                "processed": entry[PROCESSED] == entry[MTIME]}
+
+    def mark_processed(self, path):
+        """
+        Record that an invoice was generated from `path` as it is now.
+        """
+        path = Path(path)
+        folder = _folder_key(path.parent)
+        entry = self._files.get(folder, {}).get(path.name)
+        if entry is None:
+            return
+        entry[PROCESSED] = entry[MTIME]
+        self._pending.get(folder, set()).discard(path.name)
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        self.catalog_file.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"v": CATALOG_VERSION, "dirs": self._dirs, "files": self._files}
+        write_atomic(self.catalog_file, json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        self._dirty = False
+
+
+def site_folders(base_source: Path = Path("data")) -> list:
+    base_source = Path(base_source)
+    if not base_source.is_dir():
+        return []
+    return sorted(str(entry.path) for entry in os.scandir(base_source) if entry.is_dir())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the catalog of inbound PO files under data/")
+    parser.add_argument("--full", action="store_true", help="list every folder, not only changed ones")
+    sub = parser.add_subparsers(dest="command", required=True)
+    latest = sub.add_parser("latest", help="most recently modified PO file per site")
+    latest.add_argument("--site", action="append", help="only these sites (repeatable)")
+    date = sub.add_parser("date", help="PO files for a delivery date")
+    date.add_argument("date", metavar="YYYY-MM-DD")
+    sub.add_parser("pending", help="PO files without a generated invoice")
+    args = parser.parse_args()
+
+    catalog = POCatalog()
+    start = time.perf_counter()
+    folders = site_folders()
+    changed = catalog.refresh(folders, full=args.full)
+    catalog.save()
+    print(f"Catalog: {changed} files updated in {time.perf_counter() - start:.3f}s")
+
+    if args.command == "latest":
+        for folder in folders:
+            if args.site and Path(folder).name not in args.site:
+                continue
+            print(f"{Path(folder).name}: {catalog.latest(folder) or '-'}")
+    elif args.command == "date":
+        for path in catalog.for_date(args.date):
+            print(path)
+    else:
+        for folder in folders:
+            for path in catalog.unprocessed(folder):
+                print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Billed totals by site, date and HSN from the invoice ledger (utils/aggregates.py).
+
+Run from the python/ folder:
+    python -m scripts.report --by site,date --period month
+    python -m scripts.report --by hsn --from 2025-04-01 --to 2026-03-31 --export hsn.xlsx
+"""
+import argparse
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+
+from utils.aggregates import GROUP_KEYS, LEDGER_FILE, PERIODS, SUM_FIELDS, load_ledger, summarise
+from utils.atomic_write import write_atomic
+
+EXPORT_SUFFIXES = (".csv", ".xlsx")
+
+
+def to_rupees(totals: pd.DataFrame) -> pd.DataFrame:
+    """
+    Paise columns (taxable_p, ...) -> rupee columns (taxable, ...) for display and export.
+    """
+    money = [field for field in SUM_FIELDS if field.endswith("_p")]
+    rupees = totals.drop(columns=money)
+    for field in money:
+        rupees[field[:-2]] = totals[field] / 100
+    return rupees
+
+
+def export(totals: pd.DataFrame, path) -> Path:
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        data = totals.to_csv(index=False, float_format="%.2f", lineterminator="\n").encode("utf-8")
+    elif path.suffix.lower() == ".xlsx":
+        buffer = BytesIO()
+        totals.to_excel(buffer, index=False, sheet_name="Report")
+        data = buffer.getvalue()
+    else:
+        raise ValueError(f"Unsupported export '{path.suffix}', expected one of {', '.join(EXPORT_SUFFIXES)}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return write_atomic(path, data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Billed totals by site, date and HSN")
+    parser.add_argument("--by", default="site,date,hsn",
+                        help=f"comma-separated grouping, any of {', '.join(GROUP_KEYS)} (default: all)")
+    parser.add_argument("--period", choices=list(PERIODS), default="day", help="date granularity")
+    parser.add_argument("--from", dest="start", metavar="DATE", help="first delivery date, YYYY-MM-DD or a prefix")
+    parser.add_argument("--to", dest="end", metavar="DATE", help="last delivery date, YYYY-MM-DD or a prefix")
+    parser.add_argument("--site", action="append", help="only these sites (repeatable)")
+    parser.add_argument("--ledger", default=str(LEDGER_FILE), help="ledger file")
+    parser.add_argument("--export", metavar="FILE", help="write the report to a .csv or .xlsx file")
+    args = parser.parse_args()
+
+    by = [key.strip() for key in args.by.split(",") if key.strip()]
+    totals = to_rupees(summarise(load_ledger(args.ledger), by, args.period, args.start, args.end, args.site))
+    if args.export:
+        print(f"Report saved to {export(totals, args.export)}")
+    else:
+        with pd.option_context("display.max_rows", None, "display.width", 200, "display.float_format", "{:,.2f}".format):
+            print(totals.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
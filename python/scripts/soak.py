@@ -0,0 +1,340 @@
+"""
+Soak test: generate thousands of synthetic invoices in one process, the way the
+phone's Chaquopy interpreter and a long-running server do, and fail if memory,
+open file descriptors or live objects keep growing from one invoice to the next.
+
+Run from the python/ folder:
+    python -m scripts.soak --invoices 2000
+    python -m scripts.soak --target render --formats pdf --invoices 5000
+    python -m scripts.soak --target mobile --invoices 1000
+
+Targets:
+    pipeline  main.process_po_file on a synthetic PO spreadsheet (default)
+    render    the renderers alone, on run_meta built in memory
+    mobile    the app's generate_bill (mobile/android/app/src/main/python)
+Every invoice is written under a scratch folder that is removed afterwards; the
+real output/, counter and ledger are not touched.
+
+After --warmup invoices (imports, font and style caches, the bounded lru caches
+filling up) a sample is taken every --every invoices, and each metric's growth per
+1,000 invoices is the least-squares slope over those samples. The exit status is 1
+if any slope is above its limit. PO numbers and invoice numbers are unique per
+invoice, but the line items cycle through --variants shapes, so a cache keyed on
+item content settles during the warm-up while anything kept per invoice shows.
+"""
+import argparse
+import gc
+import importlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import pandas as pd
+
+from scripts.benchmark import make_po_frame
+
+MB = 1024 * 1024
+MOBILE_DIR = Path(__file__).resolve().parents[2] / "mobile" / "android" / "app" / "src" / "main" / "python"
+TARGETS = ("pipeline", "render", "mobile")
+# trailing rows of the buyer's Excel export (dropped again by po_footer_rows)
+FOOTER_LABELS = ("Total Quantity", "Total Items", "Net amount")
+
+
+# === SAMPLING ===
+def rss_bytes():
+    """
+    Resident set size of this process now, or None where it cannot be read.
+    Without /proc the peak RSS is the closest there is, and a peak only grows.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def open_fds():
+    """
+    Open file descriptors of this process, or None where they cannot be listed (Windows).
+    """
+    for fd_dir in ("/proc/self/fd", "/dev/fd"):
+        if os.path.isdir(fd_dir):
+            return len(os.listdir(fd_dir))
+    return None
+
+
+def live_objects() -> int:
+    """
+    Objects tracked by the garbage collector once unreachable cycles are collected:
+    containers and instances, which is where state left behind between invoices lives.
+    """
+    gc.collect()
+    return len(gc.get_objects())
+
+
+def type_counts() -> Counter:
+    gc.collect()
+    return Counter(type(obj).__qualname__ for obj in gc.get_objects())
+
+
+def sample(done: int) -> dict:
+    rss = rss_bytes()
+    return {
+        "invoices": done,
+        "rss_mb": None if rss is None else rss / MB,
+        "fds": open_fds(),
+        "objects": live_objects(),
+    }
+
+
+def growth_per_1000(samples: list, metric: str):
+    """
+    Least-squares slope of `metric` against invoices generated, per 1,000 invoices.
+    None if the metric is unavailable or there are fewer than three samples.
+    """
+    points = [(s["invoices"], s[metric]) for s in samples if s[metric] is not None]
+    if len(points) < 3:
+        return None
+    x, y = zip(*points)
+    return statistics.linear_regression(x, y).slope * 1000
+
+
+# === SYNTHETIC INVOICES ===
+def make_po(rows: int, variant: int) -> pd.DataFrame:
+    """
+    A synthetic PO of `rows` lines: the benchmark's frame, with quantities shifted
+    per variant so the totals differ, and the Excel export's footer rows.
+    """
+    df = make_po_frame(rows)
+    df["Quantity"] = (df["Quantity"] + variant % 5).astype(float)
+    footer = pd.DataFrame({"Grammage": list(FOOTER_LABELS)})
+    return pd.concat([df, footer], ignore_index=True)
+
+
+def po_rows(base_rows: int, variant: int) -> int:
+    return base_rows + variant * 7 % max(base_rows, 1)
+
+
+def po_files(variants: int, rows: int) -> list:
+    """
+    Each variant's .xlsx bytes, written once. Writing the same DataFrame again for every
+    invoice would grow pandas' copy-on-write references to it, which is the harness's
+    own state, not the generator's.
+    """
+    files = []
+    for v in range(variants):
+        buffer = io.BytesIO()
+        make_po(po_rows(rows, v), v).to_excel(buffer, index=False)
+        files.append(buffer.getvalue())
+    return files
+
+
+class PipelineTarget:
+    """
+    main.process_po_file, run with the scratch folder as the working directory so
+    output/, the invoice counter, the rate history and the ledger all live there.
+    """
+
+    def __init__(self, workspace: Path, formats: list, variants: int, rows: int):
+        import main
+
+        self.main = main
+        self.metadata = main.load_metadata(str(Path("metadata.json").resolve()))
+        self.place = next(key for key, value in self.metadata.items() if isinstance(value, dict))
+        self.formats = formats
+        self.workspace = workspace
+        self.inputs = workspace / "data"
+        self.inputs.mkdir()
+        # one PO file per variant, copied under a new PO number for every invoice
+        self.files = po_files(variants, rows)
+        os.chdir(workspace)
+
+    def run(self, n: int):
+        path = self.inputs / f"{10000000000000 + n}_20250509_000000.xlsx"
+        path.write_bytes(self.files[n % len(self.files)])
+        _, outputs = self.main.process_po_file(path, self.place, self.metadata, Path("output") / self.place,
+                                               self.formats)
+        path.unlink()
+        for out in outputs.values():
+            Path(out).unlink()
+
+
+class RenderTarget:
+    """
+    Each format's renderer writing a file, on run_meta assembled in memory.
+    """
+
+    def __init__(self, workspace: Path, formats: list, variants: int, rows: int):
+        from bill.renderers import get_renderer
+        from main import transform_data_for_bill
+        from scripts.benchmark import make_bill_data
+
+        self.renderers = {fmt: get_renderer(fmt) for fmt in formats}
+        base = make_bill_data(1)
+        self.items = [
+            transform_data_for_bill(make_po(po_rows(rows, v), v), footer_rows=len(FOOTER_LABELS))
+            for v in range(variants)
+        ]
+        self.base = base
+        self.workspace = workspace
+
+    def run(self, n: int):
+        data = dict(self.base, PO=str(10000000000000 + n), invoice_no=str(1001 + n),
+                    items=self.items[n % len(self.items)])
+        for fmt, render in self.renderers.items():
+            out_path = self.workspace / f"soak.{fmt}"
+            render(data, filename=str(out_path))
+            out_path.unlink()
+
+
+class MobileTarget:
+    """
+    The app's bill_generator.generate_bill, imported from the mobile tree with its
+    bills folder (counter, reports, rate history, outputs) moved into the scratch folder.
+    """
+
+    def __init__(self, workspace: Path, formats: list, variants: int, rows: int):
+        if str(MOBILE_DIR) not in sys.path:
+            sys.path.insert(0, str(MOBILE_DIR))
+        bill_generator = importlib.import_module("bill_generator")
+        bills = workspace / "bills"
+        bill_generator.BILLS_DIR = bills
+        bill_generator.COUNTER_FILE = bills / "invoice_counter.json"
+        bill_generator.REPORT_DIR = bills / ".reports" / "validation"
+        bill_generator.RATES_FILE = bills / ".reports" / "rates.json"
+        bills.mkdir()
+        self.bill_generator = bill_generator
+        self.place = bill_generator._resolve_place(bill_generator._load_metadata(), None)
+        self.formats = ",".join(formats)
+        self.inputs = workspace / "data"
+        self.inputs.mkdir()
+        self.files = po_files(variants, rows)
+
+    def run(self, n: int):
+        path = self.inputs / f"{10000000000000 + n}_20250509_000000.xlsx"
+        path.write_bytes(self.files[n % len(self.files)])
+        outputs = json.loads(self.bill_generator.generate_bill(str(path), self.place, self.formats))
+        path.unlink()
+        for key, out in outputs.items():
+            if key in self.bill_generator.OUTPUT_FORMATS.values():
+                Path(out).unlink()
+
+
+TARGET_CLASSES = {"pipeline": PipelineTarget, "render": RenderTarget, "mobile": MobileTarget}
+
+
+# === REPORT ===
+def _fmt(value, spec: str) -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def soak(target, invoices: int, warmup: int, every: int, progress: bool = True) -> tuple:
+    """
+    Generate `invoices` invoices with `target`. Returns (samples, object types at
+    the first sample, object types at the end, seconds spent generating).
+    """
+    samples, first_types = [], None
+    elapsed = 0.0
+    for n in range(invoices):
+        t0 = time.perf_counter()
+        # the generators print a line per file written
+        with redirect_stdout(None):
+            target.run(n)
+        elapsed += time.perf_counter() - t0
+        done = n + 1
+        if done >= warmup and (done - warmup) % every == 0:
+            samples.append(sample(done))
+            if first_types is None:
+                first_types = type_counts()
+            if progress:
+                s = samples[-1]
+                print(f"{done:>8} invoices  rss {_fmt(s['rss_mb'], '.1f')} MB  fds {_fmt(s['fds'], 'd')}  "
+                      f"objects {s['objects']:,}  ({done / elapsed:.1f} invoices/s)")
+    return samples, first_types, type_counts(), elapsed
+
+
+def check(samples: list, limits: dict) -> list:
+    """
+    (metric, growth per 1,000 invoices, limit, within limit) for each metric.
+    A metric that could not be measured passes, with growth None.
+    """
+    results = []
+    for metric, limit in limits.items():
+        growth = growth_per_1000(samples, metric)
+        results.append((metric, growth, limit, growth is None or growth <= limit))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak-test invoice generation for leaks in one long-running process")
+    parser.add_argument("--target", choices=TARGETS, default="pipeline", help="what to run per invoice")
+    parser.add_argument("--invoices", type=int, default=2000, help="invoices to generate (default: 2000)")
+    parser.add_argument("--warmup", type=int, default=200, help="invoices before the first sample (default: 200)")
+    parser.add_argument("--every", type=int, default=100, help="invoices between samples (default: 100)")
+    parser.add_argument("--rows", type=int, default=40, help="line items per synthetic PO (default: 40)")
+    parser.add_argument("--variants", type=int, default=25, help="distinct PO shapes cycled through (default: 25)")
+    parser.add_argument("--formats", default="xlsx,pdf", help="comma-separated formats (default: xlsx,pdf)")
+    parser.add_argument("--max-rss-mb", type=float, default=4.0,
+                        help="allowed RSS growth in MB per 1,000 invoices (default: 4)")
+    parser.add_argument("--max-fds", type=float, default=0.5,
+                        help="allowed open file descriptor growth per 1,000 invoices (default: 0.5)")
+    parser.add_argument("--max-objects", type=float, default=200,
+                        help="allowed live object growth per 1,000 invoices (default: 200)")
+    parser.add_argument("--top", type=int, default=10, help="object types listed by growth (default: 10)")
+    args = parser.parse_args()
+
+    if args.invoices < args.warmup + 2 * args.every:
+        parser.error("--invoices must leave at least three samples after --warmup (warmup + 2 x every)")
+    from bill.renderers import parse_formats
+
+    formats = parse_formats(args.formats)
+    limits = {"rss_mb": args.max_rss_mb, "fds": args.max_fds, "objects": args.max_objects}
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="soak_") as tmp:
+        try:
+            target = TARGET_CLASSES[args.target](Path(tmp), formats, args.variants, args.rows)
+            print(f"Soak: {args.invoices} invoices, target {args.target}, formats {','.join(formats)}, "
+                  f"{args.rows}+ rows, sampling every {args.every} after {args.warmup}")
+            samples, first_types, last_types, elapsed = soak(target, args.invoices, args.warmup, args.every)
+        finally:
+            os.chdir(cwd)
+
+    print(f"\n{'metric':<10}{'first':>12}{'last':>12}{'per 1k':>12}{'limit':>10}")
+    results = check(samples, limits)
+    for metric, growth, limit, ok in results:
+        first, last = samples[0][metric], samples[-1][metric]
+        spec = ".1f" if metric == "rss_mb" else ",d"
+        print(f"{metric:<10}{_fmt(first, spec):>12}{_fmt(last, spec):>12}{_fmt(growth, '+.2f'):>12}"
+              f"{limit:>10g}  {'ok' if ok else 'LEAK'}{'' if growth is not None else ' (not measured)'}")
+
+    grown = (last_types - first_types).most_common(args.top)
+    if grown:
+        print(f"\nObject types grown since invoice {samples[0]['invoices']}:")
+        for name, count in grown:
+            print(f"  {count:>+8,}  {name}")
+    print(f"\n{args.invoices} invoices in {elapsed:.1f}s ({args.invoices / elapsed:.1f}/s)")
+
+    failed = [metric for metric, _, _, ok in results if not ok]
+    if failed:
+        print(f"FAIL: {', '.join(failed)} grew faster than allowed")
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# utils/aggregates.py
+# Billed totals by site, date and HSN, kept up to date as invoices are generated.
+# Each invoice appends its per-HSN sums to an append-only ledger, so reports never
+# reopen the generated .xlsx files. Amounts are integer paise, as in the items.
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.money import PAISE_DTYPE, item_column
+
+LEDGER_FILE = Path("output") / ".reports" / "ledger.csv"
+
+# per-HSN sums of one invoice; `lines` counts item rows
+SUM_FIELDS = ["lines", "quantity", "taxable_p", "sgst_p", "cgst_p", "total_p"]
+LEDGER_COLUMNS = ["date", "site", "site_code", "PO", "invoice_no", "hsn"] + SUM_FIELDS
+LEDGER_DTYPES = {
+    "date": "string", "site": "string", "site_code": "string", "PO": "string",
+    "invoice_no": "int64", "hsn": "int64",
+    **{field: PAISE_DTYPE for field in SUM_FIELDS},
+}
+
+GROUP_KEYS = ("site", "date", "hsn")
+PERIODS = {"day": 10, "month": 7, "year": 4}   # length of the ISO date prefix
+
+
+def invoice_rows(data: dict, site: str, date: str) -> pd.DataFrame:
+    """
+    One ledger row per HSN code of the invoice, summed with a single groupby.
+    `date` is the ISO delivery date (YYYY-MM-DD).
+    """
+    items = data["items"]
+    n = len(items)
+    frame = pd.DataFrame({
+        "hsn": item_column(items, 1, np.int64),
+        "lines": np.ones(n, dtype=PAISE_DTYPE),
+        "quantity": item_column(items, 4),
+        "taxable_p": item_column(items, 6),
+        "sgst_p": item_column(items, 8),
+        "cgst_p": item_column(items, 10),
+        "total_p": item_column(items, 11),
+    })
+    sums = frame.groupby("hsn", sort=True).sum().reset_index()
+    sums.insert(0, "date", date)
+    sums.insert(1, "site", site)
+    sums.insert(2, "site_code", data.get("site_code", ""))
+    sums.insert(3, "PO", str(data["PO"]))
+    sums.insert(4, "invoice_no", int(data["invoice_no"]))
+    return sums[LEDGER_COLUMNS]
+
+
+def record_invoice(data: dict, site: str, date: str, ledger_file: Path = LEDGER_FILE) -> int:
+    """
+    Append the invoice's per-HSN totals to the ledger. Returns the number of rows written.
+    Regenerating a PO appends again; load_ledger() keeps only its latest invoice.
+    """
+    rows = invoice_rows(data, site, date)
+    ledger_file = Path(ledger_file)
+    ledger_file.parent.mkdir(parents=True, exist_ok=True)
+    header = not ledger_file.exists() or ledger_file.stat().st_size == 0
+    # one write per invoice: the rows are formatted in memory first
+    chunk = rows.to_csv(index=False, header=header, lineterminator="\n")
+    with open(ledger_file, "a", encoding="utf-8", newline="") as f:
+        f.write(chunk)
+    return len(rows)
+
+
+def load_ledger(ledger_file: Path = LEDGER_FILE) -> pd.DataFrame:
+    """
+    The ledger with superseded invoices dropped: for every (site, PO) only the rows
+    of the invoice written last are kept.
+    """
+    ledger_file = Path(ledger_file)
+    if not ledger_file.exists():
+        return pd.DataFrame({col: pd.Series(dtype=dt) for col, dt in LEDGER_DTYPES.items()})
+    # a crash mid-append can leave a short last line; it is dropped here
+    ledger = pd.read_csv(ledger_file, dtype="string", on_bad_lines="skip").dropna(subset=["total_p"])
+    ledger = ledger.astype(LEDGER_DTYPES).drop_duplicates(["site", "PO", "invoice_no", "hsn"], keep="last")
+    latest = ledger.groupby(["site", "PO"], sort=False)["invoice_no"].transform("last")
+    return ledger[ledger["invoice_no"] == latest].reset_index(drop=True)
+
+
+def summarise(ledger: pd.DataFrame, by=GROUP_KEYS, period: str = "day",
+              start: str = None, end: str = None, sites=None) -> pd.DataFrame:
+    """
+    Totals grouped by any of site, date and hsn, with dates truncated to `period`
+    (day, month or year). `start`/`end` are inclusive ISO date prefixes.
+    """
+    by = list(by)
+    unknown = [key for key in by if key not in GROUP_KEYS]
+    if unknown:
+        raise ValueError(f"Unknown grouping {', '.join(unknown)}, expected any of {', '.join(GROUP_KEYS)}")
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period '{period}', expected one of {', '.join(PERIODS)}")
+
+    mask = np.ones(len(ledger), dtype=bool)
+    if start:
+        mask &= (ledger["date"] >= start).to_numpy(dtype=bool, na_value=False)
+    if end:
+        # "2025-05" as an end date covers the whole month
+        mask &= (ledger["date"].str.slice(0, len(end)) <= end).to_numpy(dtype=bool, na_value=False)
+    if sites:
+        mask &= ledger["site"].isin(list(sites)).to_numpy(dtype=bool, na_value=False)
+    frame = ledger[mask]
+
+    if "date" in by:
+        frame = frame.assign(date=frame["date"].str.slice(0, PERIODS[period]))
+    if not by:
+        totals = frame[SUM_FIELDS].sum().to_frame().T.astype(PAISE_DTYPE)
+        totals.insert(0, "invoices", frame["invoice_no"].nunique())
+        return totals
+    grouped = frame.groupby(by, sort=True)
+    totals = grouped[SUM_FIELDS].sum()
+    totals.insert(0, "invoices", grouped["invoice_no"].nunique())
+    return totals.reset_index()
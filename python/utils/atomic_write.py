@@ -0,0 +1,57 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+# read once: os.umask() can only be queried by setting it, which is not thread-safe
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def write_atomic(path, data: bytes, fsync: bool = True) -> Path:
+    """
+    Write `data` to `path` so readers only ever see the old file or the complete new one.
+    The bytes go to a temporary file in the same directory in one write, which is then
+    renamed over `path`. A crash part-way leaves at most a stray *.tmp file behind.
+    """
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        # mkstemp creates 0600; give the output the mode open() would have
+        os.chmod(tmp, 0o666 & ~_UMASK)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    return path
+
+
+@contextmanager
+def open_atomic(path, mode: str = "w", encoding: str = "utf-8"):
+    """
+    Streaming counterpart of write_atomic(): yields a file object on a temporary file
+    that replaces `path` only if the block finishes without an exception.
+    """
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, encoding=None if "b" in mode else encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o666 & ~_UMASK)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
@@ -0,0 +1,141 @@
+# utils/invoice_store.py
+# The assembled invoice (items, metadata snapshot, invoice number) saved at generation
+# time as gzipped JSON, so any format can be rendered later, or reprinted, from the
+# stored model without re-reading the PO spreadsheet or touching the invoice counter.
+import gzip
+import json
+import re
+from pathlib import Path
+
+from utils.atomic_write import write_atomic
+from utils.line_items import LineItems
+
+MODEL_VERSION = 1
+STORE_DIR = Path("output") / ".invoices"
+MODEL_SUFFIX = ".json.gz"
+# the options each format of an invoice was last rendered with, next to its model
+RENDERS_SUFFIX = ".renders.json"
+# a revision of a billed PO is stored as <stem>_R<n> (replacement) or <stem>_D<n> (difference bill)
+REVISION_RE = r"(_[RD]\d+)?"
+# compiled once: a pattern per PO number would fill re's cache in a long-running process
+_REVISION_SUFFIX = re.compile(REVISION_RE + r"\Z")
+
+
+def model_path(place: str, out_stem: str, store_dir: Path = STORE_DIR) -> Path:
+    return Path(store_dir) / place / f"{out_stem}{MODEL_SUFFIX}"
+
+
+def save_model(run_meta: dict, place: str, out_stem: str, store_dir: Path = STORE_DIR, extra: dict = None) -> Path:
+    """
+    Persist the invoice model. Only the active place's entry of the metadata is kept:
+    the other places are not part of this invoice.
+    `extra` adds top-level fields: the source file name, and for a revision its
+    "revision" record and, on a difference bill, the full PO items as "po_items".
+    """
+    snapshot = {
+        key: value for key, value in run_meta.items()
+        if key == place or not isinstance(value, dict)
+    }
+    # stored as plain rows, the same JSON whichever container the items came in
+    snapshot["items"] = LineItems.from_rows(snapshot["items"]).to_rows()
+    model = {"v": MODEL_VERSION, "place": place, "out_stem": out_stem, "data": snapshot, **(extra or {})}
+    if "po_items" in model:
+        model["po_items"] = LineItems.from_rows(model["po_items"]).to_rows()
+    payload = json.dumps(model, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    path = model_path(place, out_stem, store_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # mtime=0 keeps the gzip header free of the clock
+    return write_atomic(path, gzip.compress(payload, compresslevel=6, mtime=0))
+
+
+def load_model(path) -> dict:
+    """
+    {"place", "out_stem", "data"} where data is the run_meta the renderers take,
+    plus any fields saved as `extra`.
+    """
+    model = json.loads(gzip.decompress(Path(path).read_bytes()))
+    if model.get("v") != MODEL_VERSION:
+        raise ValueError(f"{Path(path).name}: unsupported invoice model version {model.get('v')}")
+    model["data"]["items"] = LineItems.from_rows(model["data"]["items"])
+    if "po_items" in model:
+        model["po_items"] = LineItems.from_rows(model["po_items"])
+    return model
+
+
+def renders_path(place: str, out_stem: str, store_dir: Path = STORE_DIR) -> Path:
+    return Path(store_dir) / place / f"{out_stem}{RENDERS_SUFFIX}"
+
+
+def load_renders(place: str, out_stem: str, store_dir: Path = STORE_DIR) -> dict:
+    """
+    {format: {"options": {...}, "mtime_ns": n}} of the outputs rendered from a model.
+    mtime_ns ties the record to the file it describes.
+    """
+    path = renders_path(place, out_stem, store_dir)
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def record_renders(place: str, out_stem: str, rendered: dict, store_dir: Path = STORE_DIR):
+    """
+    Record the options of freshly rendered outputs: `rendered` is {format: (output path, options)}.
+    """
+    if not rendered:
+        return
+    renders = load_renders(place, out_stem, store_dir)
+    for fmt, (out_path, options) in rendered.items():
+        renders[fmt] = {"options": options, "mtime_ns": Path(out_path).stat().st_mtime_ns}
+    path = renders_path(place, out_stem, store_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(path, json.dumps(renders, sort_keys=True).encode("utf-8"))
+
+
+def po_items(model: dict) -> LineItems:
+    """
+    The PO's items as of this invoice: the billed items, except on a difference bill.
+    """
+    return model.get("po_items", model["data"]["items"])
+
+
+def _is_po_stem(stem: str, po: str) -> bool:
+    """
+    True if `stem` is <anything>_<po>, with or without a revision suffix.
+    """
+    return stem.endswith(f"_{po}") or _REVISION_SUFFIX.sub("", stem).endswith(f"_{po}")
+
+
+def list_models(store_dir: Path = STORE_DIR) -> list:
+    return sorted(Path(store_dir).glob(f"*/*{MODEL_SUFFIX}"))
+
+
+def find_model(ref: str, store_dir: Path = STORE_DIR) -> Path:
+    """
+    Locate a stored invoice by output stem (Begusarai_2025-05-09_2108...), PO number
+    or invoice number. The most recently written match wins, so a PO number finds
+    its latest revision.
+    """
+    ref = str(ref).strip()
+    matches = []
+    for path in list_models(store_dir):
+        stem = path.name[: -len(MODEL_SUFFIX)]
+        if ref == stem or _is_po_stem(stem, ref):
+            matches.append(path)
+    if not matches and ref.isdigit():
+        for path in list_models(store_dir):
+            if str(load_model(path)["data"].get("invoice_no")) == ref:
+                matches.append(path)
+    if not matches:
+        raise FileNotFoundError(f"No stored invoice matches '{ref}' under {store_dir}")
+    return max(matches, key=lambda p: p.stat().st_mtime)
+
+
+def po_models(place: str, po, store_dir: Path = STORE_DIR) -> list:
+    """
+    The stored invoices of one PO at one place, oldest first by invoice number.
+    """
+    models = [
+        load_model(path) for path in sorted((Path(store_dir) / place).glob(f"*{MODEL_SUFFIX}"))
+        if _is_po_stem(path.name[: -len(MODEL_SUFFIX)], str(po))
+    ]
+    return sorted(models, key=lambda model: int(model["data"]["invoice_no"]))
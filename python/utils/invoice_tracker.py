@@ -3,7 +3,10 @@ import os
 
 COUNTER_FILE = "invoice_counter.json"
 
-def get_next_invoice_number():
+def reserve_invoice_numbers(count):
+    """
+    Allocate `count` consecutive invoice numbers with a single counter write.
+    """
     if not os.path.exists(COUNTER_FILE):
         with open(COUNTER_FILE, "w") as f:
             json.dump({"last_invoice": 1000}, f)
@@ -11,10 +14,13 @@ def get_next_invoice_number():
     with open(COUNTER_FILE, "r") as f:
         data = json.load(f)
 
-    last = data.get("last_invoice", 1000)
-    next_invoice = last + 1
+    first = data.get("last_invoice", 1000) + 1
+
+    if count > 0:
+        with open(COUNTER_FILE, "w") as f:
+            json.dump({"last_invoice": first + count - 1}, f)
 
-    with open(COUNTER_FILE, "w") as f:
-        json.dump({"last_invoice": next_invoice}, f)
+    return list(range(first, first + count))
 
-    return next_invoice
+def get_next_invoice_number():
+    return reserve_invoice_numbers(1)[0]
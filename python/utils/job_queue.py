@@ -0,0 +1,240 @@
+# utils/job_queue.py
+# Persistent queue of invoice generation jobs, one per input PO file, kept as JSON
+# under output/.queue/ and rewritten atomically on every state change, so a run
+# that stops part-way (a crash, Ctrl-C, a power cut) resumes where it left off.
+# A failed job is retried with exponential backoff when the error is transient
+# (a file locked by another program, a full disk); otherwise, or after
+# MAX_ATTEMPTS, its input is quarantined until the file changes. A job that succeeds
+# leaves the queue: which files have an invoice is the PO catalog's record.
+import json
+import statistics
+import time
+from pathlib import Path
+from zipfile import BadZipFile
+
+from utils.atomic_write import write_atomic
+
+QUEUE_VERSION = 1
+QUEUE_FILE = Path("output") / ".queue" / "jobs.json"
+
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 2.0      # seconds before the first retry, doubled for each further one
+BACKOFF_MAX = 60.0
+# statistics of the last runs kept in the queue file
+RUNS_KEPT = 20
+
+QUEUED, RUNNING, RETRY, QUARANTINED = "queued", "running", "retry", "quarantined"
+STATES = (QUEUED, RUNNING, RETRY, QUARANTINED)
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Errors worth retrying: I/O that may succeed later, and a worker process that died.
+    Data errors (a bad sheet, a failed validation) fail the same way every time.
+    """
+    if isinstance(error, (FileNotFoundError, IsADirectoryError, NotADirectoryError)):
+        return False
+    # a spreadsheet still being copied into place reads as a broken zip, but so does a
+    # corrupt one; it is quarantined and released as soon as the file changes
+    if isinstance(error, BadZipFile):
+        return False
+    return isinstance(error, (OSError, TimeoutError, MemoryError)) or type(error).__name__ == "BrokenProcessPool"
+
+
+def backoff(attempts: int) -> float:
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+class JobQueue:
+    """
+    Jobs keyed by input path. Each job holds its place, the input's size and mtime
+    when queued (its signature), state, attempts, the time it may next run, the
+    last error, and the stored invoice once billed, so a retry only renders.
+    """
+
+    def __init__(self, queue_file: Path = QUEUE_FILE):
+        self.queue_file = Path(queue_file)
+        self._jobs = {}
+        self._runs = []
+        if self.queue_file.exists():
+            stored = json.loads(self.queue_file.read_text(encoding="utf-8"))
+            if stored.get("v") == QUEUE_VERSION:
+                self._jobs = stored["jobs"]
+                self._runs = stored["runs"]
+        # jobs left running by a run that did not finish start over
+        for job in self._jobs.values():
+            if job["state"] == RUNNING:
+                job["state"] = QUEUED
+        self._run = None
+
+    # === JOBS ===
+    def enqueue(self, path, place: str, size: int, mtime_ns: int) -> bool:
+        """
+        Queue a job for `path`. A job already queued, waiting for a retry or
+        quarantined is left as it is unless the file has changed since, which
+        starts a fresh job. Returns True if a job was queued; call save() after a batch.
+        """
+        key = str(path)
+        job = self._jobs.get(key)
+        signature = [size, mtime_ns]
+        if job is not None and job["signature"] == signature:
+            return False
+        self._jobs[key] = {
+            "place": place, "signature": signature, "state": QUEUED, "attempts": 0,
+            "next_at": 0.0, "queued_at": time.time(), "error": None, "model": None,
+        }
+        return True
+
+    def job(self, path) -> dict:
+        return self._jobs[str(path)]
+
+    def jobs(self, state: str = None) -> list:
+        """
+        (path, job) pairs, in path order, optionally only those in `state`.
+        """
+        return [(Path(key), job) for key, job in sorted(self._jobs.items())
+                if state is None or job["state"] == state]
+
+    def depth(self) -> int:
+        """
+        Jobs still to run: queued, running or waiting to be retried.
+        """
+        return sum(job["state"] != QUARANTINED for job in self._jobs.values())
+
+    def next_due(self, now: float = None):
+        """
+        The next job that may run now, in path order, or None. Fresh jobs go before retries.
+        """
+        now = time.time() if now is None else now
+        due = [(job["state"] == RETRY, key) for key, job in self._jobs.items()
+               if job["state"] == QUEUED or (job["state"] == RETRY and job["next_at"] <= now)]
+        return Path(min(due)[1]) if due else None
+
+    def next_retry_at(self):
+        """
+        When the earliest waiting retry becomes due, or None if none is waiting.
+        """
+        times = [job["next_at"] for job in self._jobs.values() if job["state"] == RETRY]
+        return min(times) if times else None
+
+    # === TRANSITIONS ===
+    def start(self, path):
+        job = self.job(path)
+        job["state"] = RUNNING
+        job["attempts"] += 1
+        job["started_at"] = time.time()
+        self._sample()
+        self.save()
+
+    def billed(self, path, out_stem: str):
+        """
+        Record the stored invoice of a job, so a retry renders it instead of billing again.
+        """
+        self.job(path)["model"] = out_stem
+        self.save()
+
+    def succeed(self, path, bill_s: float = 0.0, render_s: float = 0.0):
+        job = self._jobs.pop(str(path))
+        if self._run is not None:
+            self._run["done"] += 1
+            self._run["bill_s"].append(bill_s)
+            self._run["render_s"].append(render_s)
+            self._run["wait_s"].append(job["started_at"] - job["queued_at"])
+        self._sample()
+        self.save()
+
+    def fail(self, path, error: BaseException) -> str:
+        """
+        Record a failed attempt: retried later if the error is transient and attempts
+        remain, quarantined otherwise. Returns the job's new state.
+        """
+        job = self.job(path)
+        job["error"] = f"{type(error).__name__}: {error}"
+        if is_transient(error) and job["attempts"] < MAX_ATTEMPTS:
+            job["state"] = RETRY
+            job["next_at"] = time.time() + backoff(job["attempts"])
+            if self._run is not None:
+                self._run["retried"] += 1
+        else:
+            job["state"] = QUARANTINED
+            if self._run is not None:
+                self._run["quarantined"] += 1
+        self._sample()
+        self.save()
+        return job["state"]
+
+    def release(self, paths=None) -> int:
+        """
+        Queue quarantined jobs again (all of them if `paths` is None). Returns the count.
+        """
+        wanted = None if paths is None else {str(path) for path in paths}
+        released = 0
+        for key, job in self._jobs.items():
+            if job["state"] == QUARANTINED and (wanted is None or key in wanted):
+                job.update(state=QUEUED, attempts=0, next_at=0.0, error=None)
+                released += 1
+        if released:
+            self.save()
+        return released
+
+    def drop(self, keep) -> int:
+        """
+        Forget the jobs whose input is not in `keep` (files removed from data/); call save() after.
+        """
+        keep = {str(path) for path in keep}
+        gone = [key for key in self._jobs if key not in keep]
+        for key in gone:
+            del self._jobs[key]
+        return len(gone)
+
+    # === RUN STATISTICS ===
+    def begin_run(self, workers: int):
+        self._run = {
+            "started": time.time(), "workers": workers, "done": 0, "retried": 0, "quarantined": 0,
+            "bill_s": [], "render_s": [], "wait_s": [], "depth": [self.depth()],
+        }
+
+    def _sample(self):
+        if self._run is not None:
+            self._run["depth"].append(self.depth())
+
+    def end_run(self) -> dict:
+        """
+        Close the run and return its statistics: jobs done, retried and quarantined,
+        throughput, mean and maximum queue depth, and mean times per job.
+        """
+        run, self._run = self._run, None
+        elapsed = time.time() - run["started"]
+
+        def mean(values):
+            return round(statistics.fmean(values), 3) if values else 0.0
+
+        stats = {
+            "started": round(run["started"], 3), "elapsed_s": round(elapsed, 3), "workers": run["workers"],
+            "done": run["done"], "retried": run["retried"], "quarantined": run["quarantined"],
+            "jobs_per_min": round(run["done"] * 60 / elapsed, 2) if elapsed > 0 else 0.0,
+            "depth_start": run["depth"][0], "depth_max": max(run["depth"]), "depth_mean": mean(run["depth"]),
+            "depth_end": self.depth(),
+            "wait_s": mean(run["wait_s"]), "bill_s": mean(run["bill_s"]), "render_s": mean(run["render_s"]),
+        }
+        self._runs = (self._runs + [stats])[-RUNS_KEPT:]
+        self.save()
+        return stats
+
+    def runs(self) -> list:
+        return list(self._runs)
+
+    def save(self):
+        self.queue_file.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"v": QUEUE_VERSION, "jobs": self._jobs, "runs": self._runs}
+        write_atomic(self.queue_file, json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+
+def describe_run(stats: dict) -> str:
+    return (
+        f"{stats['done']} done, {stats['retried']} retried, {stats['quarantined']} quarantined "
+        f"in {stats['elapsed_s']:.2f}s with {stats['workers']} workers ({stats['jobs_per_min']:.1f} jobs/min); "
+        f"depth {stats['depth_start']} -> {stats['depth_end']} (max {stats['depth_max']}, "
+        f"mean {stats['depth_mean']:.1f}); per job: wait {stats['wait_s']:.2f}s, "
+        f"bill {stats['bill_s']:.2f}s, render {stats['render_s']:.2f}s"
+    )
@@ -0,0 +1,117 @@
+# utils/line_items.py
+# Invoice line items as typed columns instead of a list of 12 boxed values per row:
+# codes, quantities and paise amounts are int64 arrays, GST rates float64, and the
+# description and grammage columns hold interned strings, so a text repeated across
+# rows or bills is stored once. Rows still read like the old lists (len, iteration,
+# items[i][6]); the renderers read whole columns and format each with one formatter.
+import sys
+
+import numpy as np
+
+from utils.money import PAISE_DTYPE
+
+# column order of an item row, as produced by the transform
+FIELDS = ("code", "hsn", "desc", "gram", "qty", "rate", "taxable",
+          "sgst_rate", "sgst", "cgst_rate", "cgst", "total")
+TEXT_IDX = (2, 3)
+RATE_IDX = (7, 9)
+
+
+def format_column(values, fmt) -> list:
+    """
+    `fmt` applied to every value, once per distinct value: HSN codes, rates,
+    quantities and grammages repeat down an invoice.
+    """
+    memo = {}
+    return [memo[v] if v in memo else memo.setdefault(v, fmt(v)) for v in values]
+
+
+class LineItems:
+    """
+    The item rows of one invoice, stored column by column.
+    """
+    __slots__ = ("_columns",)
+
+    def __init__(self, columns):
+        """
+        `columns`: the 12 columns in row order (arrays, Series or sequences).
+        Numeric columns are converted to their fixed dtype, text columns interned.
+        """
+        if len(columns) != len(FIELDS):
+            raise ValueError(f"expected {len(FIELDS)} item columns, got {len(columns)}")
+        typed = []
+        for idx, column in enumerate(columns):
+            if idx in TEXT_IDX:
+                typed.append(tuple(sys.intern(str(value)) for value in column))
+            else:
+                dtype = np.float64 if idx in RATE_IDX else PAISE_DTYPE
+                typed.append(np.ascontiguousarray(column, dtype=dtype))
+        if len({len(column) for column in typed}) > 1:
+            raise ValueError("item columns differ in length")
+        self._columns = tuple(typed)
+
+    @classmethod
+    def from_rows(cls, rows) -> "LineItems":
+        """
+        From rows of 12 values (a stored model, an older caller). A LineItems is returned as is.
+        """
+        if isinstance(rows, cls):
+            return rows
+        rows = list(rows)
+        if not rows:
+            return cls([()] * len(FIELDS))
+        return cls(list(zip(*rows)))
+
+    def __len__(self) -> int:
+        return len(self._columns[0])
+
+    def __iter__(self):
+        return zip(*self.columns())
+
+    def __getitem__(self, index: int) -> tuple:
+        return tuple(column[index].item() if isinstance(column, np.ndarray) else column[index]
+                     for column in self._columns)
+
+    def column(self, idx: int):
+        """
+        Column `idx` as stored: an int64/float64 array, or a tuple of strings.
+        """
+        return self._columns[idx]
+
+    def columns(self, rupee_idx=()) -> list:
+        """
+        The columns as lists of Python values, with the paise columns in `rupee_idx`
+        converted to rupees for numeric cells (exact to the displayed 2 decimals).
+        """
+        out = []
+        for idx, column in enumerate(self._columns):
+            if idx in rupee_idx:
+                column = column / 100
+            out.append(column.tolist() if isinstance(column, np.ndarray) else column)
+        return out
+
+    def rows(self, formatters=None, rupee_idx=(), column_formatters=None) -> list:
+        """
+        Rows as lists. `formatters` maps column index -> function; each column is
+        formatted in one pass rather than dispatching on the column of every cell.
+        `column_formatters` maps column index -> function taking the stored column
+        and returning the formatted list, for formatters that work in bulk.
+        """
+        columns = self.columns(rupee_idx)
+        for idx, fmt in (formatters or {}).items():
+            columns[idx] = format_column(columns[idx], fmt)
+        for idx, fmt in (column_formatters or {}).items():
+            columns[idx] = fmt(self._columns[idx])
+        return [list(row) for row in zip(*columns)]
+
+    def to_rows(self) -> list:
+        """
+        Plain lists of Python values, the layout stored in invoice models and hashed by the render cache.
+        """
+        return self.rows()
+
+    @property
+    def nbytes(self) -> int:
+        # text cells are counted as references: the interned strings are shared
+        return sum(column.nbytes if isinstance(column, np.ndarray) else 8 * len(column)
+                   for column in self._columns)
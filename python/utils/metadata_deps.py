@@ -0,0 +1,134 @@
+# utils/metadata_deps.py
+# Which metadata.json fields every stored invoice was rendered with, so that a
+# corrected address re-renders only the invoices that printed it. The index maps
+# each invoice (<place>/<out_stem>) to a fingerprint of every field it used, e.g.
+# {"Begusarai/Begusarai_2025-05-09_2108...": {"GST": "3f2a...", "Begusarai.bill_to": "9c1e..."}},
+# and is kept as JSON next to the stored models. Fields are named by their path in
+# metadata.json: the common ones by key, a place's by "<place>.<key>".
+import hashlib
+import json
+from pathlib import Path
+
+from utils.atomic_write import write_atomic
+from utils.invoice_store import MODEL_SUFFIX, STORE_DIR, list_models, load_model
+
+DEPS_FILE = STORE_DIR / "metadata_deps.json"
+# invoice fields copied from metadata.json (see build_run_meta)
+COMMON_FIELDS = ("GST", "vendor_code")
+PLACE_FIELDS = ("bill_to", "place_of_supply", "site_code")
+
+
+def fingerprint(value) -> str:
+    return hashlib.sha256(json.dumps(value, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def field_values(data: dict, place: str) -> dict:
+    """
+    {field path: value} of the metadata fields printed on an invoice, from its data.
+    """
+    values = {field: data.get(field) for field in COMMON_FIELDS}
+    values.update({f"{place}.{field}": data.get(field) for field in PLACE_FIELDS})
+    return values
+
+
+def metadata_values(metadata: dict, place: str) -> dict:
+    """
+    The same fields as they are in metadata.json now. A place no longer there has none.
+    """
+    values = {field: metadata.get(field) for field in COMMON_FIELDS}
+    if isinstance(metadata.get(place), dict):
+        values.update({f"{place}.{field}": metadata[place].get(field) for field in PLACE_FIELDS})
+    return values
+
+
+def invoice_key(place: str, out_stem: str) -> str:
+    return f"{place}/{out_stem}"
+
+
+def load_index(deps_file: Path = DEPS_FILE) -> dict:
+    deps_file = Path(deps_file)
+    if not deps_file.exists():
+        return {}
+    return json.loads(deps_file.read_text(encoding="utf-8"))
+
+
+def save_index(index: dict, deps_file: Path = DEPS_FILE):
+    deps_file = Path(deps_file)
+    deps_file.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(deps_file, json.dumps(index, indent=1, sort_keys=True).encode("utf-8"))
+
+
+def record(invoices, deps_file: Path = DEPS_FILE) -> int:
+    """
+    Enter (place, out_stem, data) invoices in the index with one read and one write.
+    Returns the number entered.
+    """
+    index = load_index(deps_file)
+    count = 0
+    for place, out_stem, data in invoices:
+        index[invoice_key(place, out_stem)] = {
+            field: fingerprint(value) for field, value in field_values(data, place).items()
+        }
+        count += 1
+    if count:
+        save_index(index, deps_file)
+    return count
+
+
+def sync(store_dir: Path = STORE_DIR, deps_file: Path = DEPS_FILE) -> dict:
+    """
+    Bring the index in line with the store: models saved before the index existed
+    are entered from their data, entries of deleted models are dropped. Only the
+    models missing from the index are read. Returns the index.
+    """
+    index = load_index(deps_file)
+    stored = {}
+    for path in list_models(store_dir):
+        stored[invoice_key(path.parent.name, path.name[: -len(MODEL_SUFFIX)])] = path
+    changed = False
+    for key in set(index) - set(stored):
+        del index[key]
+        changed = True
+    for key in sorted(set(stored) - set(index)):
+        model = load_model(stored[key])
+        index[key] = {
+            field: fingerprint(value) for field, value in field_values(model["data"], model["place"]).items()
+        }
+        changed = True
+    if changed:
+        save_index(index, deps_file)
+    return index
+
+
+def affected(index: dict, metadata: dict) -> dict:
+    """
+    {(place, out_stem): [changed field paths]} for the invoices whose metadata fields
+    no longer match metadata.json. Compared by fingerprint, without opening a model;
+    invoices of a place removed from metadata.json are left alone.
+    """
+    current = {}
+    stale = {}
+    for key, used in index.items():
+        place, out_stem = key.split("/", 1)
+        if place not in current:
+            current[place] = {
+                field: fingerprint(value) for field, value in metadata_values(metadata, place).items()
+            } if isinstance(metadata.get(place), dict) else None
+        if current[place] is None:
+            continue
+        fields = [field for field, digest in used.items() if current[place].get(field, digest) != digest]
+        if fields:
+            stale[(place, out_stem)] = fields
+    return stale
+
+
+def apply(data: dict, metadata: dict, place: str) -> dict:
+    """
+    The invoice data with its metadata fields (and its place's snapshot) taken from
+    metadata.json. Everything else, invoice number and items included, is kept.
+    """
+    updated = dict(data)
+    updated.update({field: metadata[field] for field in COMMON_FIELDS if field in metadata})
+    updated.update({field: metadata[place][field] for field in PLACE_FIELDS if field in metadata[place]})
+    updated[place] = metadata[place]
+    return updated
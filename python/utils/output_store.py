@@ -0,0 +1,331 @@
+# utils/output_store.py
+# Rendered outputs sharded by site and month: output/<place>/<YYYY-MM>/<stem>.<fmt>.
+# An index of every file, loose or archived, is kept under output/.outputs and refreshed
+# the way the PO catalog is: a month folder is listed again only when its mtime changes.
+# Months past a cutoff are compacted into one <YYYY-MM>.zip per site, and any date range
+# can be exported as a zip streamed member by member from the loose files and archives.
+import json
+import os
+import re
+import shutil
+import time
+from datetime import date
+from pathlib import Path
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED
+
+from utils.atomic_write import open_atomic, write_atomic
+
+INDEX_VERSION = 1
+OUTPUT_DIR = Path("output")
+INDEX_NAME = Path(".outputs") / "index.json"
+ARCHIVE_SUFFIX = ".zip"
+# a folder modified this recently may still gain files within the same mtime tick,
+# so its listing is not trusted and it is listed again on the next refresh
+RACY_NS = 2_000_000_000
+COPY_CHUNK = 1 << 20
+
+MONTH_RE = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def month_dir(place_dir, iso_date: str) -> Path:
+    """
+    Shard of `place_dir` for outputs delivered on `iso_date` (YYYY-MM-DD).
+    """
+    return Path(place_dir) / str(iso_date)[:7]
+
+
+def file_date(name: str, month: str) -> str:
+    """
+    Delivery date (YYYY-MM-DD) from an output file name, else the first day of its month.
+    """
+    found = DATE_RE.search(name)
+    return found.group() if found else f"{month}-01"
+
+
+def _month_number(month: str) -> int:
+    return int(month[:4]) * 12 + int(month[5:7]) - 1
+
+
+def _cutoff(months: int, today=None) -> int:
+    # the current month and the (months - 1) before it are kept
+    if months < 1:
+        raise ValueError("at least the current month must be kept")
+    today = today or date.today()
+    return today.year * 12 + today.month - 1 - (months - 1)
+
+
+class OutputStore:
+    """
+    The rendered outputs under `base`, by place and month. A month holds loose files
+    in <place>/<YYYY-MM>/, an archive <place>/<YYYY-MM>.zip, or both; a loose file
+    shadows an archived one of the same name.
+    """
+
+    def __init__(self, base: Path = OUTPUT_DIR, index_file: Path = None):
+        self.base = Path(base)
+        self.index_file = Path(index_file) if index_file else self.base / INDEX_NAME
+        # place -> month -> {"dir": mtime_ns or None, "files": {name: [size, mtime_ns]},
+        #                    "zip": None or {"mtime": mtime_ns, "files": {name: size}}}
+        self._months = {}
+        self._dirty = False
+        if self.index_file.exists():
+            stored = json.loads(self.index_file.read_text(encoding="utf-8"))
+            # an older layout is simply rebuilt from the folders
+            if stored.get("v") == INDEX_VERSION:
+                self._months = stored["months"]
+
+    # === REFRESH ===
+    def refresh(self) -> int:
+        """
+        Bring the index up to date with the place folders. Files left directly in a
+        place folder (the flat layout) are first moved into their month.
+        Returns the number of files added, changed or removed.
+        """
+        changed = 0
+        places = set()
+        if self.base.is_dir():
+            with os.scandir(self.base) as listing:
+                places = {entry.name for entry in listing if entry.is_dir() and not entry.name.startswith(".")}
+        for place in places:
+            changed += self._refresh_place(place)
+        for place in [place for place in self._months if place not in places]:
+            changed += sum(len(slot["files"]) + len((slot["zip"] or {}).get("files", ()))
+                           for slot in self._months.pop(place).values())
+            self._dirty = True
+        return changed
+
+    def _refresh_place(self, place: str) -> int:
+        place_dir = self.base / place
+        with os.scandir(place_dir) as listing:
+            entries = [entry for entry in listing if not entry.name.startswith(".")]
+        flat = [entry for entry in entries if entry.is_file() and not self._is_archive(entry.name)]
+        if flat:
+            for entry in flat:
+                self._shard_flat(place_dir, entry)
+            with os.scandir(place_dir) as listing:
+                entries = [entry for entry in listing if not entry.name.startswith(".")]
+
+        months = self._months.setdefault(place, {})
+        found, changed = set(), 0
+        for entry in entries:
+            if entry.is_dir() and MONTH_RE.match(entry.name):
+                found.add(entry.name)
+                changed += self._scan_month(months, entry.name, entry.path)
+            elif entry.is_file() and self._is_archive(entry.name):
+                month = entry.name[: -len(ARCHIVE_SUFFIX)]
+                found.add(month)
+                changed += self._scan_archive(months, month, entry)
+        for month, slot in months.items():
+            if month not in found:
+                continue
+            if slot["files"] and not os.path.isdir(place_dir / month):
+                changed += len(slot["files"])
+                slot["files"], slot["dir"] = {}, None
+                self._dirty = True
+            if slot["zip"] and not os.path.isfile(place_dir / f"{month}{ARCHIVE_SUFFIX}"):
+                changed += len(slot["zip"]["files"])
+                slot["zip"] = None
+                self._dirty = True
+        for month in [month for month in months if month not in found]:
+            slot = months.pop(month)
+            changed += len(slot["files"]) + len((slot["zip"] or {}).get("files", ()))
+            self._dirty = True
+        return changed
+
+    @staticmethod
+    def _is_archive(name: str) -> bool:
+        return name.endswith(ARCHIVE_SUFFIX) and bool(MONTH_RE.match(name[: -len(ARCHIVE_SUFFIX)]))
+
+    @staticmethod
+    def _shard_flat(place_dir: Path, entry):
+        found = DATE_RE.search(entry.name)
+        month = found.group()[:7] if found else time.strftime("%Y-%m", time.localtime(entry.stat().st_mtime))
+        target = place_dir / month
+        target.mkdir(exist_ok=True)
+        os.replace(entry.path, target / entry.name)
+
+    def _scan_month(self, months: dict, month: str, path: str) -> int:
+        slot = months.setdefault(month, {"dir": None, "files": {}, "zip": None})
+        dir_mtime = os.stat(path).st_mtime_ns
+        if slot["dir"] == dir_mtime:
+            return 0
+        files = {}
+        with os.scandir(path) as listing:
+            for entry in listing:
+                # *.tmp files of writes in progress start with a dot
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                st = entry.stat()
+                files[entry.name] = [st.st_size, st.st_mtime_ns]
+        changed = len(files.keys() ^ slot["files"].keys()) + sum(
+            1 for name, meta in files.items() if name in slot["files"] and slot["files"][name] != meta)
+        trusted = dir_mtime if time.time_ns() - dir_mtime > RACY_NS else None
+        if changed or slot["dir"] != trusted:
+            self._dirty = True
+        slot["files"], slot["dir"] = files, trusted
+        return changed
+
+    def _scan_archive(self, months: dict, month: str, entry) -> int:
+        slot = months.setdefault(month, {"dir": None, "files": {}, "zip": None})
+        mtime = entry.stat().st_mtime_ns
+        if slot["zip"] and slot["zip"]["mtime"] == mtime:
+            return 0
+        with ZipFile(entry.path) as archive:
+            files = {info.filename: info.file_size for info in archive.infolist()}
+        old = (slot["zip"] or {}).get("files", {})
+        slot["zip"] = {"mtime": mtime, "files": files}
+        self._dirty = True
+        return len(files.keys() ^ old.keys()) + sum(1 for name in files if name in old and old[name] != files[name])
+
+    # === QUERIES ===
+    def months(self, places=None) -> list:
+        """
+        [(place, month, loose files, archived files, bytes)] in place and month order.
+        """
+        rows = []
+        for place in sorted(self._months):
+            if places and place not in places:
+                continue
+            for month, slot in sorted(self._months[place].items()):
+                archived = (slot["zip"] or {}).get("files", {})
+                size = sum(meta[0] for meta in slot["files"].values()) + sum(archived.values())
+                rows.append((place, month, len(slot["files"]), len(archived), size))
+        return rows
+
+    def entries(self, start: str = None, end: str = None, places=None):
+        """
+        Yield (place, month, name, source) for the files delivered between `start` and
+        `end` (YYYY-MM-DD, inclusive; either may be None), in place, month and name order.
+        source is a Path for a loose file, or (archive path, member name) for an archived one.
+        """
+        for place in sorted(self._months):
+            if places and place not in places:
+                continue
+            for month, slot in sorted(self._months[place].items()):
+                if (start and month < start[:7]) or (end and month > end[:7]):
+                    continue
+                archived = (slot["zip"] or {}).get("files", {})
+                for name in sorted(slot["files"].keys() | archived.keys()):
+                    day = file_date(name, month)
+                    if (start and day < start) or (end and day > end):
+                        continue
+                    if name in slot["files"]:
+                        yield place, month, name, self.base / place / month / name
+                    else:
+                        yield place, month, name, (self.base / place / f"{month}{ARCHIVE_SUFFIX}", name)
+
+    # === MAINTENANCE ===
+    def compact(self, keep_months: int = 3, today=None) -> dict:
+        """
+        Move the loose files of every month before the last `keep_months` into that
+        month's archive, merging with an archive already there. The archive replaces
+        the old one atomically before any loose file is removed.
+        Returns {"files": files archived, "months": ["<place>/<YYYY-MM>", ...]}.
+        """
+        self.refresh()
+        cutoff = _cutoff(keep_months, today)
+        archived, compacted = 0, []
+        for place, months in sorted(self._months.items()):
+            for month, slot in sorted(months.items()):
+                if not slot["files"] or _month_number(month) >= cutoff:
+                    continue
+                archived += self._archive_month(place, month, slot)
+                compacted.append(f"{place}/{month}")
+        self.refresh()
+        return {"files": archived, "months": compacted}
+
+    def _archive_month(self, place: str, month: str, slot: dict) -> int:
+        loose_dir = self.base / place / month
+        target = self.base / place / f"{month}{ARCHIVE_SUFFIX}"
+        loose = sorted(slot["files"])
+        with open_atomic(target, "wb") as f, ZipFile(f, "w", ZIP_DEFLATED) as archive:
+            if slot["zip"] and target.exists():
+                with ZipFile(target) as old:
+                    for info in old.infolist():
+                        if info.filename not in slot["files"]:
+                            _copy_member(old, info, archive, info.filename)
+            for name in loose:
+                archive.write(loose_dir / name, name)
+        for name in loose:
+            (loose_dir / name).unlink()
+        try:
+            loose_dir.rmdir()
+        except OSError:
+            # something not indexed (a write in progress) is still there
+            pass
+        return len(loose)
+
+    def prune(self, retain_months: int, today=None) -> int:
+        """
+        Delete the loose files and archives of every month before the last
+        `retain_months`. The invoice models (utils/invoice_store.py) are kept, so a
+        pruned invoice can still be rendered again. Returns the number of files deleted.
+        """
+        self.refresh()
+        cutoff = _cutoff(retain_months, today)
+        removed = 0
+        for place, months in sorted(self._months.items()):
+            for month, slot in sorted(months.items()):
+                if _month_number(month) >= cutoff:
+                    continue
+                loose_dir = self.base / place / month
+                if slot["files"]:
+                    removed += len(slot["files"])
+                    shutil.rmtree(loose_dir, ignore_errors=True)
+                if slot["zip"]:
+                    removed += len(slot["zip"]["files"])
+                    (self.base / place / f"{month}{ARCHIVE_SUFFIX}").unlink(missing_ok=True)
+        self.refresh()
+        return removed
+
+    def export(self, out, start: str = None, end: str = None, places=None) -> int:
+        """
+        Write the files delivered between `start` and `end` as one zip to `out` (a path,
+        or a binary stream that need not be seekable, e.g. stdout). Members are named
+        <place>/<YYYY-MM>/<file> and copied straight from disk or from the monthly
+        archives in chunks, so nothing is staged. Returns the number of members.
+        """
+        self.refresh()
+        if hasattr(out, "write"):
+            return self._export_to(out, start, end, places)
+        with open_atomic(out, "wb") as f:
+            return self._export_to(f, start, end, places)
+
+    def _export_to(self, stream, start, end, places) -> int:
+        count = 0
+        sources = {}
+        try:
+            with ZipFile(stream, "w", ZIP_DEFLATED) as out:
+                for place, month, name, source in self.entries(start, end, places):
+                    arcname = f"{place}/{month}/{name}"
+                    if isinstance(source, Path):
+                        out.write(source, arcname)
+                    else:
+                        path, member = source
+                        if path not in sources:
+                            sources[path] = ZipFile(path)
+                        _copy_member(sources[path], sources[path].getinfo(member), out, arcname)
+                    count += 1
+        finally:
+            for archive in sources.values():
+                archive.close()
+        return count
+
+    def save(self):
+        if not self._dirty:
+            return
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"v": INDEX_VERSION, "months": self._months}
+        write_atomic(self.index_file, json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        self._dirty = False
+
+
+def _copy_member(source: ZipFile, info: ZipInfo, target: ZipFile, arcname: str):
+    # decompress and recompress in chunks: the member is never held in memory whole
+    member = ZipInfo(arcname, info.date_time)
+    member.compress_type = ZIP_DEFLATED
+    member.external_attr = info.external_attr
+    member.file_size = info.file_size
+    with source.open(info) as src, target.open(member, "w") as dst:
+        shutil.copyfileobj(src, dst, COPY_CHUNK)
@@ -0,0 +1,128 @@
+# utils/po_diff.py
+# Revised POs: a buyer may resend a PO under the same number with changed lines. The
+# two versions' items are compared by Item Code in one keyed, vectorized pass (a
+# groupby per version and an aligned reindex), and the changes can be billed either
+# as a full replacement invoice or as a difference bill of the changed lines only.
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.line_items import LineItems
+from utils.money import PAISE_DTYPE
+
+# item row positions (see transform_data_for_bill)
+CODE, HSN, DESC, GRAM, QTY, RATE = 0, 1, 2, 3, 4, 5
+# columns summed per item code and compared, with their row positions
+SUMMED = {"qty": 4, "taxable": 6, "sgst": 8, "cgst": 10, "total": 11}
+
+REPORT_DIR = Path("output") / ".reports" / "revisions"
+REVISION_MODES = ("replace", "difference", "rebill")
+# invoice title and reference line of each kind of revision bill
+TITLES = {"replace": "REVISED TAX INVOICE", "difference": "SUPPLEMENTARY INVOICE"}
+REFERENCES = {"replace": "REPLACES INVOICE NO", "difference": "AGAINST INVOICE NO"}
+
+ADDED, REMOVED, UNCHANGED = "added", "removed", "unchanged"
+QUANTITY, RATE_CHANGED, BOTH = "quantity", "rate", "quantity+rate"
+
+
+def _by_code(items: LineItems) -> pd.DataFrame:
+    """
+    One row per item code: the first row's HSN, description, grammage and rate, and
+    the summed quantity and amounts (a code listed twice is compared on its totals).
+    """
+    frame = pd.DataFrame({
+        "code": items.column(CODE), "hsn": items.column(HSN),
+        "desc": items.column(DESC), "gram": items.column(GRAM), "rate": items.column(RATE),
+        **{name: items.column(idx) for name, idx in SUMMED.items()},
+    })
+    grouped = frame.groupby("code", sort=False)
+    first = grouped[["hsn", "desc", "gram", "rate"]].first()
+    return first.join(grouped[list(SUMMED)].sum())
+
+
+def diff_items(old, new) -> pd.DataFrame:
+    """
+    Compare two versions of a PO's items (LineItems or rows) by item code.
+    Returns one row per code present in either version, in code order, with
+    `status` (added, removed, quantity, rate, quantity+rate or unchanged), the
+    old and new quantity and rate, the describing fields of the latest version,
+    and the change of every summed column (qty_delta, taxable_delta, ...).
+    Rates and amounts are integer paise.
+    """
+    old, new = _by_code(LineItems.from_rows(old)), _by_code(LineItems.from_rows(new))
+    codes = old.index.union(new.index)
+    in_old = codes.isin(old.index)
+    in_new = codes.isin(new.index)
+    old, new = old.reindex(codes), new.reindex(codes)
+
+    diff = pd.DataFrame(index=codes)
+    # describing fields from the new version, or the old one for removed codes
+    for field in ("hsn", "desc", "gram"):
+        diff[field] = new[field].where(in_new, old[field])
+    numeric = ["rate", *SUMMED]
+    old_values = old[numeric].fillna(0).astype(PAISE_DTYPE)
+    new_values = new[numeric].fillna(0).astype(PAISE_DTYPE)
+    diff["hsn"] = diff["hsn"].astype(np.int64)
+    for field in ("qty", "rate"):
+        diff[f"{field}_old"] = old_values[field]
+        diff[f"{field}_new"] = new_values[field]
+    for field in SUMMED:
+        diff[f"{field}_delta"] = new_values[field] - old_values[field]
+
+    qty_changed = (diff["qty_delta"] != 0).to_numpy()
+    rate_changed = (diff["rate_new"] != diff["rate_old"]).to_numpy()
+    diff.insert(0, "status", np.select(
+        [~in_old, ~in_new, qty_changed & rate_changed, qty_changed, rate_changed],
+        [ADDED, REMOVED, BOTH, QUANTITY, RATE_CHANGED],
+        default=UNCHANGED,
+    ))
+    return diff.rename_axis("code").reset_index()
+
+
+def changed(diff: pd.DataFrame) -> pd.DataFrame:
+    return diff[diff["status"] != UNCHANGED]
+
+
+def difference_items(diff: pd.DataFrame) -> LineItems:
+    """
+    The lines of a difference bill: one per changed item code, carrying the change in
+    quantity and in every amount at the current rate (the old rate for removed codes).
+    Amounts of reduced lines are negative. Tax rates are not carried by the diff; they
+    are 0 here, as transform_data_for_bill bills them today.
+    """
+    diff = changed(diff)
+    n = len(diff)
+    rate = np.where(diff["status"] == REMOVED, diff["rate_old"], diff["rate_new"]).astype(PAISE_DTYPE)
+    rates = np.zeros(n, dtype=np.float64)
+    return LineItems([
+        diff["code"].to_numpy(np.int64), diff["hsn"].to_numpy(np.int64),
+        diff["desc"].astype(str).tolist(), diff["gram"].astype(str).tolist(),
+        diff["qty_delta"].to_numpy(PAISE_DTYPE), rate, diff["taxable_delta"].to_numpy(PAISE_DTYPE),
+        rates, diff["sgst_delta"].to_numpy(PAISE_DTYPE),
+        rates, diff["cgst_delta"].to_numpy(PAISE_DTYPE),
+        diff["total_delta"].to_numpy(PAISE_DTYPE),
+    ])
+
+
+def summary(diff: pd.DataFrame) -> dict:
+    """
+    Counts per status and the net change of the billed total, for printing and reports.
+    """
+    counts = diff["status"].value_counts()
+    return {
+        "codes": int(len(diff)),
+        **{status: int(counts.get(status, 0)) for status in (ADDED, REMOVED, QUANTITY, RATE_CHANGED, BOTH)},
+        "taxable_delta_p": int(diff["taxable_delta"].sum()),
+        "total_delta_p": int(diff["total_delta"].sum()),
+    }
+
+
+def describe(summary: dict) -> str:
+    net = summary["total_delta_p"]
+    rupees, paise = divmod(abs(net), 100)
+    return (
+        f"{summary[ADDED]} added, {summary[REMOVED]} removed, "
+        f"{summary[QUANTITY] + summary[BOTH]} quantity and {summary[RATE_CHANGED] + summary[BOTH]} rate changes, "
+        f"net {'-' if net < 0 else '+'}{rupees:,}.{paise:02d}"
+    )
@@ -0,0 +1,96 @@
+import hashlib
+import json
+from pathlib import Path
+
+from utils.atomic_write import write_atomic
+
+# Bump when a generator's layout changes so stale renders are not served
+CACHE_VERSION = 5
+CACHE_DIR = Path("output") / ".cache"
+
+
+def _json_default(value):
+    # typed line items hash as their plain rows, so keys match the stored models
+    if hasattr(value, "to_rows"):
+        return value.to_rows()
+    # numpy scalars coming out of the transform
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def invoice_key(data: dict, fmt: str, compact: bool = False, copies: int = 1) -> str:
+    """
+    Stable key for rendering `data` as `fmt`: the hash of the canonical invoice JSON.
+    The compact profile and multi-copy PDFs are different renderings, so they get their own keys.
+    """
+    request = {"v": CACHE_VERSION, "fmt": fmt, "data": data}
+    if compact:
+        request["compact"] = True
+    if copies > 1:
+        request["copies"] = copies
+    payload = json.dumps(
+        request,
+        sort_keys=True, separators=(",", ":"), default=_json_default,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def content_hash(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _key_path(cache_dir: Path, key: str) -> Path:
+    # one small file per key holding its content hash: renders running in parallel
+    # processes each write their own, so no entry is lost to a concurrent update
+    return cache_dir / "keys" / key[:2] / key
+
+
+def _blob_path(cache_dir: Path, digest: str) -> Path:
+    return cache_dir / "objects" / digest[:2] / digest
+
+
+def lookup(key: str, cache_dir: Path = CACHE_DIR):
+    """
+    Return the stored blob Path for `key`, or None on a miss.
+    """
+    key_file = _key_path(Path(cache_dir), key)
+    if not key_file.exists():
+        return None
+    blob = _blob_path(Path(cache_dir), key_file.read_text().strip())
+    return blob if blob.exists() else None
+
+
+def fetch(key: str, dest, cache_dir: Path = CACHE_DIR) -> bool:
+    """
+    Copy the cached render for `key` to `dest`. Returns False on a miss.
+    """
+    blob = lookup(key, cache_dir)
+    if blob is None:
+        return False
+    dest = Path(dest)
+    if not dest.exists() or content_hash(dest) != blob.name:
+        write_atomic(dest, blob.read_bytes())
+    return True
+
+
+def store(key: str, src, cache_dir: Path = CACHE_DIR) -> str:
+    """
+    Add the rendered file `src` to the store under its content hash and map `key` to it.
+    Returns the content hash.
+    """
+    cache_dir = Path(cache_dir)
+    digest = content_hash(src)
+    blob = _blob_path(cache_dir, digest)
+    if not blob.exists():
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(blob, Path(src).read_bytes())
+
+    key_file = _key_path(cache_dir, key)
+    key_file.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(key_file, digest.encode("ascii"))
+    return digest
@@ -0,0 +1,51 @@
+import calendar
+from datetime import datetime
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED
+
+# ReportLab's own "invariant" date (2000-01-01), used when the invoice has no usable date
+FALLBACK_DATETIME = datetime(2000, 1, 1)
+
+
+def invoice_datetime(data: dict) -> datetime:
+    """
+    The timestamp written into deterministic outputs: the invoice's delivery date at midnight.
+    """
+    try:
+        return datetime.strptime(data["delivery_date"], "%d-%m-%Y")
+    except (KeyError, TypeError, ValueError):
+        return FALLBACK_DATETIME
+
+
+def invoice_epoch(data: dict) -> int:
+    return calendar.timegm(invoice_datetime(data).timetuple())
+
+
+class PinnedZipFile(ZipFile):
+    """
+    ZipFile that stamps every member with the same fixed date_time,
+    so archives written from identical content are byte-identical.
+    """
+
+    def __init__(self, file, date_time, **kwargs):
+        super().__init__(file, "w", ZIP_DEFLATED, allowZip64=True, **kwargs)
+        self._date_time = tuple(date_time)[:6]
+
+    def writestr(self, zinfo_or_arcname, data, compress_type=None, compresslevel=None):
+        if not isinstance(zinfo_or_arcname, ZipInfo):
+            zinfo = ZipInfo(zinfo_or_arcname, date_time=self._date_time)
+            zinfo.compress_type = self.compression
+            zinfo.external_attr = 0o600 << 16
+            zinfo_or_arcname = zinfo
+        # a ZipInfo built here would otherwise ignore the archive's compresslevel
+        if compresslevel is None:
+            compresslevel = self.compresslevel
+        super().writestr(zinfo_or_arcname, data, compress_type, compresslevel)
+
+    def write(self, filename, arcname=None, compress_type=None, compresslevel=None):
+        # openpyxl writes each worksheet from a temp file, whose mtime would otherwise be stamped
+        zinfo = ZipInfo.from_file(filename, arcname)
+        zinfo.date_time = self._date_time
+        zinfo.compress_type = self.compression if compress_type is None else compress_type
+        zinfo.external_attr = 0o600 << 16
+        with open(filename, "rb") as f:
+            self.writestr(zinfo, f.read(), compress_type, compresslevel)